@@ -0,0 +1 @@
+"""Benchmarks for leafmaptools, running without a browser."""
@@ -0,0 +1,230 @@
+"""
+Benchmarks for the tile grid tools, ``utils.bounds`` and ``utils.feature_bounds``.
+
+This drives ``TileGridTool`` and ``H3TileGridTool`` on a :class:`FakeMap`
+through scripted pans and zooms, for a matrix of zoom levels, grid levels
+and viewport sizes, and records per scenario:
+
+- the wall time per viewport update (mean and max),
+- the number of cells drawn per second,
+- the peak memory allocated during all updates (a separate run with
+  ``tracemalloc``, so it does not distort the timings),
+- the serialised size of the layer data sent per update.
+
+Run it from the repository root, no browser or network needed::
+
+  python -m benchmarks.bench_tilegrids -o results.json
+  python -m benchmarks.bench_tilegrids --quick
+
+Two result files can be compared with ``--compare old.json new.json``.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+import leafmaptools
+from leafmaptools.encoding import payload_size
+from leafmaptools.events import ViewportScheduler
+from leafmaptools.tilegrids import H3TileGridTool, TileGridTool
+from leafmaptools.utils import bounds, feature_bounds
+
+from tests.fake_map import FakeMap, scripted_views
+
+
+CENTER = (50.0, 10.0)
+
+# Tool name -> (factory, grid level offsets relative to the map zoom)
+TOOLS: Dict[str, tuple] = {
+    "mercator": (lambda m, s: TileGridTool(m, scheduler=s), [0, 2, 4]),
+    "mercator-lines": (lambda m, s: TileGridTool(m, scheduler=s, render="lines"), [0, 2, 4]),
+    "h3": (lambda m, s: H3TileGridTool(m, scheduler=s), [-3, -1]),
+}
+
+ZOOMS = [4, 8, 12]
+SIZES = [(800, 600), (1920, 1080)]
+
+
+def _drawn(data: dict) -> int:
+    if data.get("type") == "FeatureCollection":
+        return len(data["features"])
+    return 1 if data.get("geometry") else 0
+
+
+def run_scenario(
+    factory: Callable, zoom: int, offset: int, size: tuple, pans: int, memory: bool
+) -> dict:
+    """Run one tool through a scripted sequence of views.
+    """
+    async def main():
+        m = FakeMap(center=CENTER, zoom=zoom, size=size)
+        # A long debounce window, so updates only happen on flush().
+        scheduler = ViewportScheduler(m, wait=3600)
+        tool = factory(m, scheduler)
+        tool.slider.value = max(0, zoom + offset)
+
+        times, cells, payloads = [], [], []
+        for center, z in scripted_views(CENTER, zoom, size, pans=pans):
+            m.set_view(center, z)
+            t0 = time.perf_counter()
+            scheduler.flush()
+            times.append(time.perf_counter() - t0)
+            cells.append(_drawn(tool.gj.data))
+            if not memory:
+                payloads.append(payload_size(tool.gj.data))
+        scheduler.close()
+        return times, cells, payloads
+
+    if memory:
+        tracemalloc.start()
+        asyncio.run(main())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"peak_memory_bytes": peak}
+
+    times, cells, payloads = asyncio.run(main())
+    total = sum(times)
+    return {
+        "updates": len(times),
+        "time_per_update_mean_s": statistics.mean(times),
+        "time_per_update_max_s": max(times),
+        "cells_per_update_mean": statistics.mean(cells),
+        "cells_per_s": sum(cells) / total if total else 0.0,
+        "payload_bytes_mean": statistics.mean(payloads),
+        "payload_bytes_max": max(payloads),
+    }
+
+
+def random_feature_collection(vertices: int, per_feature: int = 100, seed: int = 0) -> dict:
+    """Make a FeatureCollection of random polylines with some number of vertices.
+    """
+    rnd = random.Random(seed)
+    features = []
+    for _ in range(max(1, vertices // per_feature)):
+        lon, lat = rnd.uniform(-170, 170), rnd.uniform(-80, 80)
+        coords = [[lon + rnd.uniform(-1, 1), lat + rnd.uniform(-1, 1)] for _ in range(per_feature)]
+        features.append({
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": coords},
+            "properties": {},
+        })
+    return {"type": "FeatureCollection", "features": features}
+
+
+def bench_bounds(vertices: int, repeat: int = 3) -> dict:
+    fc = random_feature_collection(vertices)
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        bounds(fc)
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    bounds(fc)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    best = min(times)
+    t0 = time.perf_counter()
+    feature_bounds(fc)
+    feature_time = time.perf_counter() - t0
+    return {
+        "benchmark": "utils.bounds",
+        "vertices": vertices,
+        "time_s": best,
+        "vertices_per_s": vertices / best if best else 0.0,
+        "peak_memory_bytes": peak,
+        "time_feature_bounds_s": feature_time,
+    }
+
+
+def run_all(quick: bool = False) -> dict:
+    """Run all benchmarks and return the results as a JSON-serialisable dict.
+    """
+    zooms = ZOOMS[1:2] if quick else ZOOMS
+    sizes = SIZES[:1] if quick else SIZES
+    pans = 3 if quick else 10
+    results = []
+    for name, (factory, offsets) in TOOLS.items():
+        for zoom in zooms:
+            for size in sizes:
+                for offset in (offsets[:1] if quick else offsets):
+                    if zoom + offset < 0:
+                        continue
+                    result = {
+                        "benchmark": name,
+                        "zoom": zoom,
+                        "level": zoom + offset,
+                        "viewport": list(size),
+                    }
+                    result.update(run_scenario(factory, zoom, offset, size, pans, memory=False))
+                    result.update(run_scenario(factory, zoom, offset, size, pans, memory=True))
+                    results.append(result)
+    for vertices in ([10_000] if quick else [10_000, 100_000, 500_000]):
+        results.append(bench_bounds(vertices))
+    return {
+        "meta": {
+            "leafmaptools": leafmaptools.__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "timestamp": time.time(),
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+KEY_FIELDS = ["benchmark", "zoom", "level", "viewport", "vertices"]
+
+
+def _key(result: dict) -> str:
+    return " ".join(str(result[k]) for k in KEY_FIELDS if k in result)
+
+
+def compare(old: dict, new: dict) -> List[str]:
+    """Compare the timings of two result sets, as lines of text.
+
+    Ratios above 1 mean the new results are slower.
+    """
+    old_results = {_key(r): r for r in old["results"]}
+    lines = []
+    for result in new["results"]:
+        before = old_results.get(_key(result))
+        if before is None:
+            continue
+        for metric, value in result.items():
+            if metric.startswith("time") and before.get(metric):
+                lines.append(f"{_key(result)} {metric}: {value / before[metric]:.2f}x")
+    return lines
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", help="Path of a JSON file to write results to.")
+    parser.add_argument("--quick", action="store_true", help="Run a small subset only.")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files."
+    )
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        old, new = [json.load(open(path)) for path in args.compare]
+        print("\n".join(compare(old, new)))
+        return
+
+    results = run_all(quick=args.quick)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,277 @@
+"""
+Choropleth styling of GeoJSON layers by a numeric feature property.
+
+Property values of the current layer data are collected into a NumPy
+column, classified with one of the ``SCHEMES``, and every feature gets its
+color in its ``properties.style``. ipyleaflet applies the layer style on top of that,
+so the colored key is moved out of the layer style while a classification
+is shown. Restyling never needs a Python callback per feature::
+
+  choropleth = Choropleth(layer)
+  choropleth.apply("population", scheme="natural_breaks", k=7)
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from ipyleaflet import GeoJSON
+
+
+SCHEMES = ["quantiles", "equal_interval", "natural_breaks"]
+
+# A sequential palette (ColorBrewer YlOrRd), interpolated to other numbers
+# of classes as needed.
+DEFAULT_PALETTE = ["#ffffb2", "#fecc5c", "#fd8d3c", "#f03b20", "#bd0026"]
+
+
+def quantile_breaks(values: np.ndarray, k: int) -> np.ndarray:
+    """Return class edges putting about the same number of values in every class.
+    """
+    return np.quantile(values, np.linspace(0, 1, k + 1))
+
+
+def equal_interval_breaks(values: np.ndarray, k: int) -> np.ndarray:
+    """Return class edges dividing the range of the values into equal intervals.
+    """
+    return np.linspace(values.min(), values.max(), k + 1)
+
+
+def natural_breaks(
+    values: np.ndarray, k: int, sample_size: int = 1000, seed: int = 0
+) -> np.ndarray:
+    """Return class edges minimising the variance inside classes (Jenks).
+
+    The optimal classes are found by dynamic programming over a random
+    sample of at most ``sample_size`` values, which needs a
+    ``sample_size ** 2`` matrix. The outer edges are the minimum and
+    maximum of all values.
+    """
+    sample = values
+    if len(values) > sample_size:
+        sample = np.random.default_rng(seed).choice(values, sample_size, replace=False)
+    x = np.sort(sample)
+    m = len(x)
+    k = min(k, m)
+    s1 = np.concatenate([[0], np.cumsum(x)])
+    s2 = np.concatenate([[0], np.cumsum(x * x)])
+    # ssd[i, j]: squared deviations of x[i..j] from their mean, for i <= j
+    i, j = np.triu_indices(m)
+    ssd = np.full((m, m), np.inf)
+    n = j - i + 1
+    ssd[i, j] = s2[j + 1] - s2[i] - (s1[j + 1] - s1[i]) ** 2 / n
+
+    # cost[j]: the lowest total for x[0..j] in c classes
+    cost = ssd[0].copy()
+    starts = []
+    for _ in range(1, k):
+        # The last class starts at i > 0, after c - 1 classes for x[0..i-1].
+        total = np.full((m, m), np.inf)
+        total[1:] = cost[:-1, None] + ssd[1:]
+        start = np.argmin(total, axis=0)
+        cost = total[start, np.arange(m)]
+        starts.append(start)
+
+    edges = [values.max()]
+    j = m - 1
+    for start in reversed(starts):
+        i = start[j]
+        edges.append(x[i - 1])
+        j = i - 1
+    edges.append(values.min())
+    return np.array(edges[::-1], dtype=float)
+
+
+BREAKS = {
+    "quantiles": quantile_breaks,
+    "equal_interval": equal_interval_breaks,
+    "natural_breaks": natural_breaks,
+}
+
+
+def classify(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Return the class index of every value, or -1 for NaNs.
+
+    Class ``i`` holds the values above ``edges[i]`` up to and including
+    ``edges[i + 1]``, the first class also ``edges[0]``.
+    """
+    k = len(edges) - 1
+    classes = np.searchsorted(edges[1:-1], values, side="left")
+    classes = np.clip(classes, 0, max(0, k - 1))
+    classes[np.isnan(values)] = -1
+    return classes
+
+
+def interpolate_palette(colors: Sequence[str], k: int) -> List[str]:
+    """Interpolate a list of "#rrggbb" colors linearly to ``k`` colors.
+    """
+    rgb = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in colors], dtype=float)
+    if k == len(colors):
+        return list(colors)
+    positions = np.linspace(0, len(colors) - 1, k)
+    channels = [np.interp(positions, np.arange(len(colors)), rgb[:, c]) for c in range(3)]
+    return [
+        "#%02x%02x%02x" % tuple(int(round(v)) for v in color)
+        for color in np.stack(channels, axis=1)
+    ]
+
+
+class Choropleth:
+    """Color the features of a GeoJSON layer by classes of a numeric property.
+
+    The current data of the layer is classified on every :meth:`apply`, so
+    layers whose data is swapped by others (e.g. by
+    :meth:`~leafmaptools.simplify.GeometryLevels.follow` or
+    :class:`~leafmaptools.culling.CulledGeoJSON`) keep their geometry. When
+    their data changes while a classification is applied, it is applied to
+    the new data again. Class edges are cached per property, scheme, number
+    of classes and property values. Applying a classification writes the
+    colors into the ``properties.style`` of copies of all features and
+    assigns the layer data once.
+
+    The layer style would override these colors, so its ``style_key`` is
+    removed while a classification is applied and restored afterwards. Its
+    color is used for features with a missing or non-numeric value, see
+    :meth:`set_missing_color`.
+    """
+    def __init__(
+        self, layer: GeoJSON, palette: Sequence[str] = DEFAULT_PALETTE,
+        style_key: str = "fillColor"
+    ):
+        """Constructor.
+
+        :param layer: The layer to style.
+        :param palette: The colors of the classes, interpolated as needed.
+        :param style_key: The style key to set per feature, e.g. "color".
+        """
+        self.layer = layer
+        self.palette = list(palette)
+        self.style_key = style_key
+        self.name: Optional[str] = None
+        self.missing_color: Optional[str] = None
+        self._args: Tuple[str, int, Optional[Sequence[str]]] = ("quantiles", 5, None)
+        self._classes = np.zeros(0, dtype=int)
+        self._edges: Dict[tuple, np.ndarray] = {}
+        self._applying = False
+        layer.observe(self._data_changed, names=["data"])
+
+    def column(self, name: str) -> np.ndarray:
+        """Return the values of a property of the current features as a float array.
+        """
+        def number(properties):
+            value = (properties or {}).get(name)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return value
+            return np.nan
+
+        features = self.layer.data["features"]
+        return np.fromiter(
+            (number(f.get("properties")) for f in features), dtype=float, count=len(features)
+        )
+
+    def edges(self, name: str, scheme: str = "quantiles", k: int = 5) -> np.ndarray:
+        """Return (and keep) the class edges of a property for a scheme.
+        """
+        assert scheme in SCHEMES
+        values = self.column(name)
+        values = values[~np.isnan(values)]
+        key = (name, scheme, k, hash(values.tobytes()))
+        if key not in self._edges:
+            if len(self._edges) >= 64:
+                self._edges.clear()
+            if not len(values):
+                self._edges[key] = np.zeros(0)
+            else:
+                self._edges[key] = BREAKS[scheme](values, k)
+        return self._edges[key]
+
+    def _features(self, colors: Sequence[Optional[str]], indices: Sequence[int]) -> List[dict]:
+        features = list(self.layer.data["features"])
+        key = self.style_key
+        for i, color in zip(indices, colors):
+            feature = features[i]
+            properties = dict(feature.get("properties") or {})
+            style = {k: v for k, v in properties.get("style", {}).items() if k != key}
+            if color is not None:
+                style[key] = color
+            if style:
+                properties["style"] = style
+            else:
+                properties.pop("style", None)
+            features[i] = {**feature, "properties": properties}
+        return features
+
+    def _assign(self, features: List[dict]):
+        self._applying = True
+        try:
+            self.layer.data = {**self.layer.data, "features": features}
+        finally:
+            self._applying = False
+
+    def _data_changed(self, change: dict):
+        # Skip own changes and notifications overtaken by newer data.
+        if self._applying or self.name is None or change["new"] is not self.layer.data:
+            return
+        self.apply(self.name, *self._args)
+
+    def apply(
+        self, name: Optional[str], scheme: str = "quantiles", k: int = 5,
+        palette: Sequence[str] = None
+    ) -> Optional[np.ndarray]:
+        """Color the features by a property, or remove the colors.
+
+        :param name: The property name, or ``None`` to remove the per-feature
+            colors again.
+        :param scheme: One of ``SCHEMES``.
+        :param k: The number of classes.
+        :param palette: The colors to use instead of the default ones.
+        :return: The class edges.
+        """
+        key = self.style_key
+        self._applying = True
+        try:
+            if name is None and self.name is not None and self.missing_color is not None:
+                self.layer.style = {**self.layer.style, key: self.missing_color}
+            elif name is not None and self.name is None and key in self.layer.style:
+                style = dict(self.layer.style)
+                self.missing_color = style.pop(key)
+                self.layer.style = style
+        finally:
+            self._applying = False
+
+        n = len(self.layer.data["features"])
+        if name is None:
+            colors = [None] * n
+            edges = None
+            self._classes = np.zeros(0, dtype=int)
+        else:
+            edges = self.edges(name, scheme, k)
+            classes = np.full(n, -1)
+            lookup = [self.missing_color]
+            if len(edges):
+                classes = classify(self.column(name), edges)
+                # Index -1 (no value) picks the trailing missing color.
+                lookup = interpolate_palette(palette or self.palette, len(edges) - 1) + lookup
+            colors = np.array(lookup, dtype=object)[classes].tolist()
+            self._classes = classes
+        self.name = name
+        self._args = (scheme, k, palette)
+        self._assign(self._features(colors, range(n)))
+        return edges
+
+    def set_missing_color(self, color: Optional[str]):
+        """Set the color of features without a value while a classification is applied.
+
+        Only these features are restyled. Without a classification the
+        color is restored into the layer style by the next ``apply(None)``.
+        """
+        self.missing_color = color
+        if self.name is None:
+            return
+        missing = np.flatnonzero(self._classes == -1).tolist()
+        if missing:
+            self._assign(self._features([color] * len(missing), missing))
+
+    def close(self):
+        """Stop following changes of the layer data.
+        """
+        self.layer.unobserve(self._data_changed, names=["data"])
@@ -0,0 +1,131 @@
+"""
+A GeoJSON layer sending only the features near the visible part of a map.
+"""
+
+from typing import Optional, Tuple
+
+import numpy as np
+from ipyleaflet import GeoJSON, Map
+
+from leafmaptools.encoding import PayloadEncoder
+from leafmaptools.events import ViewportScheduler, get_scheduler
+from leafmaptools.spatial import PackedRTree
+
+
+def expand_bbox(
+    west: float, south: float, east: float, north: float, margin: float
+) -> Tuple[float, float, float, float]:
+    """Grow a bbox by a fraction of its width and height on every side.
+
+    Latitudes are clamped to [-90, 90].
+    """
+    dx, dy = (east - west) * margin, (north - south) * margin
+    return west - dx, max(-90.0, south - dy), east + dx, min(90.0, north + dy)
+
+
+def _area(bbox: Tuple[float, float, float, float]) -> float:
+    west, south, east, north = bbox
+    return max(0.0, east - west) * max(0.0, north - south)
+
+
+class CulledGeoJSON:
+    """Show a large GeoJSON dataset on a map, sending only what is visible.
+
+    The full FeatureCollection stays on the Python side, indexed by a
+    :class:`~leafmaptools.spatial.PackedRTree` over the feature bboxes.
+    Whenever the viewport settled, the :attr:`layer` gets the features
+    intersecting the map bounds grown by ``margin`` (a fraction of the
+    viewport size on every side).
+
+    The loaded area acts as hysteresis: nothing is sent as long as the
+    viewport stays inside it, unless zooming in made it more than
+    ``max_overdraw`` times larger than what would be loaded now. And if the
+    new area contains the same features, the layer data is not reassigned.
+
+    Style the layer as usual, e.g. with ``StyleTool(a_map=m, layer=culled.layer)``.
+    """
+    def __init__(
+        self, a_map: Map, data: dict, margin: float = 0.5, max_overdraw: float = 4.0,
+        scheduler: ViewportScheduler = None, encoder: PayloadEncoder = None,
+        node_size: int = 16, **kwargs
+    ):
+        """Create the layer and add it to a map.
+
+        :param a_map: The map to show the layer on.
+        :param data: The full GeoJSON FeatureCollection.
+        :param margin: The fraction of the viewport width and height to
+            load beyond every side of it.
+        :param max_overdraw: Reload if the loaded area exceeds the one
+            needed for the viewport by more than this factor.
+        :param scheduler: The scheduler delivering map changes, by default
+            the debouncing one shared by all tools on ``a_map``.
+        :param encoder: An optional encoder reducing the features before
+            they are sent. Note that it drops properties not kept explicitly.
+        :param node_size: The node size of the spatial index.
+        :param kwargs: Arguments for the ``GeoJSON`` layer, e.g. ``style``.
+        """
+        assert margin >= 0 and max_overdraw >= 1
+        self.a_map = a_map
+        self.margin = margin
+        self.max_overdraw = max_overdraw
+        self.encoder = encoder
+        self.node_size = node_size
+        self.scheduler = scheduler or get_scheduler(a_map)
+        self.stats = {"updates": 0, "sent": 0, "skipped": 0, "features_sent": 0}
+        self.loaded: Optional[Tuple[float, float, float, float]] = None
+        self.visible = np.zeros(0, dtype=np.int64)
+
+        self.layer = GeoJSON(data={"type": "FeatureCollection", "features": []}, **kwargs)
+        self.set_data(data)
+        self.scheduler.subscribe(self.update)
+        a_map += self.layer
+
+    def set_data(self, data: dict):
+        """Replace the full dataset, rebuild the index and update the layer.
+        """
+        self.data = data
+        self.tree = PackedRTree.from_features(data, node_size=self.node_size)
+        self.loaded = None
+        self.visible = None
+        self.update()
+
+    def _needs_reload(self, view: Tuple[float, float, float, float]) -> bool:
+        if self.loaded is None:
+            return True
+        west, south, east, north = view
+        l_west, l_south, l_east, l_north = self.loaded
+        inside = l_west <= west and l_south <= south and east <= l_east and north <= l_north
+        wanted = _area(expand_bbox(*view, self.margin))
+        return not inside or _area(self.loaded) > self.max_overdraw * wanted
+
+    def update(self, event: dict = None):
+        """Load the features around the current viewport, if needed.
+        """
+        if not self.a_map.bounds:
+            return
+        self.stats["updates"] += 1
+        ((south, west), (north, east)) = self.a_map.bounds
+        view = (west, south, east, north)
+        if not self._needs_reload(view):
+            self.stats["skipped"] += 1
+            return
+        self.loaded = expand_bbox(*view, self.margin)
+        visible = self.tree.query(*self.loaded)
+        if self.visible is not None and np.array_equal(visible, self.visible):
+            self.stats["skipped"] += 1
+            return
+        self.visible = visible
+        features = self.data["features"]
+        data = {"type": "FeatureCollection", "features": [features[i] for i in visible.tolist()]}
+        if self.encoder is not None:
+            data = self.encoder.encode(data, zoom=self.a_map.zoom)
+        self.layer.data = data
+        self.stats["sent"] += 1
+        self.stats["features_sent"] += len(visible)
+
+    def close(self):
+        """Stop following the map and remove the layer from it.
+        """
+        self.scheduler.unsubscribe(self.update)
+        if self.layer in self.a_map.layers:
+            self.a_map.remove(self.layer)
@@ -0,0 +1,232 @@
+"""
+Compact encoding of GeoJSON payloads sent from tools to the browser.
+"""
+
+import json
+import math
+from typing import Iterable, Optional
+
+from leafmaptools.engine import MERCATOR_MAX_LAT
+from leafmaptools.utils import bounds
+
+
+# Nesting depth of "lines" (lists of positions) in the coordinates of each
+# geometry type, with 0 meaning a single position.
+LINE_DEPTHS = {
+    "Point": 0,
+    "MultiPoint": 1,
+    "LineString": 1,
+    "Polygon": 2,
+    "MultiLineString": 2,
+    "MultiPolygon": 3,
+}
+
+
+def precision_for_zoom(zoom: float, tile_size: int = 256, lat: float = 0.0) -> int:
+    """Return the number of decimal digits needed for sub-pixel accuracy.
+
+    At zoom ``z`` one pixel covers ``360 / (tile_size * 2 ** z)`` degrees of
+    longitude, but only ``cos(lat)`` times that of latitude in Web Mercator.
+    So coordinates up to latitude ``lat`` (north or south) rounded to this
+    many digits are off by less than one pixel.
+
+    Example:
+
+    >>> [precision_for_zoom(z) for z in [0, 5, 10, 18]]
+    [0, 2, 3, 6]
+    >>> precision_for_zoom(10, lat=75)
+    4
+    """
+    lat = min(abs(lat), MERCATOR_MAX_LAT)
+    degrees_per_pixel = 360 / (tile_size * 2 ** zoom) * math.cos(math.radians(lat))
+    return max(0, math.ceil(-math.log10(degrees_per_pixel)))
+
+
+def quantize(coords, digits: int):
+    """Round nested GeoJSON coordinates to some number of decimal digits.
+    """
+    if not coords:
+        return coords
+    if isinstance(coords[0], (int, float)):
+        return [round(c, digits) for c in coords]
+    if isinstance(coords[0][0], (int, float)):
+        return [[round(c, digits) for c in p] for p in coords]
+    return [quantize(c, digits) for c in coords]
+
+
+def payload_size(obj: dict) -> int:
+    """Return the number of bytes of the compact JSON serialisation of ``obj``.
+    """
+    return len(json.dumps(obj, separators=(",", ":")).encode("utf-8"))
+
+
+class PayloadEncoder:
+    """Shrink GeoJSON objects before they are assigned to a layer.
+
+    Coordinates are rounded to the precision needed at the current zoom and
+    the highest latitude of the payload (see :func:`precision_for_zoom`),
+    unless a fixed number of digits is given. Feature ``bbox`` members and properties not listed in
+    ``keep_properties`` are dropped. The result is still plain GeoJSON.
+
+    If ``measure`` is set, the serialised sizes of everything encoded are
+    summed up in :attr:`stats`, which costs two serialisations per object.
+    """
+    def __init__(
+        self,
+        digits: Optional[int] = None,
+        keep_properties: Iterable[str] = (),
+        keep_bbox: bool = False,
+        measure: bool = False,
+    ):
+        """Constructor.
+
+        :param digits: A fixed number of decimal digits, or ``None`` to
+            choose it from the zoom level.
+        :param keep_properties: The names of feature properties to keep.
+        :param keep_bbox: Keep ``bbox`` members of features.
+        :param measure: Count bytes before and after encoding.
+        """
+        self.digits = digits
+        self.keep_properties = set(keep_properties)
+        self.keep_bbox = keep_bbox
+        self.measure = measure
+        self.stats = {"bytes_before": 0, "bytes_after": 0}
+
+    @property
+    def ratio(self) -> float:
+        """The size of encoded payloads relative to the original ones.
+        """
+        before = self.stats["bytes_before"]
+        return self.stats["bytes_after"] / before if before else 1.0
+
+    def digits_for(self, zoom: float, lat: float = 0.0) -> int:
+        """Return the digits for a zoom and the highest latitude (north or south).
+        """
+        if self.digits is not None:
+            return self.digits
+        return precision_for_zoom(zoom, lat=lat)
+
+    def _encode(self, obj: dict, digits: int) -> dict:
+        kind = obj.get("type")
+        if kind == "FeatureCollection":
+            return {
+                "type": kind,
+                "features": [self._encode(f, digits) for f in obj["features"]]
+            }
+        if kind == "Feature":
+            result = {"type": kind}
+            if "id" in obj:
+                result["id"] = obj["id"]
+            if self.keep_bbox and "bbox" in obj:
+                result["bbox"] = obj["bbox"]
+            geometry = obj.get("geometry")
+            result["geometry"] = None if geometry is None else self._encode(geometry, digits)
+            properties = obj.get("properties") or {}
+            result["properties"] = {
+                k: v for k, v in properties.items() if k in self.keep_properties
+            }
+            return result
+        if kind == "GeometryCollection":
+            result = dict(obj)
+            result["geometries"] = [self._encode(g, digits) for g in obj["geometries"]]
+            return result
+        if kind in LINE_DEPTHS:
+            result = dict(obj)
+            result.pop("bbox", None)
+            result["coordinates"] = quantize(obj["coordinates"], digits)
+            return result
+        return obj
+
+    def encode(self, obj: dict, zoom: float = None, digits: int = None) -> dict:
+        """Encode a GeoJSON geometry, Feature or FeatureCollection.
+
+        :param obj: The GeoJSON object, which is not modified.
+        :param zoom: The map zoom the object is meant for.
+        :param digits: The number of digits to use, overriding ``zoom``.
+        :return: A new, reduced GeoJSON object.
+        :raises ValueError: If neither ``zoom`` nor ``digits`` is given and
+            the encoder has no fixed ``digits``.
+        """
+        if digits is None and zoom is None and self.digits is None:
+            raise ValueError("Either zoom or digits is needed to encode.")
+        if digits is None:
+            lat = 0.0
+            if self.digits is None:
+                try:
+                    (south, _), (north, _) = bounds(obj)
+                    lat = max(abs(south), abs(north))
+                except ValueError:
+                    pass
+            digits = self.digits_for(zoom, lat=lat)
+        result = self._encode(obj, digits)
+        if self.measure:
+            self.stats["bytes_before"] += payload_size(obj)
+            self.stats["bytes_after"] += payload_size(result)
+        return result
+
+
+def _delta_encode(coords, depth: int, scale: int):
+    if depth == 0:
+        return [int(round(c * scale)) for c in coords]
+    if depth > 1:
+        return [_delta_encode(c, depth - 1, scale) for c in coords]
+    result = []
+    prev = [0] * len(coords[0]) if coords else []
+    for position in coords:
+        ints = [int(round(c * scale)) for c in position]
+        result.append([i - p for i, p in zip(ints, prev)])
+        prev = ints
+    return result
+
+
+def _delta_decode(coords, depth: int, scale: int):
+    if depth == 0:
+        return [c / scale for c in coords]
+    if depth > 1:
+        return [_delta_decode(c, depth - 1, scale) for c in coords]
+    result = []
+    prev = [0] * len(coords[0]) if coords else []
+    for deltas in coords:
+        prev = [p + d for p, d in zip(prev, deltas)]
+        result.append([c / scale for c in prev])
+    return result
+
+
+def encode_compact(obj: dict, digits: int) -> dict:
+    """Encode a FeatureCollection with delta-encoded integer coordinates.
+
+    Coordinates are scaled by ``10 ** digits`` to integers, and every
+    position in a line or ring is stored as the difference to the previous
+    one, which keeps most numbers short. This is not GeoJSON anymore and
+    must be decoded with :func:`decode_compact` (e.g. for transfer or
+    storage), the result of which equals the input rounded to ``digits``.
+    """
+    scale = 10 ** digits
+    features = []
+    for feature in obj["features"]:
+        geometry = feature.get("geometry")
+        if geometry is not None:
+            kind = geometry["type"]
+            geometry = {
+                "type": kind,
+                "coordinates": _delta_encode(geometry["coordinates"], LINE_DEPTHS[kind], scale)
+            }
+        features.append({**feature, "geometry": geometry})
+    return {"type": "CompactFeatureCollection", "digits": digits, "features": features}
+
+
+def decode_compact(obj: dict) -> dict:
+    """Decode the output of :func:`encode_compact` into a FeatureCollection.
+    """
+    scale = 10 ** obj["digits"]
+    features = []
+    for feature in obj["features"]:
+        geometry = feature.get("geometry")
+        if geometry is not None:
+            kind = geometry["type"]
+            geometry = {
+                "type": kind,
+                "coordinates": _delta_decode(geometry["coordinates"], LINE_DEPTHS[kind], scale)
+            }
+        features.append({**feature, "geometry": geometry})
+    return {"type": "FeatureCollection", "features": features}
@@ -0,0 +1,620 @@
+"""
+A headless engine computing grid cells, independent of any map or widget.
+
+The engines return the cells inside a bbox as NumPy arrays, which can be
+used in batch jobs as well as by the widgets in :mod:`leafmaptools.tilegrids`.
+
+Example:
+
+>>> cells = MercatorGridEngine().cells_for_bbox(5, 45, 15, 55, 5)
+>>> cells.ids.tolist()[0], cells.boundaries.shape
+('Tile(x=16, y=10, z=5)', (4, 5, 2))
+"""
+
+import math
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import geojson
+from h3 import h3
+import mercantile
+import numpy as np
+
+
+BBox = Tuple[float, float, float, float]
+
+# Policies for grids exceeding their cell budget.
+BUDGET_POLICIES = ["coarser", "refuse"]
+
+EARTH_RADIUS_KM = 6371.0088
+MERCATOR_MAX_LAT = 85.051129
+
+
+def mercator_tile_ranges(
+    west: float, south: float, east: float, north: float, level: int
+) -> List[Tuple[int, int, int, int]]:
+    """Calculate the ranges of Mercator tiles of some level covering a bbox.
+
+    The ranges are the ones ``mercantile.tiles`` iterates over.
+
+    :return: A list of inclusive ``(xmin, ymin, xmax, ymax)`` ranges, two if
+        the bbox crosses the antimeridian (west > east), else one.
+    """
+    if west > east:
+        return (
+            mercator_tile_ranges(-180.0, south, east, north, level)
+            + mercator_tile_ranges(west, south, 180.0, north, level)
+        )
+    west, east = max(-180.0, west), min(180.0, east)
+    south, north = max(-MERCATOR_MAX_LAT, south), min(MERCATOR_MAX_LAT, north)
+    ul = mercantile.tile(west, north, level)
+    lr = mercantile.tile(east - mercantile.LL_EPSILON, south + mercantile.LL_EPSILON, level)
+    return [(ul.x, ul.y, lr.x, lr.y)]
+
+
+def mercator_tile_lats(ys: np.ndarray, level: int) -> np.ndarray:
+    """Calculate the latitudes of the upper edges of tile rows, like ``mercantile.ul``.
+    """
+    n = math.pow(2, level)
+    return np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * ys / n))))
+
+
+def estimate_mercator_cells(
+    west: float, south: float, east: float, north: float, level: int
+) -> int:
+    """Calculate the number of Mercator tiles of some level inside a bbox.
+
+    This uses only the tile ranges of the bbox corners, so it is cheap for
+    any level.
+    """
+    ranges = mercator_tile_ranges(west, south, east, north, level)
+    return sum((xmax - xmin + 1) * (ymax - ymin + 1) for xmin, ymin, xmax, ymax in ranges)
+
+
+def mercator_grid_lines(
+    west: float, south: float, east: float, north: float, level: int
+) -> geojson.Feature:
+    """Build the Mercator tile grid covering a bbox as meridians and parallels.
+
+    The result is a single MultiLineString feature with one line per tile
+    boundary, i.e. O(rows + cols) coordinates instead of the O(rows x cols)
+    of one polygon per tile, and no interior edge is drawn twice.
+    """
+    n = 2 ** level
+    lines = []
+    for xmin, ymin, xmax, ymax in mercator_tile_ranges(west, south, east, north, level):
+        lons = [x / n * 360.0 - 180.0 for x in range(xmin, xmax + 2)]
+        lats = [mercantile.ul(0, y, level).lat for y in range(ymin, ymax + 2)]
+        lines += [[(lon, lats[0]), (lon, lats[-1])] for lon in lons]
+        lines += [[(lons[0], lat), (lons[-1], lat)] for lat in lats]
+    return geojson.Feature(
+        geometry=geojson.MultiLineString(coordinates=lines),
+        properties={"level": level}
+    )
+
+
+def estimate_h3_cells(
+    west: float, south: float, east: float, north: float, level: int
+) -> int:
+    """Estimate the number of H3 cells of some resolution inside a bbox.
+
+    This divides the spherical area of the bbox by the average hexagon area
+    at that resolution, which accounts for latitude and aspect ratio.
+    """
+    width = east - west
+    if width < 0:
+        width += 360
+    width = min(width, 360)
+    south, north = max(-90.0, south), min(90.0, north)
+    area = EARTH_RADIUS_KM ** 2 * math.radians(width) * (
+        math.sin(math.radians(north)) - math.sin(math.radians(south))
+    )
+    return math.ceil(area / h3.hex_area(level, unit="km^2"))
+
+
+def level_within_budget(
+    estimate: Callable[..., int],
+    bbox: Tuple[float, float, float, float],
+    level: int,
+    max_cells: int,
+    policy: str = "coarser",
+) -> Tuple[Optional[int], str]:
+    """Find the grid level to draw without exceeding a cell budget.
+
+    :param estimate: A function like :func:`estimate_mercator_cells`.
+    :param bbox: The viewport as (west, south, east, north).
+    :param level: The requested level.
+    :param max_cells: The maximum number of cells to draw.
+    :param policy: "coarser" to fall back to the finest level within the
+        budget, "refuse" to draw nothing instead.
+    :return: A tuple with the level to draw (or ``None``) and a message
+        (empty if the requested level fits into the budget).
+    """
+    assert policy in BUDGET_POLICIES
+    count = estimate(*bbox, level)
+    if count <= max_cells:
+        return level, ""
+    if policy == "refuse":
+        return None, f"Level {level} needs ~{count} cells (max. {max_cells})"
+    coarser = level
+    while coarser > 0 and count > max_cells:
+        coarser -= 1
+        count = estimate(*bbox, coarser)
+    return coarser, f"Level {level} too dense, showing {coarser}"
+
+
+class H3BoundaryCache:
+    """A bounded LRU cache mapping H3 cell ids to their boundary rings.
+
+    Rings are closed GeoJSON-ordered (lon, lat) sequences as returned by
+    ``h3.h3_to_geo_boundary(cell, geo_json=True)``. When the cache holds
+    ``maxsize`` entries the least recently used ones are evicted. Hits,
+    misses and evictions are counted in :attr:`stats`.
+    """
+    def __init__(self, maxsize: int = 100_000):
+        """Constructor.
+
+        :param maxsize: The maximum number of rings to keep.
+        """
+        assert maxsize > 0
+        self.maxsize = maxsize
+        self.rings = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __len__(self) -> int:
+        return len(self.rings)
+
+    def __contains__(self, cell: str) -> bool:
+        return cell in self.rings
+
+    def boundaries(self, cells: Iterable[str]) -> List[tuple]:
+        """Return the boundary rings for many cells in one pass.
+
+        Cached rings are refreshed as most recently used, missing ones are
+        computed with the per-cell boundary primitive and added.
+        """
+        rings = self.rings
+        result = []
+        hits = 0
+        missing = []
+        for cell in cells:
+            ring = rings.get(cell)
+            if ring is None:
+                missing.append(len(result))
+                result.append(cell)
+            else:
+                rings.move_to_end(cell)
+                result.append(ring)
+                hits += 1
+        for i in missing:
+            cell = result[i]
+            ring = h3.h3_to_geo_boundary(cell, geo_json=True)
+            rings[cell] = ring
+            result[i] = ring
+        evictions = max(0, len(rings) - self.maxsize)
+        for _ in range(evictions):
+            rings.popitem(last=False)
+        self.stats["hits"] += hits
+        self.stats["misses"] += len(missing)
+        self.stats["evictions"] += evictions
+        return result
+
+    def clear(self):
+        """Remove all rings and reset the statistics.
+        """
+        self.rings.clear()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def h3_polyfill_bbox(west: float, south: float, east: float, north: float, level: int) -> Set[str]:
+    """Return the H3 cells of some resolution with their centers inside a bbox.
+    """
+    ring = [(south, west), (north, west), (north, east), (south, east), (south, west)]
+    return h3.polyfill({"type": "Polygon", "coordinates": [ring]}, level)
+
+
+def _intersection(a: BBox, b: BBox) -> Optional[BBox]:
+    west, south = max(a[0], b[0]), max(a[1], b[1])
+    east, north = min(a[2], b[2]), min(a[3], b[3])
+    if west >= east or south >= north:
+        return None
+    return west, south, east, north
+
+
+def _difference(a: BBox, b: BBox) -> List[BBox]:
+    """Split the part of bbox ``a`` outside of bbox ``b`` (inside ``a``) into bboxes.
+    """
+    west, south, east, north = a
+    b_west, b_south, b_east, b_north = b
+    parts = [
+        (west, b_north, east, north),
+        (west, south, east, b_south),
+        (west, b_south, b_west, b_north),
+        (b_east, b_south, east, b_north),
+    ]
+    return [p for p in parts if p[0] < p[2] and p[1] < p[3]]
+
+
+def _centers_inside(cells: Iterable[str], bbox: BBox) -> Set[str]:
+    west, south, east, north = bbox
+    result = set()
+    for cell in cells:
+        lat, lon = h3.h3_to_geo(cell)
+        if west <= lon <= east and south <= lat <= north:
+            result.add(cell)
+    return result
+
+
+class H3CoverageCache:
+    """A cache of H3 viewport coverages deriving new ones from previous ones.
+
+    The cells of a bbox are those with their centers inside it, as for
+    ``h3.polyfill``. For the part of a new bbox also covered by a cached
+    coverage the cells are derived from that coverage:
+
+    - at the same resolution by reusing the cached cells,
+    - at a finer resolution from the children of the coarse cells around
+      the bbox (polyfilled at the coarse resolution, with a margin as
+      children can stick out of their parents),
+    - at a coarser resolution from the parents of the cached cells (every
+      cell shares its center with its center child).
+
+    Only the newly exposed rest of the bbox is polyfilled. Up to ``maxsize``
+    coverages, one per resolution, are kept in LRU order.
+    """
+    def __init__(self, maxsize: int = 8):
+        assert maxsize > 0
+        self.maxsize = maxsize
+        self.coverages = OrderedDict()
+        self.stats = {"hits": 0, "derived": 0, "polyfills": 0}
+
+    def _source(self, bbox: BBox, level: int) -> Optional[Tuple[int, BBox, Set[str]]]:
+        """Find the most useful cached coverage overlapping a bbox.
+        """
+        best = None
+        for cached_level, (cached_bbox, cells) in self.coverages.items():
+            if _intersection(bbox, cached_bbox) is None:
+                continue
+            rank = (abs(cached_level - level), cached_level < level)
+            if best is None or rank < best[0]:
+                best = (rank, cached_level, cached_bbox, cells)
+        return best and best[1:]
+
+    def _derive(self, cells: Set[str], from_level: int, bbox: BBox, level: int) -> Set[str]:
+        if from_level == level:
+            return _centers_inside(cells, bbox)
+        if from_level > level:
+            parents = {h3.h3_to_parent(c, level) for c in cells}
+            return _centers_inside(parents, bbox)
+        # The cached cells only cover parents with their centers inside the
+        # cached bbox, which misses parents of cells near its edges (or all
+        # of them if coarse cells are larger than the bbox). So the parents
+        # are polyfilled at the coarse resolution for the bbox grown by two
+        # coarse edge lengths, which contains the centers of all parents.
+        west, south, east, north = bbox
+        margin = 2 * h3.edge_length(from_level, unit="km") / 111.2
+        south, north = max(-90.0, south - margin), min(90.0, north + margin)
+        cos_lat = max(0.01, math.cos(math.radians(max(abs(south), abs(north)))))
+        grown = (west - margin / cos_lat, south, east + margin / cos_lat, north)
+        parents = h3_polyfill_bbox(*grown, from_level)
+        children = set()
+        for c in parents:
+            children.update(h3.h3_to_children(c, level))
+        return _centers_inside(children, bbox)
+
+    def cells(self, bbox: BBox, level: int) -> Set[str]:
+        """Return the cells of some resolution with their centers inside a bbox.
+
+        :param bbox: The bbox as (west, south, east, north).
+        :param level: The H3 resolution.
+        """
+        bbox = tuple(bbox)
+        cached = self.coverages.get(level)
+        if cached is not None and cached[0] == bbox:
+            self.coverages.move_to_end(level)
+            self.stats["hits"] += 1
+            return cached[1]
+
+        # Bboxes crossing the antimeridian are not split, just polyfilled.
+        source = self._source(bbox, level) if bbox[0] <= bbox[2] else None
+        if source is None:
+            result = h3_polyfill_bbox(*bbox, level)
+            self.stats["polyfills"] += 1
+        else:
+            from_level, from_bbox, from_cells = source
+            common = _intersection(bbox, from_bbox)
+            result = self._derive(from_cells, from_level, common, level)
+            self.stats["derived"] += 1
+            for part in _difference(bbox, common):
+                result |= h3_polyfill_bbox(*part, level)
+                self.stats["polyfills"] += 1
+
+        self.coverages[level] = (bbox, result)
+        self.coverages.move_to_end(level)
+        while len(self.coverages) > self.maxsize:
+            self.coverages.popitem(last=False)
+        return result
+
+    def clear(self):
+        self.coverages.clear()
+        self.stats = {"hits": 0, "derived": 0, "polyfills": 0}
+
+
+class GridCells:
+    """The cells of one grid level inside a bbox, stored as NumPy arrays.
+
+    :attr ids: A 1D array with the ids of ``n`` cells.
+    :attr boundaries: A float array of shape ``(n, k, 2)`` with the closed
+        (lon, lat) boundary ring of every cell. Rings with less than ``k``
+        vertices are padded by repeating their last (closing) vertex.
+    :attr sizes: The number of vertices of every ring, without padding.
+
+    GeoJSON is only built when asked for, see :meth:`to_geojson`.
+    """
+    def __init__(
+        self, kind: str, level: int, ids: np.ndarray, boundaries: np.ndarray,
+        sizes: np.ndarray = None,
+    ):
+        self.kind = kind
+        self.level = level
+        self.ids = ids
+        self.boundaries = boundaries
+        if sizes is None:
+            sizes = np.full(len(ids), boundaries.shape[1], dtype=np.int64)
+        self.sizes = sizes
+        self._geojson = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def bounds(self) -> np.ndarray:
+        """The bboxes of all cells as an array of (west, south, east, north) rows.
+        """
+        lons, lats = self.boundaries[..., 0], self.boundaries[..., 1]
+        return np.stack(
+            [lons.min(axis=1), lats.min(axis=1), lons.max(axis=1), lats.max(axis=1)], axis=1
+        )
+
+    def ring(self, i: int) -> list:
+        return self.boundaries[i, :self.sizes[i]].tolist()
+
+    def feature(self, i: int) -> dict:
+        """Return the GeoJSON feature of the cell with index ``i``.
+        """
+        return {
+            "type": "Feature",
+            "id": str(self.ids[i]),
+            "geometry": {"type": "Polygon", "coordinates": [self.ring(i)]},
+            "properties": {},
+        }
+
+    def features(self, indices: Iterable[int] = None) -> List[dict]:
+        """Return the GeoJSON features of many (by default all) cells.
+
+        This converts the arrays to lists in one go and is much faster than
+        calling :meth:`feature` for every cell.
+        """
+        ids, rings, sizes = self.ids, self.boundaries, self.sizes
+        if indices is not None:
+            indices = np.fromiter(indices, dtype=np.int64)
+            ids, rings, sizes = ids[indices], rings[indices], sizes[indices]
+        ids, rings = ids.tolist(), rings.tolist()
+        if len(rings) and not (sizes == len(rings[0])).all():
+            rings = [ring[:size] for ring, size in zip(rings, sizes.tolist())]
+        return [
+            {
+                "type": "Feature",
+                "id": cell_id,
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+                "properties": {},
+            }
+            for cell_id, ring in zip(ids, rings)
+        ]
+
+    def to_geojson(self) -> dict:
+        """Return (and keep) all cells as a GeoJSON FeatureCollection.
+        """
+        if self._geojson is None:
+            self._geojson = {"type": "FeatureCollection", "features": self.features()}
+        return self._geojson
+
+
+def pack_rings(rings: List[list]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack closed rings of possibly different lengths into one array.
+
+    :return: A tuple of the ``(n, k, 2)`` padded ring array and the sizes.
+    """
+    sizes = np.array([len(r) for r in rings], dtype=np.int64)
+    if len(rings) == 0:
+        return np.empty((0, 0, 2)), sizes
+    k = sizes.max()
+    if (sizes == k).all():
+        return np.array(rings, dtype=float), sizes
+    packed = np.empty((len(rings), k, 2))
+    for i, ring in enumerate(rings):
+        packed[i, :len(ring)] = ring
+        packed[i, len(ring):] = ring[-1]
+    return packed, sizes
+
+
+def rings_from_bounds(bounds: np.ndarray) -> np.ndarray:
+    """Make closed rectangular rings from an array of (west, south, east, north) rows.
+
+    The vertex order is the one of ``mercantile.feature``.
+    """
+    west, south, east, north = bounds.T
+    return np.stack([
+        np.stack([west, south], axis=1),
+        np.stack([west, north], axis=1),
+        np.stack([east, north], axis=1),
+        np.stack([east, south], axis=1),
+        np.stack([west, south], axis=1),
+    ], axis=1)
+
+
+class FeatureCache:
+    """A cache of GeoJSON features for the grid cells currently on screen.
+
+    Features are keyed by cell id and built only once while their cell stays
+    inside the viewport. Each update reports which cells entered and which
+    left the viewport since the previous update, so callers can skip work
+    (and widget syncs) when nothing changed.
+
+    New features are passed through the ``encode`` function, if any, e.g.
+    :meth:`leafmaptools.encoding.PayloadEncoder.encode`.
+    """
+    def __init__(self, encode: Callable[[dict], dict] = None):
+        self.features = {}
+        self.encode = encode
+
+    def __len__(self) -> int:
+        return len(self.features)
+
+    def update(self, cells: GridCells) -> Tuple[Set[str], Set[str]]:
+        """Make the cache hold exactly the given cells.
+
+        :param cells: The cells now visible.
+        :return: A tuple ``(entered, left)`` of sets of cell ids.
+        """
+        visible = {cell_id: i for i, cell_id in enumerate(cells.ids.tolist())}
+        left = self.features.keys() - visible.keys()
+        entered = visible.keys() - self.features.keys()
+        for key in left:
+            del self.features[key]
+        for feature in cells.features(visible[key] for key in entered):
+            feature = self.encode(feature) if self.encode else feature
+            self.features[feature["id"]] = feature
+        return entered, left
+
+    def clear(self):
+        self.features.clear()
+
+    def feature_collection(self) -> dict:
+        # A plain dict, as geojson.FeatureCollection would copy all features.
+        return {"type": "FeatureCollection", "features": list(self.features.values())}
+
+
+class GridEngine:
+    """The base class of headless grid engines.
+
+    Subclasses implement :meth:`estimate`, :meth:`cells_for_bbox` and
+    :meth:`cell_at` for one kind of grid. Bboxes are given in the order
+    west, south, east, north (like ``mercantile.tiles``).
+    """
+    kind = ""
+
+    def estimate(self, west: float, south: float, east: float, north: float, level: int) -> int:
+        """Estimate the number of cells in a bbox without generating them.
+        """
+        raise NotImplementedError
+
+    def cells_for_bbox(
+        self, west: float, south: float, east: float, north: float, level: int
+    ) -> GridCells:
+        """Return the cells of some level inside a bbox.
+        """
+        raise NotImplementedError
+
+    def cell_at(self, lon: float, lat: float, level: int) -> GridCells:
+        """Return the single cell of some level containing a location.
+        """
+        raise NotImplementedError
+
+
+class MercatorGridEngine(GridEngine):
+    """A grid engine for Web Mercator (XYZ) tiles.
+
+    Cell ids are the ones used by ``mercantile.feature``, e.g.
+    ``"Tile(x=16, y=10, z=5)"``. Tiles come in the order of ``mercantile.tiles``.
+
+    Visible tiles form contiguous x/y ranges, so :meth:`cells_for_bbox`
+    calculates the edges of all columns and rows once and combines them
+    with NumPy. :meth:`cells_for_bbox_reference` does the same with one
+    ``mercantile`` call per tile, and is kept for testing.
+    """
+    kind = "mercator"
+
+    def estimate(self, west: float, south: float, east: float, north: float, level: int) -> int:
+        return estimate_mercator_cells(west, south, east, north, level)
+
+    def _cells(self, tiles: List[mercantile.Tile], level: int) -> GridCells:
+        ids = np.array([str(t) for t in tiles], dtype=str)
+        bounds = np.array([mercantile.bounds(t) for t in tiles], dtype=float).reshape(-1, 4)
+        return GridCells(self.kind, level, ids, rings_from_bounds(bounds))
+
+    def cells_for_bbox_reference(
+        self, west: float, south: float, east: float, north: float, level: int
+    ) -> GridCells:
+        tiles = list(mercantile.tiles(west, south, east, north, zooms=level))
+        return self._cells(tiles, level)
+
+    def cells_for_bbox(
+        self, west: float, south: float, east: float, north: float, level: int
+    ) -> GridCells:
+        n = math.pow(2, level)
+        ids, bounds = [], []
+        for xmin, ymin, xmax, ymax in mercator_tile_ranges(west, south, east, north, level):
+            lons = np.arange(xmin, xmax + 2) / n * 360.0 - 180.0
+            lats = mercator_tile_lats(np.arange(ymin, ymax + 2), level)
+            cols, rows = xmax - xmin + 1, ymax - ymin + 1
+            # Column indices vary slowest, like in mercantile.tiles.
+            i = np.repeat(np.arange(cols), rows)
+            j = np.tile(np.arange(rows), cols)
+            bounds.append(np.stack([lons[i], lats[j + 1], lons[i + 1], lats[j]], axis=1))
+            ids += [
+                f"Tile(x={x}, y={y}, z={level})"
+                for x in range(xmin, xmax + 1) for y in range(ymin, ymax + 1)
+            ]
+        bounds = np.concatenate(bounds)
+        return GridCells(self.kind, level, np.array(ids, dtype=str), rings_from_bounds(bounds))
+
+    def cell_at(self, lon: float, lat: float, level: int) -> GridCells:
+        return self._cells([mercantile.tile(lon, lat, level)], level)
+
+    def lines_for_bbox(
+        self, west: float, south: float, east: float, north: float, level: int
+    ) -> geojson.Feature:
+        """Return the grid inside a bbox as lines, see :func:`mercator_grid_lines`.
+        """
+        return mercator_grid_lines(west, south, east, north, level)
+
+
+class H3GridEngine(GridEngine):
+    """A grid engine for H3 hexagons (and pentagons).
+
+    Coverages and boundaries are cached between calls, see
+    :class:`H3CoverageCache` and :class:`H3BoundaryCache`.
+    """
+    kind = "h3"
+
+    def __init__(self, cache_size: int = 100_000, coverage_size: int = 8):
+        """Constructor.
+
+        :param cache_size: The maximum number of cell boundaries to cache.
+        :param coverage_size: The maximum number of bbox coverages to cache.
+        """
+        self.boundary_cache = H3BoundaryCache(maxsize=cache_size)
+        self.coverage = H3CoverageCache(maxsize=coverage_size)
+
+    def estimate(self, west: float, south: float, east: float, north: float, level: int) -> int:
+        return estimate_h3_cells(west, south, east, north, level)
+
+    def _cells(self, cells: List[str], level: int) -> GridCells:
+        rings, sizes = pack_rings(self.boundary_cache.boundaries(cells))
+        return GridCells(self.kind, level, np.array(cells, dtype=str), rings, sizes)
+
+    def cells_for_bbox(
+        self, west: float, south: float, east: float, north: float, level: int
+    ) -> GridCells:
+        cells = sorted(self.coverage.cells((west, south, east, north), level))
+        return self._cells(cells, level)
+
+    def cell_at(self, lon: float, lat: float, level: int) -> GridCells:
+        return self._cells([h3.geo_to_h3(lat, lon, level)], level)
+
+
+ENGINES: Dict[str, type] = {
+    MercatorGridEngine.kind: MercatorGridEngine,
+    H3GridEngine.kind: H3GridEngine,
+}
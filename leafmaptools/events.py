@@ -0,0 +1,342 @@
+"""
+A scheduler coalescing map events into single "viewport settled" events,
+a debouncer and a throttler for widget events, and a runner computing
+results off the kernel thread.
+"""
+
+import asyncio
+import time
+import weakref
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Tuple
+
+from ipyleaflet import Map
+
+
+# Map traits indicating a change of the visible part of the map. One pan or
+# zoom gesture changes most of them (bounds even once per side), so they are
+# all folded into one event.
+VIEW_TRAITS = ["center", "zoom", "bounds"]
+
+SCHEDULER_MODES = ["debounce", "throttle"]
+
+
+class ViewportScheduler:
+    """Coalesce changes of a map's view into single "viewport settled" events.
+
+    In "debounce" mode subscribers are called once the map has not changed
+    for ``wait`` seconds. In "throttle" mode they are called at most once
+    every ``wait`` seconds while the map keeps changing, and once more after
+    the last change. Timers run on the asyncio loop of the kernel. Without a
+    running loop (or with ``wait=0``) subscribers are called immediately.
+
+    Subscribers receive an event like the ones of ``Map.observe``::
+
+      {"type": "change", "name": "bounds", "owner": a_map}
+
+    Use :func:`get_scheduler` to share one scheduler among all tools on a map.
+    """
+    def __init__(self, a_map: Map, wait: float = 0.1, mode: str = "debounce"):
+        """Constructor.
+
+        :param a_map: The map whose view changes are to be coalesced.
+        :param wait: The debounce/throttle window in seconds.
+        :param mode: One of ``SCHEDULER_MODES``.
+        """
+        assert mode in SCHEDULER_MODES
+        self._map = weakref.ref(a_map)
+        self.wait = wait
+        self.mode = mode
+        self.callbacks = []
+        self.stats = {"changes": 0, "events": 0}
+        self._handle = None
+        self._last_fired = float("-inf")
+        a_map.observe(self._changed, names=VIEW_TRAITS, type="change")
+
+    @property
+    def a_map(self) -> Map:
+        return self._map()
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        """Call ``callback`` with an event dict whenever the viewport settled.
+        """
+        if callback not in self.callbacks:
+            self.callbacks.append(callback)
+
+    def unsubscribe(self, callback: Callable[[dict], None]):
+        if callback in self.callbacks:
+            self.callbacks.remove(callback)
+
+    def _changed(self, change: dict):
+        self.stats["changes"] += 1
+        self.schedule()
+
+    def schedule(self):
+        """Schedule an event according to the mode and window.
+        """
+        if self.wait <= 0:
+            self.fire()
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.fire()
+            return
+        if self.mode == "debounce":
+            if self._handle is not None:
+                self._handle.cancel()
+            self._handle = loop.call_later(self.wait, self.fire)
+        elif self.mode == "throttle":
+            if self._handle is not None:
+                return
+            delay = max(0, self._last_fired + self.wait - time.monotonic())
+            self._handle = loop.call_later(delay, self.fire)
+
+    @property
+    def pending(self) -> bool:
+        """Is there a scheduled event which did not fire yet?
+        """
+        return self._handle is not None
+
+    def flush(self):
+        """Fire a pending event now.
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+            self.fire()
+
+    def fire(self):
+        """Call all subscribers now.
+        """
+        self._handle = None
+        self._last_fired = time.monotonic()
+        a_map = self.a_map
+        if a_map is None:
+            return
+        self.stats["events"] += 1
+        event = {"type": "change", "name": "bounds", "owner": a_map}
+        for callback in list(self.callbacks):
+            callback(event)
+
+    def close(self):
+        """Stop observing the map and drop all subscribers and pending events.
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        a_map = self.a_map
+        if a_map is not None:
+            a_map.unobserve(self._changed, names=VIEW_TRAITS, type="change")
+        self.callbacks = []
+
+
+_schedulers: "weakref.WeakKeyDictionary[Map, Dict[Tuple[float, str], ViewportScheduler]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def get_scheduler(a_map: Map, wait: float = 0.1, mode: str = "debounce") -> ViewportScheduler:
+    """Get the shared scheduler for a map with the given window and mode.
+
+    Tools asking for the same settings on the same map share one scheduler,
+    so one gesture results in one event for all of them.
+    """
+    schedulers = _schedulers.setdefault(a_map, {})
+    key = (wait, mode)
+    if key not in schedulers:
+        schedulers[key] = ViewportScheduler(a_map, wait=wait, mode=mode)
+    return schedulers[key]
+
+
+class Debouncer:
+    """Call a function only once calls to it paused for ``wait`` seconds.
+
+    Only the last call is passed on, with its arguments, e.g. to apply the
+    text of a widget once typing paused. Like :class:`ViewportScheduler`
+    this uses the asyncio loop of the kernel, and calls the function
+    immediately without a running loop (or with ``wait=0``).
+    """
+    def __init__(self, callback: Callable[..., None], wait: float = 0.5):
+        """Constructor.
+
+        :param callback: The function to call.
+        :param wait: The pause in seconds after which it is called.
+        """
+        self.callback = callback
+        self.wait = wait
+        self._handle = None
+        self._args = None
+
+    def __call__(self, *args, **kwargs):
+        self._args = (args, kwargs)
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        if self.wait <= 0:
+            self.fire()
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.fire()
+            return
+        self._handle = loop.call_later(self.wait, self.fire)
+
+    @property
+    def pending(self) -> bool:
+        """Is there a call which was not passed on yet?
+        """
+        return self._handle is not None
+
+    def flush(self):
+        """Pass on a pending call now.
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+            self.fire()
+
+    def cancel(self):
+        """Drop a pending call.
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+        self._handle = None
+        self._args = None
+
+    def fire(self):
+        self._handle = None
+        if self._args is None:
+            return
+        (args, kwargs), self._args = self._args, None
+        self.callback(*args, **kwargs)
+
+
+class Throttler:
+    """Call a function at most once every ``wait`` seconds.
+
+    Calls arriving in between are folded into one call at the end of the
+    window, so the last one is never lost. The function takes no arguments,
+    it is meant to flush state accumulated elsewhere. Without a running
+    asyncio loop (or with ``wait=0``) it is called immediately.
+    """
+    def __init__(self, callback: Callable[[], None], wait: float = 0.1):
+        """Constructor.
+
+        :param callback: The function to call.
+        :param wait: The minimum time in seconds between two calls.
+        """
+        self.callback = callback
+        self.wait = wait
+        self._handle = None
+        self._last_fired = float("-inf")
+
+    def __call__(self):
+        if self._handle is not None:
+            return
+        if self.wait <= 0:
+            self.fire()
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.fire()
+            return
+        delay = max(0, self._last_fired + self.wait - time.monotonic())
+        self._handle = loop.call_later(delay, self.fire)
+
+    @property
+    def pending(self) -> bool:
+        """Is there a scheduled call which did not happen yet?
+        """
+        return self._handle is not None
+
+    def cancel(self):
+        """Drop a scheduled call.
+        """
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def fire(self):
+        self._handle = None
+        self._last_fired = time.monotonic()
+        self.callback()
+
+
+class LatestResultRunner:
+    """Run jobs on an executor and apply only the result of the newest one.
+
+    Every submitted job gets a new generation number. When a job finishes
+    its result is applied on the asyncio loop (i.e. the kernel's main
+    thread) only if no newer job was submitted meanwhile, else it is
+    dropped. So slow jobs never overwrite newer results, and stale ones
+    never show up at all. If the newest job raises, the error is passed to
+    the loop's exception handler (which logs it) and nothing is applied.
+
+    Without an executor, or without a running asyncio loop, jobs are run
+    and applied immediately. Jobs for a process pool must be picklable.
+    With a thread pool, jobs share state with the kernel thread, so use a
+    single worker if they mutate caches.
+    """
+    def __init__(self, executor: Executor = None):
+        """Constructor.
+
+        :param executor: The executor to run jobs on, e.g.
+            ``ThreadPoolExecutor(max_workers=1)``.
+        """
+        self.executor = executor
+        self.generation = 0
+        self.stats = {"submitted": 0, "applied": 0, "dropped": 0, "failed": 0}
+
+    def submit(self, compute: Callable[[], Any], apply: Callable[[Any], None]) -> int:
+        """Compute something in the background and apply it when done.
+
+        :param compute: A function without arguments run on the executor.
+        :param apply: A function called with the result on the loop.
+        :return: The generation number of the job.
+        """
+        self.generation += 1
+        generation = self.generation
+        self.stats["submitted"] += 1
+        loop = None
+        if self.executor is not None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        if loop is None:
+            apply(compute())
+            self.stats["applied"] += 1
+            return generation
+        future = loop.run_in_executor(self.executor, compute)
+        future.add_done_callback(lambda f: self._done(f, generation, apply))
+        return generation
+
+    def _done(self, future: asyncio.Future, generation: int, apply: Callable[[Any], None]):
+        if future.cancelled() or generation != self.generation:
+            self.stats["dropped"] += 1
+            return
+        error = future.exception()
+        if error is not None:
+            self.stats["failed"] += 1
+            future.get_loop().call_exception_handler({
+                "message": f"LatestResultRunner job {generation} failed",
+                "exception": error,
+                "future": future,
+            })
+            return
+        try:
+            apply(future.result())
+        finally:
+            self.stats["applied"] += 1
+
+    def cancel(self):
+        """Make the results of all pending jobs stale.
+        """
+        self.generation += 1
+
+    @property
+    def pending(self) -> bool:
+        """Are there jobs which were neither applied, dropped nor failed yet?
+        """
+        finished = self.stats["applied"] + self.stats["dropped"] + self.stats["failed"]
+        return finished < self.stats["submitted"]
@@ -0,0 +1,196 @@
+"""
+Precomputed grid cells for an area of interest, stored on disk.
+
+A pyramid holds the cells of one grid kind for a range of levels inside a
+fixed bbox (the AOI). Every level is stored as a few ``.npy`` files next
+to an ``index.json`` file, and loaded lazily as memory-mapped arrays, so
+serving a viewport reads only the rows near it instead of computing the
+cells again::
+
+  engine = MercatorGridEngine()
+  pyramid = build_pyramid(engine, (5, 45, 15, 55), range(4, 9), "aoi.grid")
+  tool = TileGridTool(a_map, engine=PyramidGridEngine(pyramid, engine))
+
+Later sessions only need ``GridPyramid("aoi.grid")``.
+"""
+
+import json
+import os
+from typing import Dict, Iterable
+
+from h3 import h3
+import numpy as np
+
+from leafmaptools.engine import BBox, GridCells, GridEngine
+
+
+INDEX_NAME = "index.json"
+FORMAT_VERSION = 1
+
+# Arrays stored per level: file suffix -> description
+ARRAYS = {
+    "ids": "cell ids as fixed-width unicode strings",
+    "boundaries": "padded (n, k, 2) boundary rings",
+    "sizes": "ring sizes without padding",
+    "bounds": "(n, 4) cell bboxes, rows sorted by west",
+    "centers": "(n, 2) cell centers as (lon, lat)",
+}
+
+
+def _file_name(level: int, name: str) -> str:
+    return f"level_{level:02d}_{name}.npy"
+
+
+def _centers(cells: GridCells) -> np.ndarray:
+    """Calculate the centers of cells as (lon, lat) rows.
+
+    H3 cells use their exact centers, others the mean of their ring vertices.
+    """
+    if cells.kind == "h3":
+        return np.array([h3.h3_to_geo(c)[::-1] for c in cells.ids.tolist()]).reshape(-1, 2)
+    total = np.zeros((len(cells), 2))
+    for k in range(cells.boundaries.shape[1] if len(cells) else 0):
+        total += np.where((k < cells.sizes - 1)[:, None], cells.boundaries[:, k], 0)
+    return total / np.maximum(cells.sizes - 1, 1)[:, None]
+
+
+def build_pyramid(
+    engine: GridEngine, bbox: BBox, levels: Iterable[int], path: str
+) -> "GridPyramid":
+    """Compute the cells of an AOI for some levels and save them to a directory.
+
+    :param engine: The engine computing the cells.
+    :param bbox: The AOI as (west, south, east, north).
+    :param levels: The levels to compute.
+    :param path: The directory to write to, created if needed.
+    :return: The pyramid, opened for reading.
+    """
+    os.makedirs(path, exist_ok=True)
+    index = {"version": FORMAT_VERSION, "kind": engine.kind, "bbox": list(bbox), "levels": {}}
+    for level in levels:
+        cells = engine.cells_for_bbox(*bbox, level)
+        bounds = cells.bounds
+        order = np.argsort(bounds[:, 0], kind="stable")
+        arrays = {
+            "ids": cells.ids[order],
+            "boundaries": cells.boundaries[order],
+            "sizes": cells.sizes[order].astype(np.uint8),
+            "bounds": bounds[order],
+            "centers": _centers(cells)[order],
+        }
+        for name, array in arrays.items():
+            np.save(os.path.join(path, _file_name(level, name)), array)
+        index["levels"][str(level)] = {
+            "count": len(cells),
+            "max_width": float((bounds[:, 2] - bounds[:, 0]).max()) if len(cells) else 0.0,
+        }
+    with open(os.path.join(path, INDEX_NAME), "w") as f:
+        json.dump(index, f, indent=2)
+    return GridPyramid(path)
+
+
+class GridPyramid:
+    """A pyramid of precomputed grid cells stored in a directory.
+
+    Level arrays are memory-mapped on first use. Mercator tiles are served
+    if their bbox intersects the requested one, H3 cells if their center is
+    inside it, like the live engines do.
+    """
+    def __init__(self, path: str):
+        """Open a pyramid written by :func:`build_pyramid`.
+        """
+        self.path = path
+        with open(os.path.join(path, INDEX_NAME)) as f:
+            self.index = json.load(f)
+        assert self.index["version"] == FORMAT_VERSION
+        self.kind = self.index["kind"]
+        self.bbox = tuple(self.index["bbox"])
+        self._arrays: Dict[int, Dict[str, np.ndarray]] = {}
+
+    @property
+    def levels(self):
+        return sorted(int(level) for level in self.index["levels"])
+
+    def arrays(self, level: int) -> Dict[str, np.ndarray]:
+        """Return the (memory-mapped) arrays of one level.
+        """
+        if level not in self._arrays:
+            self._arrays[level] = {
+                name: np.load(os.path.join(self.path, _file_name(level, name)), mmap_mode="r")
+                for name in ARRAYS
+            }
+        return self._arrays[level]
+
+    def covers(self, west: float, south: float, east: float, north: float, level: int) -> bool:
+        """Can the cells of this bbox and level be served from the pyramid?
+        """
+        a_west, a_south, a_east, a_north = self.bbox
+        return (
+            str(level) in self.index["levels"]
+            and a_west <= west <= east <= a_east
+            and a_south <= south <= north <= a_north
+        )
+
+    def cells_for_bbox(
+        self, west: float, south: float, east: float, north: float, level: int
+    ) -> GridCells:
+        """Return the stored cells of some level for a bbox inside the AOI.
+        """
+        arrays = self.arrays(level)
+        max_width = self.index["levels"][str(level)]["max_width"]
+        # Rows are sorted by west, so only a slice can intersect the bbox.
+        wests = arrays["bounds"][:, 0]
+        start = np.searchsorted(wests, west - max_width, side="left")
+        stop = np.searchsorted(wests, east, side="right")
+        if self.kind == "h3":
+            centers = np.asarray(arrays["centers"][start:stop])
+            lons, lats = centers[:, 0], centers[:, 1]
+            mask = (lons >= west) & (lons <= east) & (lats >= south) & (lats <= north)
+        else:
+            bounds = np.asarray(arrays["bounds"][start:stop])
+            mask = (
+                (bounds[:, 0] < east) & (bounds[:, 2] > west)
+                & (bounds[:, 1] < north) & (bounds[:, 3] > south)
+            )
+        rows = np.nonzero(mask)[0] + start
+        return GridCells(
+            self.kind, level,
+            np.asarray(arrays["ids"][rows]),
+            np.asarray(arrays["boundaries"][rows]),
+            np.asarray(arrays["sizes"][rows]).astype(np.int64),
+        )
+
+
+class PyramidGridEngine(GridEngine):
+    """A grid engine serving cells from a pyramid where possible.
+
+    Requests not covered by the pyramid (other levels, or bboxes reaching
+    outside of its AOI) are passed to the fallback engine, as are all other
+    methods.
+    """
+    def __init__(self, pyramid: GridPyramid, fallback: GridEngine):
+        assert pyramid.kind == fallback.kind
+        self.pyramid = pyramid
+        self.fallback = fallback
+        self.kind = fallback.kind
+        self.stats = {"served": 0, "computed": 0}
+
+    def __getattr__(self, name: str):
+        if name == "fallback":
+            raise AttributeError(name)
+        return getattr(self.fallback, name)
+
+    def estimate(self, west: float, south: float, east: float, north: float, level: int) -> int:
+        return self.fallback.estimate(west, south, east, north, level)
+
+    def cells_for_bbox(
+        self, west: float, south: float, east: float, north: float, level: int
+    ) -> GridCells:
+        if self.pyramid.covers(west, south, east, north, level):
+            self.stats["served"] += 1
+            return self.pyramid.cells_for_bbox(west, south, east, north, level)
+        self.stats["computed"] += 1
+        return self.fallback.cells_for_bbox(west, south, east, north, level)
+
+    def cell_at(self, lon: float, lat: float, level: int) -> GridCells:
+        return self.fallback.cell_at(lon, lat, level)
@@ -1,10 +1,340 @@
+import asyncio
+import collections
 import json
 import time
 import os
+from typing import Callable, List, Optional, Sequence
 
 from ipyfilechooser import FileChooser
 from ipyleaflet import basemaps, Map, WidgetControl
 from ipywidgets import Button, HBox, Layout
+import numpy as np
+
+from leafmaptools.events import Throttler, ViewportScheduler, get_scheduler
+from leafmaptools.recording import (
+    Recording, compact, load_recording, same_view, save_recording,
+)
+
+
+PLAYER_STATES = ["stopped", "playing", "paused"]
+
+
+class RecordingWriter:
+    """Append recorded events to a JSONL file as they come in.
+
+    Events are buffered and written at most every ``flush_interval``
+    seconds (on the asyncio loop of the kernel, or right away without a
+    running loop), or as soon as ``buffer_size`` events are waiting, so a
+    crash loses at most that much.
+
+    With ``max_bytes`` the file is rotated before it would grow beyond that
+    size: it is renamed to ``path.1``, ``path.2`` and so on, in the order of
+    recording, and a new file is started at ``path``. Numbering continues
+    after the highest ``path.N`` already there, so files rotated by earlier
+    writers, e.g. of earlier recordings, are kept. :attr:`files` lists all
+    files of this writer in order.
+    """
+    def __init__(
+        self, path: str, flush_interval: float = 1.0, buffer_size: int = 1000,
+        max_bytes: int = 0, fsync: bool = False
+    ):
+        """Open a file for appending.
+
+        :param path: The path of the JSONL file.
+        :param flush_interval: The maximum time in seconds events are buffered.
+        :param buffer_size: The maximum number of buffered events.
+        :param max_bytes: The maximum size of a file, or 0 to never rotate.
+        :param fsync: Also make the OS write flushed events to the disk.
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.buffer: List[str] = []
+        self.rotated: List[str] = []
+        self.stats = {"events": 0, "flushes": 0, "rotations": 0, "bytes": 0}
+        self._number = self._last_number()
+        self._file = open(path, "a")
+        self._size = self._file.tell()
+        self._throttler = Throttler(self.flush, wait=flush_interval)
+
+    @property
+    def files(self) -> List[str]:
+        """The paths of all files written to, oldest first.
+        """
+        return self.rotated + [self.path]
+
+    def write(self, event: dict):
+        """Add an event, to be written soon.
+        """
+        self.buffer.append(json.dumps(event) + "\n")
+        self.stats["events"] += 1
+        if len(self.buffer) >= self.buffer_size:
+            self._throttler.cancel()
+            self.flush()
+        else:
+            self._throttler()
+
+    def flush(self):
+        """Write all buffered events now.
+        """
+        if not self.buffer or self._file is None:
+            return
+        lines, self.buffer = self.buffer, []
+        for line in lines:
+            size = len(line.encode("utf-8"))
+            if self.max_bytes and self._size and self._size + size > self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self._size += size
+            self.stats["bytes"] += size
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.stats["flushes"] += 1
+
+    def _last_number(self) -> int:
+        directory, name = os.path.split(os.path.abspath(self.path))
+        numbers = [0]
+        for entry in os.listdir(directory):
+            suffix = entry[len(name) + 1:]
+            if entry.startswith(name + ".") and suffix.isdigit():
+                numbers.append(int(suffix))
+        return max(numbers)
+
+    def _rotate(self):
+        self._file.close()
+        self._number += 1
+        rotated = f"{self.path}.{self._number}"
+        os.replace(self.path, rotated)
+        self.rotated.append(rotated)
+        self._file = open(self.path, "a")
+        self._size = 0
+        self.stats["rotations"] += 1
+
+    def close(self):
+        """Write all buffered events and close the file.
+        """
+        self._throttler.cancel()
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class RecordingPlayer:
+    """Play a recording back on a map in an asyncio task.
+
+    The playback position is calculated from a monotonic clock, relative to
+    the moment playback started (or was resumed, sped up, or sought), so
+    the time spent updating the map does not add up to a drift. If the map
+    falls behind, events which are already overdue are skipped and only the
+    newest one is shown.
+
+    With ``interpolate`` the views between two events at the same zoom are
+    interpolated linearly every ``frame_interval`` seconds, e.g. for
+    recordings whose camera path was simplified with
+    :func:`~leafmaptools.recording.compact`.
+
+    Without a running asyncio loop :meth:`play` blocks until the end of the
+    recording, like a plain loop would.
+    """
+    def __init__(
+        self, a_map: Map, recording: Sequence[dict], speed: float = 1.0,
+        on_done: Callable[[], None] = None, clock: Callable[[], float] = time.monotonic,
+        interpolate: bool = False, frame_interval: float = 1 / 30
+    ):
+        """Constructor.
+
+        :param a_map: The map to show the recording on.
+        :param recording: The events, with ascending "ts" values, e.g. a
+            :class:`~leafmaptools.recording.Recording`, whose timestamps are
+            used without building the events.
+        :param speed: The playback speed, 2 meaning twice as fast.
+        :param on_done: Called when playback ended or was stopped.
+        :param clock: The monotonic clock to use, in seconds.
+        :param interpolate: Show interpolated views between events.
+        :param frame_interval: The time between interpolated views, in seconds.
+        """
+        assert speed > 0
+        self.a_map = a_map
+        self.recording = recording
+        if isinstance(recording, Recording):
+            self.timestamps = recording.ts
+        else:
+            self.timestamps = np.fromiter(
+                (event["ts"] for event in recording), dtype=float, count=len(recording)
+            )
+        self.on_done = on_done
+        self.clock = clock
+        self.interpolate = interpolate
+        self.frame_interval = frame_interval
+        self.state = "stopped"
+        self.stats = {"shown": 0, "skipped": 0, "frames": 0}
+        self.task: Optional[asyncio.Task] = None
+        self._speed = speed
+        self._index = 0
+        self._anchor_ts = float(self.timestamps[0]) if len(recording) else 0.0
+        self._anchor_clock = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._run_id = 0
+
+    @property
+    def position(self) -> float:
+        """The timestamp of the recording being played now.
+        """
+        if self.state != "playing":
+            return self._anchor_ts
+        return self._anchor_ts + (self.clock() - self._anchor_clock) * self._speed
+
+    def _reanchor(self, ts: float):
+        self._anchor_ts = ts
+        self._anchor_clock = self.clock()
+
+    @property
+    def speed(self) -> float:
+        return self._speed
+
+    @speed.setter
+    def speed(self, value: float):
+        assert value > 0
+        self._reanchor(self.position)
+        self._speed = value
+        self._wake()
+
+    def _wake(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def play(self):
+        """Start playback from the current position, or resume it.
+
+        A task of an earlier playback which was stopped but has not ended
+        yet is cancelled (and ``on_done`` called for it) first, so only one
+        task ever drives the map.
+        """
+        if self.state == "paused":
+            self.resume()
+            return
+        if self.state == "playing" or not len(self.recording):
+            return
+        self._run_id += 1
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            self._wakeup = None
+            if self.on_done is not None:
+                self.on_done()
+        if self._index >= len(self.recording):
+            self.seek(float(self.timestamps[0]))
+        self.state = "playing"
+        self._reanchor(self._anchor_ts)
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            asyncio.run(self._run(self._run_id))
+            return
+        self.task = loop.create_task(self._run(self._run_id))
+
+    def pause(self):
+        if self.state == "playing":
+            self._anchor_ts = self.position
+            self.state = "paused"
+            self._wake()
+
+    def resume(self):
+        if self.state == "paused":
+            self.state = "playing"
+            self._reanchor(self._anchor_ts)
+            self._wake()
+
+    def stop(self):
+        """Stop playback and rewind to the start.
+        """
+        if self.state != "stopped":
+            self.state = "stopped"
+            self._wake()
+        self._index = 0
+        self._anchor_ts = float(self.timestamps[0]) if len(self.recording) else 0.0
+
+    def seek(self, ts: float):
+        """Continue playback at some timestamp of the recording.
+
+        The last event at or before it is shown right away (or on resume).
+        """
+        self._index = max(0, int(np.searchsorted(self.timestamps, ts, side="right")) - 1)
+        playing = self.state == "playing"
+        if playing:
+            self._reanchor(ts)
+        else:
+            self._anchor_ts = ts
+        self._wake()
+
+    def interpolated(self, ts: float) -> Optional[dict]:
+        """Return the view at a timestamp between the last shown and the next event.
+
+        This is ``None`` if their zoom differs, so the last view is kept.
+        """
+        a, b = self.recording[self._index - 1], self.recording[self._index]
+        if a["zoom"] != b["zoom"]:
+            return None
+        f = (ts - a["ts"]) / (b["ts"] - a["ts"]) if b["ts"] > a["ts"] else 1.0
+        center = [x + (y - x) * f for x, y in zip(a["center"], b["center"])]
+        return {"ts": ts, "center": center, "zoom": a["zoom"]}
+
+    def show(self, event: dict):
+        """Move the map to the view of an event.
+        """
+        m = self.a_map
+        if m.zoom != event["zoom"]:
+            m.zoom = event["zoom"]
+        if m.center != event["center"]:
+            m.center = event["center"]
+
+    async def wait(self, wakeup: asyncio.Event, delay: Optional[float]):
+        """Wait until woken up (on pause, seek, etc.) or ``delay`` seconds passed.
+
+        Together with ``clock`` this can be replaced to play back in
+        simulated time, e.g. in tests.
+        """
+        try:
+            await asyncio.wait_for(wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, run_id: int):
+        # Every run has its own wakeup event, and ends once superseded.
+        wakeup = self._wakeup = asyncio.Event()
+        n = len(self.recording)
+        try:
+            while self._run_id == run_id and self.state != "stopped" and self._index < n:
+                if self.state == "playing":
+                    # Show the newest due event, skipping older ones.
+                    position = self.position
+                    due = int(np.searchsorted(self.timestamps, position, side="right")) - 1
+                    if due >= self._index:
+                        self.stats["skipped"] += due - self._index
+                        self.show(self.recording[due])
+                        self.stats["shown"] += 1
+                        self._index = due + 1
+                        continue
+                    delay = (float(self.timestamps[self._index]) - position) / self._speed
+                    if self.interpolate and self._index > 0:
+                        view = self.interpolated(position)
+                        if view is not None:
+                            self.show(view)
+                            self.stats["frames"] += 1
+                            delay = min(delay, self.frame_interval)
+                else:
+                    delay = None
+                wakeup.clear()
+                await self.wait(wakeup, delay)
+        finally:
+            if self._run_id == run_id:
+                self._wakeup = None
+                if self.state == "playing":
+                    self.stop()
+                if self.on_done is not None:
+                    self.on_done()
 
 
 class MapRecorder:
@@ -20,18 +350,61 @@ class MapRecorder:
       {"ts": 1617811104.3057659, "center": [0, 0], "zoom": 1.0}
       {"ts": 1617811105.2518709, "center": [20.6327, 59.0389], "zoom": 1.0}
       ...
+
+    Recordings can also be loaded from and saved to the binary formats of
+    :mod:`leafmaptools.recording` (files ending in ``.npy`` or ``.npz``),
+    where ``.npy`` files are memory-mapped instead of parsed.
+
+    With ``stream_path`` events are appended to such a file while recording
+    (see :class:`RecordingWriter`), and only the last ``max_events`` of them
+    are kept in memory, e.g. for long monitoring sessions.
+
+    Events repeating the last recorded view are never recorded. With
+    ``compact`` also events within ``pixels`` of it are dropped while
+    recording, and after recording (unless streaming) the recording is
+    compacted with :func:`~leafmaptools.recording.compact`, whose numbers
+    are kept in :attr:`stats`. Playback is then interpolated.
     """
-    def __init__(self, a_map: Map, path: str = ""):
+    def __init__(
+        self, a_map: Map, path: str = "", scheduler: ViewportScheduler = None,
+        speed: float = 1.0, stream_path: str = None, max_events: int = 10_000,
+        flush_interval: float = 1.0, max_bytes: int = 0, compact: bool = False,
+        pixels: float = 1.0, seconds: float = 0.1
+    ):
         """Constructor.
         
         :param a_map: The map for which to record events.
-        :param path: The path of a JSON records file containing a map recording.
+        :param path: The path of a JSON records, ``.npy`` or ``.npz`` file
+            containing a map recording.
+        :param scheduler: The scheduler delivering map changes, by default one
+            throttling them to at most ten per second.
+        :param speed: The playback speed, see :class:`RecordingPlayer`.
+        :param stream_path: The path of a JSONL file to stream recordings to.
+        :param max_events: The number of events kept in memory when streaming.
+        :param flush_interval: The maximum time events are buffered when
+            streaming, in seconds.
+        :param max_bytes: The size at which to rotate the streamed file, or 0.
+        :param compact: Drop events which make no visible difference.
+        :param pixels: The distance tolerance of ``compact`` in screen pixels.
+        :param seconds: The time tolerance of ``compact``.
         """
         self.recording = []
         if os.path.exists(path):
-            with open(path) as f:
-                self.recording = [json.loads(line) for line in f.read().splitlines()]
+            self.recording = load_recording(path)
         self.a_map = a_map
+        self.scheduler = scheduler or get_scheduler(a_map, wait=0.1, mode="throttle")
+        self.speed = speed
+        self.player: Optional[RecordingPlayer] = None
+        self.stream_path = stream_path
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.writer: Optional[RecordingWriter] = None
+        self.compact = compact
+        self.pixels = pixels
+        self.seconds = seconds
+        self.stats: Optional[dict] = None
+        self._dropped = {"duplicates": 0, "merged": 0}
 
         layout = Layout(width="30px")
         self.start = Button(tooltip="Start/Stop", icon="video-camera", layout=layout)
@@ -39,42 +412,68 @@ class MapRecorder:
         disabled = len(self.recording) == 0
         self.play = Button(tooltip="Play", icon="play", disabled=disabled, layout=layout)
         self.play.on_click(self.play_rec)
+        self.stop = Button(tooltip="Stop", icon="stop", disabled=True, layout=layout)
+        self.stop.on_click(self.stop_rec)
         self.save = Button(tooltip="Save", icon="floppy-o", disabled=disabled, layout=layout)
         self.save.on_click(self.save_rec)
         self.fc = FileChooser(os.getcwd())
-        self.widget = HBox([self.start, self.play, self.save])
+        self.widget = HBox([self.start, self.play, self.stop, self.save])
 
     def toggle_rec(self, btn):
         """Start/stop recording.
         
-        We listen only for changes in the map's ``bounds``. There are these
-        other event names, but these provide essentially the same information:
+        We listen only for changes in the map's view, coalesced by the
+        recorder's scheduler. There are these event names, but they provide
+        essentially the same information:
 
         zoom, center, bounds, bounds_polygon, north, south, east, west,
         pixel_bounds, top, bottom, right, left
+
+        The current view is recorded right away, and :meth:`map_interacted`
+        drops the repeats of it which the scheduler may deliver, too.
         """
         if btn.button_style == "":
             btn.button_style = "danger"  # red
             self.play.disabled = True
             self.play.save = True
             self.recording = []
-            self.a_map.observe(self.map_interacted, names="bounds", type="change")
+            self._dropped = {"duplicates": 0, "merged": 0}
+            if self.stream_path:
+                self.recording = collections.deque(maxlen=self.max_events)
+                self.writer = RecordingWriter(
+                    self.stream_path, flush_interval=self.flush_interval,
+                    max_bytes=self.max_bytes
+                )
+            self.scheduler.subscribe(self.map_interacted)
             self.map_interacted({"name": "bounds", "type": "change", "owner": self.a_map})
         elif btn.button_style == "danger":
             btn.button_style = ""
             self.play.disabled = False
             self.save.disabled = False
-            self.a_map.unobserve(self.map_interacted, names="bounds", type="change")
+            self.scheduler.unsubscribe(self.map_interacted)
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+            elif self.compact:
+                self.recording, self.stats = compact(
+                    self.recording, seconds=self.seconds, pixels=self.pixels
+                )
+                # Count the events dropped while recording, too.
+                for key, count in self._dropped.items():
+                    self.stats[key] += count
+                    self.stats["events"] += count
+                self.stats["ratio"] = self.stats["events"] / max(1, self.stats["kept"])
 
     def save_rec(self, btn):
         """Save recording to a local file using a pop-up selection panel.
+
+        The format is chosen by the file extension, see
+        :func:`~leafmaptools.recording.save_recording`.
         """
         def selected(obj):
             path = obj.get_interact_value()
             if path:
-                with open(path, "w") as f:
-                    for event in self.recording:
-                        f.write(json.dumps(event) + "\n")
+                save_recording(self.recording, path)
                 self.widget.children = tuple(list(self.widget.children[:-1]))            
         if self.widget.children[-1] == self.fc:
             self.widget.children = tuple(list(self.widget.children[:-1]))            
@@ -83,29 +482,57 @@ class MapRecorder:
             self.widget.children = tuple(list(self.widget.children) + [self.fc])
     
     def play_rec(self, btn):
-        """Play back recording.
+        """Play back recording, or pause/resume playback.
+
+        Playback runs as an asyncio task, see :class:`RecordingPlayer`.
         """
+        player = self.player
+        if player is not None and player.state == "playing":
+            player.pause()
+            self.play.icon = "play"
+            return
+        if player is not None and player.state == "paused":
+            player.resume()
+            self.play.icon = "pause"
+            return
         self.start.disabled = True
-        self.play.disabled = True
         self.save.disabled = True
-        m = self.a_map
-        for i, event in enumerate(self.recording):
-            ts = event["ts"]
-            center = event["center"]
-            zoom = event["zoom"]
-            if m.zoom != zoom:
-                m.zoom = zoom
-            if m.center != center:
-                m.center = center
-            if i < len(self.recording) - 1:
-                time.sleep(self.recording[i + 1]["ts"] - ts)
+        self.stop.disabled = False
+        self.play.icon = "pause"
+        self.player = RecordingPlayer(
+            self.a_map, self.recording, speed=self.speed, on_done=self.played,
+            interpolate=self.compact
+        )
+        self.player.play()
+
+    def stop_rec(self, btn):
+        """Stop playback.
+        """
+        if self.player is not None:
+            self.player.stop()
+
+    def played(self):
+        """Callback for the end of playback.
+        """
         self.start.disabled = False
         self.play.disabled = False
         self.save.disabled = False
+        self.stop.disabled = True
+        self.play.icon = "play"
 
     def map_interacted(self, event):
         """Callback for changes in map object.
         """
         m = event["owner"]
-        entry = {"ts": time.time(), "center": m.center, "zoom": m.zoom}
+        entry = {"ts": time.time(), "center": list(m.center), "zoom": m.zoom}
+        if len(self.recording):
+            last = self.recording[-1]
+            if same_view(last, entry):
+                self._dropped["duplicates"] += 1
+                return
+            if self.compact and same_view(last, entry, self.pixels):
+                self._dropped["merged"] += 1
+                return
         self.recording.append(entry)
+        if self.writer is not None:
+            self.writer.write(entry)
@@ -0,0 +1,292 @@
+"""
+Columnar storage of map recordings.
+
+A recording is stored as a NumPy structured array with one row per event
+and the columns ``ts``, ``lat``, ``lon`` and ``zoom`` (all float64). Two
+binary formats are supported besides the JSONL one of
+:class:`~leafmaptools.recorder.MapRecorder`:
+
+- ``.npy``: the plain array, which is memory-mapped when loaded, so even
+  recordings with millions of events are ready immediately and only the
+  parts played back or sought to are read;
+- ``.npz``: every column delta-encoded on the int64 view of its bits and
+  compressed, which is lossless and much smaller, but decoded on load.
+
+Converting between all formats is lossless for the values (integers in
+JSONL come back as floats)::
+
+  save_recording(read_jsonl("session.jsonl"), "session.npy")
+  recording = load_recording("session.npy")
+  player = RecordingPlayer(a_map, recording)
+
+Recorded views often repeat or hardly change, and :func:`compact` shrinks
+a recording without a visible difference on playback (played with
+interpolation if the camera path was simplified)::
+
+  recording, stats = compact(load_recording("session.npy"))
+  print(f"{stats['ratio']:.1f}x smaller")
+"""
+
+import json
+import math
+import os
+from typing import Iterable, Iterator, Tuple, Union
+
+import numpy as np
+
+from leafmaptools.simplify import douglas_peucker, tolerance_for_zoom
+
+
+EVENT_DTYPE = np.dtype([("ts", "<f8"), ("lat", "<f8"), ("lon", "<f8"), ("zoom", "<f8")])
+
+FORMAT_VERSION = 1
+
+VIEW_COLUMNS = ("lat", "lon", "zoom")
+
+
+def events_to_array(events: Iterable[dict]) -> np.ndarray:
+    """Convert recorded events (dicts with "ts", "center" and "zoom") to an array.
+    """
+    rows = ((e["ts"], e["center"][0], e["center"][1], e["zoom"]) for e in events)
+    return np.fromiter(rows, dtype=EVENT_DTYPE)
+
+
+def event_from_row(row: np.void) -> dict:
+    """Convert one row of a recording array to an event dict.
+    """
+    ts, lat, lon, zoom = row.tolist()
+    return {"ts": ts, "center": [lat, lon], "zoom": zoom}
+
+
+class Recording:
+    """A recording backed by a structured array, e.g. a memory-mapped one.
+
+    It behaves like a read-only list of event dicts, which are only built
+    for the rows actually accessed, and has the columns as arrays.
+    """
+    def __init__(self, array: np.ndarray):
+        assert array.dtype == EVENT_DTYPE
+        self.array = array
+
+    def __len__(self) -> int:
+        return len(self.array)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[dict, "Recording"]:
+        if isinstance(i, slice):
+            return Recording(self.array[i])
+        return event_from_row(self.array[i])
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self.array)):
+            yield self[i]
+
+    @property
+    def ts(self) -> np.ndarray:
+        return self.array["ts"]
+
+    def index_at(self, ts: float) -> int:
+        """Return the index of the last event at or before a timestamp, or -1.
+        """
+        return int(np.searchsorted(self.array["ts"], ts, side="right")) - 1
+
+
+def read_jsonl(path: str) -> np.ndarray:
+    """Read a JSONL recording line by line into an array.
+    """
+    def events():
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return events_to_array(events())
+
+
+def write_jsonl(array: np.ndarray, path: str):
+    """Write a recording array as JSONL, one event per line.
+    """
+    with open(path, "w") as f:
+        for row in array:
+            f.write(json.dumps(event_from_row(row)) + "\n")
+
+
+def _delta_encode(column: np.ndarray) -> np.ndarray:
+    # Differences of the bit patterns wrap around, but cumsum wraps back.
+    bits = np.ascontiguousarray(column, dtype="<f8").view("<i8")
+    return np.diff(bits, prepend=np.int64(0))
+
+
+def _delta_decode(deltas: np.ndarray) -> np.ndarray:
+    return np.cumsum(deltas, dtype="<i8").view("<f8")
+
+
+def _as_array(recording) -> np.ndarray:
+    array = recording.array if isinstance(recording, Recording) else recording
+    if not isinstance(array, np.ndarray):
+        array = events_to_array(array)
+    return array
+
+
+def save_recording(recording, path: str):
+    """Save a recording (events or an array) as ``.npy``, ``.npz`` or JSONL.
+
+    The format is chosen by the file extension, anything else than ``.npy``
+    and ``.npz`` being JSONL.
+    """
+    array = _as_array(recording)
+    ext = os.path.splitext(path)[1]
+    if ext == ".npy":
+        np.save(path, array)
+    elif ext == ".npz":
+        columns = {name: _delta_encode(array[name]) for name in EVENT_DTYPE.names}
+        np.savez_compressed(path, version=np.int64(FORMAT_VERSION), **columns)
+    else:
+        write_jsonl(array, path)
+
+
+def load_recording(path: str) -> Recording:
+    """Load a recording saved by :func:`save_recording` or a MapRecorder.
+
+    ``.npy`` files are memory-mapped, ``.npz`` files decoded and JSONL
+    files read line by line.
+    """
+    ext = os.path.splitext(path)[1]
+    if ext == ".npy":
+        return Recording(np.load(path, mmap_mode="r"))
+    if ext == ".npz":
+        with np.load(path) as data:
+            assert int(data["version"]) == FORMAT_VERSION
+            array = np.empty(len(data["ts"]), dtype=EVENT_DTYPE)
+            for name in EVENT_DTYPE.names:
+                array[name] = _delta_decode(data[name])
+        return Recording(array)
+    return Recording(read_jsonl(path))
+
+
+def same_view(a: dict, b: dict, pixels: float = 0.0) -> bool:
+    """Tell if two events show the same view, within some screen pixels.
+
+    Views at different zoom levels are never the same.
+    """
+    if a["zoom"] != b["zoom"]:
+        return False
+    if pixels <= 0:
+        return list(a["center"]) == list(b["center"])
+    (lat1, lon1), (lat2, lon2) = a["center"], b["center"]
+    tolerance = tolerance_for_zoom(a["zoom"], pixels, lat=max(abs(lat1), abs(lat2)))
+    return math.hypot(lat2 - lat1, lon2 - lon1) <= tolerance
+
+
+def duplicate_mask(array: np.ndarray) -> np.ndarray:
+    """Return a mask of the events to keep, dropping exact repeats of the previous view.
+    """
+    keep = np.zeros(len(array), dtype=bool)
+    keep[:1] = True
+    for name in VIEW_COLUMNS:
+        column = array[name]
+        keep[1:] |= column[1:] != column[:-1]
+    return keep
+
+
+def merge_mask(array: np.ndarray, seconds: float = 0.1, pixels: float = 1.0) -> np.ndarray:
+    """Return a mask of the events to keep, merging events close in space or time.
+
+    Events within ``pixels`` of the last kept view (at the same zoom) are
+    dropped. Of the remaining events, bursts starting within ``seconds``
+    are merged into their last event, so the final view of a burst is
+    shown at most ``seconds`` late. The first and last events are always
+    kept, so the recording lasts as long as before.
+    """
+    n = len(array)
+    keep = np.zeros(n, dtype=bool)
+    if not n:
+        return keep
+    ts, lat, lon, zoom = (array[name].tolist() for name in EVENT_DTYPE.names)
+    last = 0
+    keep[0] = True
+    for i in range(1, n):
+        if zoom[i] == zoom[last] and (
+            math.hypot(lat[i] - lat[last], lon[i] - lon[last])
+            <= tolerance_for_zoom(zoom[i], pixels, lat=max(abs(lat[i]), abs(lat[last])))
+        ):
+            continue
+        keep[i] = True
+        last = i
+    if seconds > 0:
+        indices = np.flatnonzero(keep).tolist()
+        start = previous = indices[0]
+        for i in indices[1:]:
+            if ts[i] - ts[start] <= seconds:
+                if previous != indices[0]:
+                    keep[previous] = False
+            else:
+                start = i
+            previous = i
+    keep[-1] = True
+    return keep
+
+
+def path_mask(array: np.ndarray, seconds: float = 0.1, pixels: float = 1.0) -> np.ndarray:
+    """Return a mask of the events to keep when simplifying the camera path.
+
+    Every run of events at the same zoom is simplified with Douglas-Peucker
+    on (time, lat, lon), scaled so that a unit is ``seconds`` or the size of
+    ``pixels`` screen pixels at that zoom and the highest latitude of the
+    run. Dropped views are then
+    within that tolerance of the views interpolated linearly between the
+    kept ones. Zoom changes are always kept.
+    """
+    n = len(array)
+    keep = np.ones(n, dtype=bool)
+    if seconds <= 0 or pixels <= 0:
+        return keep
+    zoom = array["zoom"]
+    starts = np.flatnonzero(np.concatenate([[True], zoom[1:] != zoom[:-1]]))
+    ends = np.append(starts[1:], n)
+    for a, b in zip(starts.tolist(), ends.tolist()):
+        if b - a < 3:
+            continue
+        run = array[a:b]
+        lat = float(np.nanmax(np.abs(run["lat"]), initial=0))
+        tolerance = tolerance_for_zoom(float(zoom[a]), pixels, lat=lat)
+        points = np.stack([
+            (run["ts"] - run["ts"][0]) / seconds,
+            (run["lat"] - run["lat"][0]) / tolerance,
+            (run["lon"] - run["lon"][0]) / tolerance,
+        ], axis=1)
+        keep[a:b] = douglas_peucker(points, 1.0)
+    return keep
+
+
+def compact(
+    recording, seconds: float = 0.1, pixels: float = 1.0, simplify: bool = True
+) -> Tuple[Recording, dict]:
+    """Shrink a recording by dropping events which make no visible difference.
+
+    This drops exact duplicates, merges events within ``pixels`` or
+    ``seconds`` (see :func:`merge_mask`) and, with ``simplify``, simplifies
+    the camera path (see :func:`path_mask`), after which the recording
+    should be played with interpolation.
+
+    :param recording: The events, an array or a :class:`Recording`.
+    :param seconds: The time tolerance.
+    :param pixels: The distance tolerance in screen pixels.
+    :param simplify: Simplify the camera path, too.
+    :return: The compacted recording, and the number of ``events`` before,
+        of those dropped as ``duplicates``, ``merged`` and ``simplified``,
+        of the ones ``kept`` and the compression ``ratio``.
+    """
+    array = _as_array(recording)
+    stats = {"events": len(array)}
+    keep = duplicate_mask(array)
+    stats["duplicates"] = int(len(array) - keep.sum())
+    array = array[keep]
+    keep = merge_mask(array, seconds, pixels)
+    stats["merged"] = int(len(array) - keep.sum())
+    array = array[keep]
+    keep = path_mask(array, seconds, pixels) if simplify else np.ones(len(array), dtype=bool)
+    stats["simplified"] = int(len(array) - keep.sum())
+    array = array[keep]
+    stats["kept"] = len(array)
+    stats["ratio"] = stats["events"] / max(1, len(array))
+    return Recording(array), stats
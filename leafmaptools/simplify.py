@@ -0,0 +1,260 @@
+"""
+Simplified versions of GeoJSON geometries for bands of map zoom levels.
+
+When zoomed out, most vertices of detailed polygons and lines fall onto the
+same screen pixel. A :class:`GeometryLevels` store precomputes one version
+of a FeatureCollection per zoom band, simplified with Douglas-Peucker to a
+tolerance of about one pixel at that zoom, and swaps the data of a layer to
+the right version as the map zoom changes::
+
+  levels = GeometryLevels(feature_collection)
+  layer = GeoJSON(data=levels.data_for_zoom(m.zoom))
+  m += layer
+  levels.follow(m, layer)
+  StyleTool(a_map=m, layer=layer)
+"""
+
+import math
+from typing import Dict, List, Sequence
+
+import numpy as np
+from ipyleaflet import Layer, Map
+
+from leafmaptools.engine import MERCATOR_MAX_LAT
+from leafmaptools.events import ViewportScheduler, get_scheduler
+from leafmaptools.utils import feature_bounds
+
+
+# Zoom levels at which the default zoom bands start.
+DEFAULT_ZOOMS = (0, 3, 6, 9, 12, 15)
+
+
+def tolerance_for_zoom(
+    zoom: float, pixels: float = 1.0, tile_size: int = 256, lat: float = 0.0
+) -> float:
+    """Return the simplification tolerance in degrees for some map zoom.
+
+    This is the size of ``pixels`` screen pixels in degrees at latitude
+    ``lat`` (north or south). In Web Mercator a pixel covers ``cos(lat)``
+    times fewer degrees of latitude than of longitude, and this is the
+    smaller of both, so it holds in every direction.
+
+    Example:
+
+    >>> tolerance_for_zoom(0)
+    1.40625
+    >>> round(tolerance_for_zoom(0, lat=60), 6)
+    0.703125
+    """
+    lat = min(abs(lat), MERCATOR_MAX_LAT)
+    return pixels * 360 / (tile_size * 2 ** zoom) * math.cos(math.radians(lat))
+
+
+def _segment_distances(points: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Calculate the distances of points to the segment from ``a`` to ``b``.
+    """
+    ab = b - a
+    length2 = float(ab @ ab)
+    if length2 == 0:
+        return np.linalg.norm(points - a, axis=1)
+    t = np.clip((points - a) @ ab / length2, 0, 1)
+    return np.linalg.norm(points - a - t[:, None] * ab, axis=1)
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float, closed: bool = False) -> np.ndarray:
+    """Return a mask of the points to keep when simplifying a line.
+
+    :param points: An (n, 2) array of positions, or (n, d) for d dimensions.
+    :param tolerance: The maximum distance of dropped points from the result.
+    :param closed: Treat the points as a ring whose first and last point are
+        the same. It is split at the point farthest from its start, and at
+        least four points are kept, so it stays a valid ring.
+    :return: A boolean array with ``True`` for the points to keep.
+    """
+    n = len(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[[0, -1]] = True
+    if n < 3:
+        return keep
+    stack = [(0, n - 1)]
+    if closed:
+        k = int(np.argmax(np.linalg.norm(points - points[0], axis=1)))
+        if 0 < k < n - 1:
+            keep[k] = True
+            stack = [(0, k), (k, n - 1)]
+    farthest = (0.0, None)
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        distances = _segment_distances(points[i + 1:j], points[i], points[j])
+        k = int(np.argmax(distances))
+        if distances[k] > tolerance:
+            keep[i + 1 + k] = True
+            stack += [(i, i + 1 + k), (i + 1 + k, j)]
+        elif distances[k] > farthest[0]:
+            farthest = (distances[k], i + 1 + k)
+    if closed and keep.sum() < 4 and farthest[1] is not None:
+        keep[farthest[1]] = True
+    return keep
+
+
+def simplify_line(coords: List[list], tolerance: float, closed: bool = False) -> List[list]:
+    """Simplify a GeoJSON line or ring, keeping the original positions.
+    """
+    if len(coords) < 3:
+        return coords
+    points = np.array([p[:2] for p in coords], dtype=float)
+    keep = douglas_peucker(points, tolerance, closed=closed)
+    return [coords[i] for i in np.nonzero(keep)[0].tolist()]
+
+
+def _simplify_polygon(rings: List[List[list]], tolerance: float) -> List[List[list]]:
+    if not rings:
+        return rings
+    result = [simplify_line(rings[0], tolerance, closed=True)]
+    for ring in rings[1:]:
+        # Holes smaller than the tolerance are dropped.
+        points = np.array([p[:2] for p in ring], dtype=float).reshape(-1, 2)
+        if len(points) and (points.max(axis=0) - points.min(axis=0)).max() > tolerance:
+            result.append(simplify_line(ring, tolerance, closed=True))
+    return result
+
+
+def simplify_geometry(geometry: dict, tolerance: float) -> dict:
+    """Simplify a GeoJSON geometry with Douglas-Peucker.
+
+    Points are returned as they are, lines and polygon rings are simplified
+    one by one, so shared borders of neighbouring polygons may not match
+    exactly anymore.
+    """
+    if geometry is None:
+        return None
+    kind = geometry["type"]
+    coords = geometry.get("coordinates")
+    if kind == "LineString":
+        coords = simplify_line(coords, tolerance)
+    elif kind == "MultiLineString":
+        coords = [simplify_line(line, tolerance) for line in coords]
+    elif kind == "Polygon":
+        coords = _simplify_polygon(coords, tolerance)
+    elif kind == "MultiPolygon":
+        coords = [_simplify_polygon(polygon, tolerance) for polygon in coords]
+    elif kind == "GeometryCollection":
+        return {
+            **geometry,
+            "geometries": [simplify_geometry(g, tolerance) for g in geometry["geometries"]]
+        }
+    else:
+        return geometry
+    result = {**geometry, "coordinates": coords}
+    result.pop("bbox", None)
+    return result
+
+
+def count_vertices(geojson_obj: dict) -> int:
+    """Count the positions in a GeoJSON object.
+    """
+    def count(coords):
+        if not coords:
+            return 0
+        if isinstance(coords[0], (int, float)):
+            return 1
+        return sum(count(c) for c in coords)
+
+    kind = geojson_obj.get("type")
+    if kind == "FeatureCollection":
+        return sum(count_vertices(f) for f in geojson_obj["features"])
+    if kind == "Feature":
+        geometry = geojson_obj.get("geometry")
+        return count_vertices(geometry) if geometry else 0
+    if kind == "GeometryCollection":
+        return sum(count_vertices(g) for g in geojson_obj["geometries"])
+    return count(geojson_obj.get("coordinates"))
+
+
+class GeometryLevels:
+    """A FeatureCollection precomputed at several levels of detail.
+
+    The zoom bands start at the given ``zooms``. The version for the band
+    from ``zooms[i]`` up to (excluding) ``zooms[i + 1]`` is simplified to
+    the tolerance of ``pixels`` pixels at ``zooms[i + 1]``, so it is
+    accurate within the whole band. The tolerance of every feature is
+    scaled to the latitude of its bbox edge farthest from the equator (see
+    :func:`tolerance_for_zoom`). The last band gets the original data.
+    Feature ids and properties are kept.
+    """
+    def __init__(
+        self, data: dict, zooms: Sequence[int] = DEFAULT_ZOOMS, pixels: float = 1.0
+    ):
+        """Simplify a FeatureCollection for all zoom bands.
+
+        :param data: The original FeatureCollection.
+        :param zooms: The zoom levels at which the bands start, ascending.
+        :param pixels: The tolerance in screen pixels.
+        """
+        assert list(zooms) == sorted(set(zooms)) and zooms
+        self.zooms = list(zooms)
+        self.pixels = pixels
+        self.versions: Dict[int, dict] = {}
+        boxes = feature_bounds(data)
+        lats = np.nan_to_num(np.abs(boxes[:, [1, 3]]).max(axis=1)).tolist()
+        for zoom, next_zoom in zip(self.zooms, self.zooms[1:]):
+            self.versions[zoom] = {
+                **data,
+                "features": [
+                    {
+                        **f,
+                        "geometry": simplify_geometry(
+                            f.get("geometry"), tolerance_for_zoom(next_zoom, pixels, lat=lat)
+                        ),
+                    }
+                    for f, lat in zip(data["features"], lats)
+                ],
+            }
+        self.versions[self.zooms[-1]] = data
+        self._followers = []
+
+    def band_for_zoom(self, zoom: float) -> int:
+        """Return the start of the zoom band containing ``zoom``.
+        """
+        i = int(np.searchsorted(self.zooms, zoom, side="right")) - 1
+        return self.zooms[max(0, i)]
+
+    def data_for_zoom(self, zoom: float) -> dict:
+        """Return the version of the data to show at some map zoom.
+        """
+        return self.versions[self.band_for_zoom(zoom)]
+
+    def vertex_counts(self) -> Dict[int, int]:
+        """Return the number of vertices of every version by band start.
+        """
+        return {zoom: count_vertices(data) for zoom, data in self.versions.items()}
+
+    def follow(self, a_map: Map, layer: Layer, scheduler: ViewportScheduler = None):
+        """Swap the data of a GeoJSON layer whenever the map enters a new zoom band.
+
+        :param a_map: The map whose zoom is followed.
+        :param layer: The layer to update, e.g. one styled with ``StyleTool``.
+        :param scheduler: The scheduler delivering map changes, by default
+            the debouncing one shared by all tools on ``a_map``.
+        """
+        scheduler = scheduler or get_scheduler(a_map)
+        shown = [None]
+
+        def zoomed(event):
+            band = self.band_for_zoom(a_map.zoom)
+            if band != shown[0]:
+                shown[0] = band
+                layer.data = self.versions[band]
+
+        scheduler.subscribe(zoomed)
+        self._followers.append((scheduler, zoomed))
+        zoomed({"type": "change", "name": "zoom", "owner": a_map})
+
+    def unfollow(self):
+        """Stop updating all layers passed to :meth:`follow`.
+        """
+        for scheduler, callback in self._followers:
+            scheduler.unsubscribe(callback)
+        self._followers = []
@@ -0,0 +1,157 @@
+"""
+A static spatial index over the bboxes of features or grid cells.
+
+The index is a packed R-tree, bulk-loaded with the Sort-Tile-Recursive
+(STR) algorithm and stored in a few flat NumPy arrays, so it can be
+built in one go, saved and loaded again without any pointers to follow::
+
+  tree = PackedRTree.from_features(feature_collection)
+  visible = tree.query(west, south, east, north)
+  hovered = tree.query_point(lon, lat)
+
+Queries return the indices of all items whose bbox intersects the query,
+i.e. candidates which callers may still test against the exact geometry.
+"""
+
+import math
+from typing import Dict
+
+import numpy as np
+
+from leafmaptools.engine import GridCells
+from leafmaptools.utils import feature_bounds
+
+
+def _str_order(boxes: np.ndarray, node_size: int) -> np.ndarray:
+    """Return the Sort-Tile-Recursive order of some boxes.
+
+    Boxes are sorted by the x of their centers into vertical slices of
+    ``slices * node_size`` boxes, and by the y of their centers inside
+    every slice, so consecutive runs of ``node_size`` boxes are compact.
+    """
+    n = len(boxes)
+    slices = math.ceil(math.sqrt(math.ceil(n / node_size)))
+    cx = boxes[:, 0] + boxes[:, 2]
+    cy = boxes[:, 1] + boxes[:, 3]
+    by_x = np.argsort(cx, kind="stable")
+    slice_ids = np.empty(n, dtype=np.int64)
+    slice_ids[by_x] = np.arange(n) // (slices * node_size)
+    return np.lexsort((cy, slice_ids))
+
+
+class PackedRTree:
+    """A static, packed R-tree over (west, south, east, north) bboxes.
+
+    All nodes live in one ``boxes`` array, level by level starting with the
+    leaves, with :attr:`levels` holding the offset where each level ends.
+    ``pointers`` holds the item index for leaves and the offset of the first
+    child for other nodes. The children of a node are the (at most
+    ``node_size``) consecutive nodes starting there.
+
+    Items with NaN bboxes (e.g. features without geometry) are left out.
+    """
+    def __init__(self, bounds: np.ndarray, node_size: int = 16):
+        """Build a tree.
+
+        :param bounds: An (n, 4) array of item bboxes as (west, south,
+            east, north) rows. Items are referred to by their row index.
+        :param node_size: The maximum number of children per node.
+        """
+        assert node_size >= 2
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+        self.node_size = node_size
+        self.size = len(bounds)
+
+        items = np.nonzero(~np.isnan(bounds).any(axis=1))[0]
+        order = _str_order(bounds[items], node_size)
+        level_boxes = [bounds[items[order]]]
+        level_pointers = [items[order]]
+        offset = len(items)
+        while len(level_boxes[-1]) > 1:
+            children = level_boxes[-1]
+            starts = np.arange(0, len(children), node_size)
+            boxes = np.concatenate([
+                np.minimum.reduceat(children[:, :2], starts, axis=0),
+                np.maximum.reduceat(children[:, 2:], starts, axis=0),
+            ], axis=1)
+            pointers = starts + offset - len(children)
+            # Reorder the parents (with their subtrees) for the next level.
+            order = _str_order(boxes, node_size)
+            level_boxes.append(boxes[order])
+            level_pointers.append(pointers[order])
+            offset += len(boxes)
+
+        self.boxes = np.concatenate(level_boxes)
+        self.pointers = np.concatenate(level_pointers).astype(np.int64)
+        self.levels = np.cumsum([len(b) for b in level_boxes]).astype(np.int64)
+
+    @classmethod
+    def from_features(cls, feature_collection: dict, node_size: int = 16) -> "PackedRTree":
+        """Build a tree over the features of a FeatureCollection.
+
+        Items are the indices of the features.
+        """
+        return cls(feature_bounds(feature_collection), node_size=node_size)
+
+    @classmethod
+    def from_cells(cls, cells: GridCells, node_size: int = 16) -> "PackedRTree":
+        """Build a tree over grid cells, e.g. computed by a grid engine.
+
+        Items are the indices of the cells.
+        """
+        return cls(cells.bounds, node_size=node_size)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """Return the tree as a dict of arrays, e.g. for ``np.savez``.
+        """
+        return {
+            "boxes": self.boxes,
+            "pointers": self.pointers,
+            "levels": self.levels,
+            "meta": np.array([self.node_size, self.size], dtype=np.int64),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "PackedRTree":
+        """Restore a tree from the output of :meth:`to_arrays`.
+        """
+        tree = cls.__new__(cls)
+        tree.boxes = np.asarray(arrays["boxes"], dtype=float)
+        tree.pointers = np.asarray(arrays["pointers"], dtype=np.int64)
+        tree.levels = np.asarray(arrays["levels"], dtype=np.int64)
+        tree.node_size, tree.size = (int(v) for v in arrays["meta"])
+        return tree
+
+    def query(self, west: float, south: float, east: float, north: float) -> np.ndarray:
+        """Return the sorted indices of all items intersecting a bbox.
+
+        Boxes touching the bbox count as intersecting. The tree is walked
+        one level at a time, testing all candidate nodes of a level at once.
+        """
+        if not len(self.boxes):
+            return np.zeros(0, dtype=np.int64)
+        level = len(self.levels) - 1
+        nodes = np.arange(self.levels[level - 1] if level else 0, self.levels[level])
+        while True:
+            boxes = self.boxes[nodes]
+            nodes = nodes[
+                (boxes[:, 0] <= east) & (boxes[:, 2] >= west)
+                & (boxes[:, 1] <= north) & (boxes[:, 3] >= south)
+            ]
+            if level == 0 or not len(nodes):
+                break
+            # Expand every hit node into the range of its children.
+            first = self.pointers[nodes]
+            end = self.levels[level - 1]
+            counts = np.minimum(first + self.node_size, end) - first
+            nodes = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            level -= 1
+        return np.sort(self.pointers[nodes]) if level == 0 else np.zeros(0, dtype=np.int64)
+
+    def query_point(self, lon: float, lat: float) -> np.ndarray:
+        """Return the sorted indices of all items whose bbox contains a point.
+        """
+        return self.query(lon, lat, lon, lat)
@@ -2,17 +2,313 @@
 A styling tool...
 """
 
-import copy
+import contextlib
 import json
-from typing import Iterator, Tuple
+from typing import Dict, Iterator, List, Sequence, Tuple
 
 from ipywidgets import (
     link, HTML, Textarea, Button, ButtonStyle, Checkbox, Layout, ColorPicker,
-    HBox, VBox, ToggleButton, IntSlider, FloatSlider, Dropdown
+    HBox, VBox, ToggleButton, IntSlider, FloatSlider, Dropdown, ValueWidget
 )
 from ipyleaflet import Layer, Map, WidgetControl
+from traitlets import Dict as DictTrait, HasTraits, Unicode
 
-from leafmaptools.utils import is_valid_json
+from leafmaptools.classify import SCHEMES, Choropleth
+from leafmaptools.events import Debouncer, Throttler
+from leafmaptools.utils import parse_json
+
+
+def diff_style(old: dict, new: dict) -> Tuple[dict, list]:
+    """Compare two style dicts.
+
+    :return: The items of ``new`` which are missing or different in ``old``,
+        and the keys of ``old`` missing in ``new``.
+    """
+    changed = {k: v for k, v in new.items() if k not in old or old[k] != v}
+    removed = [k for k in old if k not in new]
+    return changed, removed
+
+
+class StyleWriter:
+    """Write style changes to a layer in batches, at a capped rate.
+
+    Changes to one or more style attributes (e.g. ``style`` and
+    ``hover_style``) are accumulated and written at most once every
+    ``interval`` seconds, all attributes inside one ``hold_sync``, so a
+    dragged slider does not restyle the layer on every tick::
+
+      writer = StyleWriter(layer)
+      writer.update({"weight": 3})
+      with writer.transaction():
+          writer.update({"color": "red"})
+          writer.update({"weight": 1}, attr_name="hover_style")
+
+    Inside a transaction nothing is written until it ends. Changes not
+    altering the current style are not written at all.
+    """
+    def __init__(self, layer: Layer, attr_name: str = "style", interval: float = 0.1):
+        """Constructor.
+
+        :param layer: The layer to write to.
+        :param attr_name: The style attribute changes go to by default.
+        :param interval: The minimum time between two writes in seconds.
+        """
+        self.layer = layer
+        self.attr_name = attr_name
+        self.changes: Dict[str, dict] = {}
+        self.stats = {"changes": 0, "writes": 0}
+        # True while this writer assigns styles, to tell its own changes apart.
+        self.writing = False
+        self._depth = 0
+        self._throttler = Throttler(self.flush, wait=interval)
+
+    @property
+    def pending(self) -> bool:
+        """Are there changes which were not written yet?
+        """
+        return bool(self.changes)
+
+    def update(self, changes: dict, attr_name: str = None):
+        """Add changes to a style attribute, to be written soon.
+        """
+        attr_name = attr_name or self.attr_name
+        self.changes.setdefault(attr_name, {}).update(changes)
+        self.stats["changes"] += 1
+        if not self._depth:
+            self._throttler()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Write all changes made inside the ``with`` block at its end.
+        """
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self._throttler.cancel()
+                self.flush()
+
+    def flush(self):
+        """Write all pending changes now.
+        """
+        changes, self.changes = self.changes, {}
+        styles = {}
+        for attr_name, attr_changes in changes.items():
+            current = getattr(self.layer, attr_name)
+            changed, _ = diff_style(current, attr_changes)
+            if changed:
+                styles[attr_name] = {**current, **changed}
+        if not styles:
+            return
+        # Registry entries (see NamedStyle) are no widgets and have no hold_sync.
+        hold = getattr(self.layer, "hold_sync", self.layer.hold_trait_notifications)
+        self.writing = True
+        try:
+            with hold():
+                for attr_name, style in styles.items():
+                    setattr(self.layer, attr_name, style)
+        finally:
+            self.writing = False
+        self.stats["writes"] += 1
+
+
+class StyleBinding:
+    """Keep widgets and the keys of a layer's style attribute in sync, both ways.
+
+    Widget changes are written through a :class:`StyleWriter`. Changes of the
+    layer style made by others are shown in the widgets. Echoes are
+    suppressed: the binding ignores the style changes of its own writer
+    (tagged by :attr:`StyleWriter.writing`) and the widget changes it makes
+    itself. Keys whose widget already shows the new value are skipped, as
+    are keys with unwritten widget changes, which are newer.
+    """
+    def __init__(self, writer: StyleWriter, widgets: Dict[str, ValueWidget], attr_name: str = None):
+        """Bind widgets to style keys.
+
+        :param writer: The writer for the layer and style attribute.
+        :param widgets: The widgets by style key, e.g. ``{"weight": slider}``.
+        :param attr_name: The style attribute, by default the writer's one.
+        """
+        self.writer = writer
+        self.layer = writer.layer
+        self.attr_name = attr_name or writer.attr_name
+        self.widgets = dict(widgets)
+        self.stats = {"to_layer": 0, "to_widgets": 0, "echoes": 0}
+        self._updating = False
+        for widget in self.widgets.values():
+            widget.observe(self._widget_changed, names=["value"])
+        self.layer.observe(self._style_changed, names=[self.attr_name])
+
+    def _widget_changed(self, change: dict):
+        if self._updating:
+            self.stats["echoes"] += 1
+            return
+        key = next(k for k, w in self.widgets.items() if w is change["owner"])
+        self.writer.update({key: change["new"]}, attr_name=self.attr_name)
+        self.stats["to_layer"] += 1
+
+    def _style_changed(self, change: dict):
+        if self.writer.writing:
+            self.stats["echoes"] += 1
+            return
+        pending = self.writer.changes.get(self.attr_name, {})
+        self._updating = True
+        try:
+            for key, widget in self.widgets.items():
+                value = change["new"].get(key)
+                if value is None or key in pending or widget.value == value:
+                    continue
+                widget.value = value
+                self.stats["to_widgets"] += 1
+        finally:
+            self._updating = False
+
+    def attach(self, key: str, widget: ValueWidget):
+        """Bind another widget to a style key.
+        """
+        self.widgets[key] = widget
+        widget.observe(self._widget_changed, names=["value"])
+
+    def detach(self, key: str) -> ValueWidget:
+        """Stop syncing the widget of a style key and return it.
+        """
+        widget = self.widgets.pop(key)
+        widget.unobserve(self._widget_changed, names=["value"])
+        return widget
+
+    def close(self):
+        """Stop syncing.
+        """
+        for widget in self.widgets.values():
+            widget.unobserve(self._widget_changed, names=["value"])
+        self.layer.unobserve(self._style_changed, names=[self.attr_name])
+
+
+class NamedStyle(HasTraits):
+    """A style in a :class:`StyleRegistry`.
+
+    It has a ``style`` trait like a layer, so tools can edit it like one.
+    """
+    name = Unicode()
+    style = DictTrait()
+
+
+class StyleRegistry:
+    """Named styles shared by many layers.
+
+    Layers are bound to a named style (for one of their style attributes,
+    optionally with overrides of their own), and changing the style updates
+    all of them::
+
+      registry = StyleRegistry({"roads": {"color": "#888888", "weight": 2}})
+      registry.bind(highways, "roads", overrides={"weight": 4})
+      registry.bind(streets, "roads")
+      with registry.batch():
+          registry.update("roads", {"color": "#444444"})
+          registry.update("rivers", {"color": "#3388ff"})
+
+    Changed styles are marked dirty and written in one pass, at once or at
+    the end of a batch. Layers whose effective style did not change are not
+    written to, so nothing is sent for them.
+    """
+    def __init__(self, styles: Dict[str, dict] = None):
+        """Constructor.
+
+        :param styles: Initial styles by name.
+        """
+        self.entries: Dict[str, NamedStyle] = {}
+        self.bindings: Dict[str, List[Tuple[Layer, str, dict]]] = {}
+        self.dirty = set()
+        self.stats = {"writes": 0, "skipped": 0}
+        self._depth = 0
+        for name, style in (styles or {}).items():
+            self.replace(name, style)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self.entries)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __getitem__(self, name: str) -> dict:
+        return self.entries[name].style
+
+    def entry(self, name: str) -> NamedStyle:
+        """Return the entry of a style, creating an empty one if needed.
+        """
+        if name not in self.entries:
+            entry = NamedStyle(name=name)
+            entry.observe(self._changed, names=["style"])
+            self.entries[name] = entry
+        return self.entries[name]
+
+    def replace(self, name: str, style: dict):
+        """Set a style, defining it if needed.
+        """
+        self.entry(name).style = dict(style)
+
+    def update(self, name: str, changes: dict):
+        """Change some keys of a style, defining it if needed.
+        """
+        entry = self.entry(name)
+        entry.style = {**entry.style, **changes}
+
+    def bind(self, layer: Layer, name: str, attr_name: str = "style", overrides: dict = None):
+        """Make a style attribute of a layer follow a named style.
+
+        :param layer: The layer.
+        :param name: The name of the style.
+        :param attr_name: The layer's style attribute, e.g. "hover_style".
+        :param overrides: Keys overriding the named style for this layer.
+        """
+        self.unbind(layer, attr_name)
+        binding = (layer, attr_name, dict(overrides or {}))
+        self.bindings.setdefault(name, []).append(binding)
+        self._write(binding, self.entry(name).style)
+
+    def unbind(self, layer: Layer, attr_name: str = "style"):
+        """Stop updating a style attribute of a layer.
+        """
+        for bindings in self.bindings.values():
+            bindings[:] = [b for b in bindings if not (b[0] is layer and b[1] == attr_name)]
+
+    def _changed(self, change: dict):
+        self.dirty.add(change["owner"].name)
+        if not self._depth:
+            self.flush()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Write the styles changed inside the ``with`` block at its end.
+        """
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self.flush()
+
+    def flush(self):
+        """Write all dirty styles to their layers.
+        """
+        dirty, self.dirty = self.dirty, set()
+        for name in dirty:
+            style = self.entries[name].style
+            for binding in self.bindings.get(name, []):
+                self._write(binding, style)
+
+    def _write(self, binding: Tuple[Layer, str, dict], style: dict):
+        layer, attr_name, overrides = binding
+        effective = {**style, **overrides}
+        if getattr(layer, attr_name) == effective:
+            self.stats["skipped"] += 1
+            return
+        setattr(layer, attr_name, effective)
+        self.stats["writes"] += 1
 
 
 class StyleTool:
@@ -26,7 +322,11 @@ class StyleTool:
         transparent: bool = False,
         a_map: Map = None,
         layer: Layer = None,
-        place_control: bool = True
+        place_control: bool = True,
+        interval: float = 0.1,
+        classify: Sequence[str] = (),
+        registry: StyleRegistry = None,
+        style_name: str = None
     ):
         """Add a widget to the map that allows styling some given layer.
 
@@ -43,30 +343,52 @@ class StyleTool:
         :param transparent: A flag to indicate if the widget background should be
             transparent (default: ``False``). 
         :param position: The map corner where this widget will be placed. 
+        :param interval: The minimum time in seconds between two updates of
+            the layer while a slider is dragged, see :class:`StyleWriter`.
+        :param classify: Names of numeric feature properties offered for
+            coloring the features by classes, see
+            :class:`~leafmaptools.classify.Choropleth`. While features are
+            colored by classes, the color picker sets the color of the
+            features without a value.
+        :param registry: A style registry to edit the entry ``style_name`` of,
+            instead of the style of ``layer``. Then ``attr_name`` is ignored
+            and ``classify`` not supported.
+        :param style_name: The name of the registry entry to edit.
 
-        TODO: The UI elements should reflect changes to the layer triggered by
-              others. 
+        The UI elements reflect changes to the layer triggered by others, see
+        :class:`StyleBinding`.
         """
         assert kind in ["stroke", "fill"]
         assert orientation in ["horizontal", "vertical"]
+        if registry is not None:
+            assert style_name and not classify
+            layer = registry.entry(style_name)
+            attr_name = "style"
 
-        def restyle(change):
-            if change["type"] != "change":
-                return
-            owner = change["owner"]
-            style_copy = copy.copy(getattr(layer, attr_name))
-            attr_map = {
-                p: "color" if kind == "stroke" else "fillColor",
-                o: "opacity" if kind == "stroke" else "fillOpacity",
-                w: "weight"
-            }
-            if owner in [p, o, w]:
-                style_copy[attr_map[owner]] = owner.value
-                setattr(layer, attr_name, style_copy)
+        def reclassify(change):
+            if change["type"] == "change" and change["name"] == "value":
+                choropleth = self.choropleth
+                # The picker colors the features without a value meanwhile.
+                self.writer.flush()
+                if prop.value is not None and choropleth.name is None:
+                    self.binding.detach(choropleth.style_key)
+                    p.observe(recolor_missing, names=["value"])
+                choropleth.apply(prop.value, scheme=scheme.value, k=classes.value)
+                if prop.value is None and p not in self.binding.widgets.values():
+                    p.unobserve(recolor_missing, names=["value"])
+                    self.binding.attach(choropleth.style_key, p)
+
+        def recolor_missing(change):
+            self.choropleth.set_missing_color(change["new"])
 
         def close(button):
+            self.writer.flush()
+            self.binding.close()
+            if self.choropleth is not None:
+                self.choropleth.close()
             a_map.remove_control(wc)
 
+        self.writer = StyleWriter(layer, attr_name=attr_name, interval=interval)
         attr = getattr(layer, attr_name)
         style = getattr(layer, "style")
 
@@ -91,20 +413,37 @@ class StyleTool:
         for el in [p, o, w] if kind == "stroke" else [p, o]:
             link((dummy, "value"), (el, "disabled"))
 
-        p.observe(restyle)
-        o.observe(restyle)
+        widgets = {
+            "color" if kind == "stroke" else "fillColor": p,
+            "opacity" if kind == "stroke" else "fillOpacity": o,
+        }
         if kind == "stroke":
-            w.observe(restyle)
+            widgets["weight"] = w
         else:
             w.disabled = True
+        self.binding = StyleBinding(self.writer, widgets)
         q.on_click(close)
 
-        desc = HTML(f"{kind} {attr_name}")
+        desc = HTML(f"{kind} {style_name if registry is not None else attr_name}")
+
+        extra = []
+        self.choropleth = None
+        if classify:
+            key = "color" if kind == "stroke" else "fillColor"
+            self.choropleth = Choropleth(layer, style_key=key)
+            prop = Dropdown(options=[("uniform", None)] + list(classify), value=None)
+            scheme = Dropdown(options=SCHEMES, value=SCHEMES[0])
+            classes = IntSlider(min=2, max=9, value=5, description="classes")
+            prop.layout.width = scheme.layout.width = "150px"
+            classes.layout.width = "200px"
+            for el in [prop, scheme, classes]:
+                el.observe(reclassify)
+            extra = [prop, scheme, classes]
 
         if orientation=="horizontal":
-            self.widget = HBox([desc, p, w, o, q])
+            self.widget = HBox([desc, p, w, o, *extra, q])
         elif orientation=="vertical":
-            self.widget = VBox([HBox([desc, q]), p, w, o])
+            self.widget = VBox([HBox([desc, q]), p, w, o, *extra])
 
         wc = WidgetControl(widget=self.widget, position=position, transparent_bg=transparent)
         a_map.add_control(wc)
@@ -113,14 +452,21 @@ class StyleTool:
 class StyleTextTool:
     """A textual tool to style another layer on a map with a text-based GUI.
 
+    The JSON text is parsed and applied once typing paused for ``wait``
+    seconds. Parse errors are shown below the textarea, and the layer is
+    only restyled if some style key actually changed.
+
+    Changes of the style by others are shown in the textarea, unless it
+    shows an equal style already. The tool ignores the style changes it
+    makes itself and the text changes it makes itself, so nothing is sent
+    back and forth.
+
     :param m: The map object to which to add a styling widget.
     :param layer: The layer object which is to be styled.
     :param attr_name: The layer's attribute name storing the style object.
         This is usually one of: "style", "hover_style", and "point_style"
     :param position: The map corner where this widget will be placed.
-    
-    TODO: The JSON textarea should reflect changes to the layer triggered by
-          others. 
+    :param wait: The pause in seconds after the last edit before it is applied.
     """
     def __init__(self,
         position: str = "bottomleft",
@@ -130,29 +476,74 @@ class StyleTextTool:
         transparent: bool = False,
         a_map: Map = None,
         layer: Layer = None,
-        place_control: bool = True
+        place_control: bool = True,
+        wait: float = 0.5
     ):
+        def apply(text):
+            """Called with the text once typing paused.
+            """
+            value, error = parse_json(text)
+            if error is not None:
+                status.value = (
+                    f"<small>Invalid JSON at line {error.lineno}, "
+                    f"column {error.colno}: {error.msg}</small>"
+                )
+                return
+            if not isinstance(value, dict):
+                status.value = "<small>The style must be a JSON object.</small>"
+                return
+            status.value = ""
+            current = getattr(layer, attr_name)
+            changed, removed = diff_style(current, value)
+            if changed or removed:
+                style = {k: v for k, v in current.items() if k not in removed}
+                style.update(changed)
+                self._applying = True
+                try:
+                    setattr(layer, attr_name, style)
+                finally:
+                    self._applying = False
+
         def updated(change):
             """Called after each single-letter edit of the JSON in the textarea.
             """
-            if change["type"] != "change":
+            if change["type"] == "change" and change["name"] == "value" and not self._showing:
+                self.debouncer(change["new"])
+
+        def restyled(change):
+            """Called after the style of the layer changed, maybe by others.
+            """
+            if self._applying:
                 return
-            value = change["owner"].value
-            if not is_valid_json(value):
+            value, error = parse_json(ta.value)
+            if error is None and value == change["new"]:
                 return
-            else:
-                layer.style = json.loads(value)
+            self.debouncer.cancel()
+            self._showing = True
+            try:
+                ta.value = json.dumps(change["new"], indent=2)
+            finally:
+                self._showing = False
+            status.value = ""
 
         def close(button):
+            self.debouncer.cancel()
+            layer.unobserve(restyled, names=[attr_name])
             a_map.remove_control(wc)
 
+        self._applying = False
+        self._showing = False
+        self.debouncer = Debouncer(apply, wait=wait)
         layout = Layout(width="28px", height="28px", padding="0px 0px 0px 4px")
         btn = Button(tooltip="Close", icon="close", layout=layout)
         btn.on_click(close)
         ta = Textarea(value=json.dumps(getattr(layer, attr_name), indent=2))
         ta.layout.width = "200px"
         ta.observe(updated)
+        layer.observe(restyled, names=[attr_name])
+        status = HTML()
         header = HBox([HTML(f"<i>{attr_name} (JSON)</i>"), btn])
-        ui = VBox([header, ta])
-        wc = WidgetControl(widget=ui, position=position, transparent_bg=True)
+        self.textarea = ta
+        self.widget = VBox([header, ta, status])
+        wc = WidgetControl(widget=self.widget, position=position, transparent_bg=True)
         a_map.add_control(wc)
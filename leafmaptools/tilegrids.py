@@ -2,6 +2,8 @@
 A tool for drawing tile grids over a map.
 """
 
+import functools
+from concurrent.futures import Executor, ThreadPoolExecutor
 from typing import Iterator, Tuple
 
 import geojson
@@ -10,8 +12,18 @@ from ipywidgets import (
     HBox, VBox, ToggleButton, IntSlider, FloatSlider, Dropdown
 )
 from ipyleaflet import basemaps, Layer, Map, GeoJSON, Polyline, WidgetControl
-from h3 import h3
-import mercantile
+
+from leafmaptools.encoding import PayloadEncoder
+from leafmaptools.engine import (
+    BUDGET_POLICIES, FeatureCache, H3GridEngine, MercatorGridEngine,
+    level_within_budget, mercator_tile_ranges
+)
+from leafmaptools.events import LatestResultRunner, ViewportScheduler, get_scheduler
+from leafmaptools.pyramid import GridPyramid, PyramidGridEngine
+
+
+# Ways of drawing a Mercator grid: one polygon per tile or shared lines.
+RENDER_MODES = ["polygons", "lines"]
 
 
 # FIXME: Rename to MercatorTileGridTool
@@ -22,14 +34,76 @@ class TileGridTool:
     only as the user zooms and pans over it. The grid level is limited from 0
     to the current map zoom level plus 4, or there would be too many cells and
     the grid would be too dense to see anything else.
+
+    The cells are computed by a :class:`~leafmaptools.engine.MercatorGridEngine`.
+    In incremental mode (the default) features of tiles that stay on screen
+    are reused from a :class:`~leafmaptools.engine.FeatureCache`, and the
+    layer data is not reassigned at all (i.e. nothing is sent to the browser)
+    if the set of visible tiles did not change.
+
+    Before generating anything the number of tiles is calculated from the
+    viewport, and a level needing more than ``max_cells`` tiles is replaced
+    by a coarser one or not drawn at all, see
+    :func:`~leafmaptools.engine.level_within_budget`.
+
+    With ``render="lines"`` the grid is drawn as a single set of meridians
+    and parallels (see :func:`~leafmaptools.engine.mercator_grid_lines`).
+    Then a tile is only materialised as a polygon when the mouse moves over
+    it, and shown in the separate :attr:`highlight` layer.
+
+    With ``background=True`` the cells are computed on a worker thread, and
+    only the result for the newest viewport is shown.
     """
     def __init__(
         self, a_map: Map, description: str = "Mercator", position: str = "topright",
+        incremental: bool = True, max_cells: int = 10_000,
+        budget_policy: str = "coarser", scheduler: ViewportScheduler = None,
+        render: str = "polygons", encoder: PayloadEncoder = None,
+        engine: MercatorGridEngine = None, background: bool = False,
+        executor: Executor = None, pyramid: str = None,
     ):
         """Instantiate a tile grid tool and place it on a map.
+
+        :param incremental: Reuse the features of tiles which remain visible
+            and skip updating the layer if no tile entered or left the view.
+        :param max_cells: The maximum number of tiles to draw.
+        :param budget_policy: What to do if the grid would exceed
+            ``max_cells``, one of ``BUDGET_POLICIES``.
+        :param scheduler: The scheduler delivering map changes, by default
+            the debouncing one shared by all tools on ``a_map``.
+        :param render: How to draw the grid, one of ``RENDER_MODES``.
+        :param encoder: The encoder reducing the grid data before it is sent
+            to the browser, by default one rounding coordinates to the
+            precision needed at the current map zoom.
+        :param engine: The engine computing the grid cells.
+        :param background: Compute the grid cells on a worker thread, see
+            :class:`~leafmaptools.events.LatestResultRunner`.
+        :param executor: The executor to compute the grid cells on, implies
+            ``background``.
+        :param pyramid: The path of a grid pyramid (see
+            :mod:`leafmaptools.pyramid`) to serve precomputed cells from.
         """
+        assert budget_policy in BUDGET_POLICIES
+        assert render in RENDER_MODES
         self._max_zoom_delta = 4
 
+        self.incremental = incremental
+        self.max_cells = max_cells
+        self.budget_policy = budget_policy
+        self.scheduler = scheduler or get_scheduler(a_map)
+        self.render = render
+        self.encoder = encoder or PayloadEncoder()
+        self.engine = engine or MercatorGridEngine()
+        if pyramid:
+            self.engine = PyramidGridEngine(GridPyramid(pyramid), self.engine)
+        if background and executor is None:
+            executor = ThreadPoolExecutor(max_workers=1)
+        self.runner = LatestResultRunner(executor)
+        self.cache = FeatureCache()
+        self._digits = None
+        self.drawn_level = None
+        self._lines_key = None
+
         self.tile_id = ""
         self.level = int(a_map.zoom)
         style = {"color": "#888888", "weight": 1, "fillOpacity": 0}
@@ -38,12 +112,19 @@ class TileGridTool:
             data=geojson.Feature(),
             name=description,
             style=style,
-            hover_style=hover_style
+            hover_style=hover_style if render == "polygons" else {}
         )
+        self.highlight = None
+        if render == "lines":
+            self.highlight = GeoJSON(
+                data=geojson.Feature(),
+                name=f"{description} (hover)",
+                style={**style, **hover_style}
+            )
 
-        min, max = 0, int(a_map.zoom) + self._max_zoom_delta
+        min_, max_ = 0, int(a_map.zoom) + self._max_zoom_delta
         self.slider = IntSlider(
-            description=description, min=min, max=max, value=self.level
+            description=description, min=min_, max=max_, value=self.level
         )
         self.ht = HTML(f"ID: {self.tile_id} Map zoom: {int(a_map.zoom)}")
         self.close_btn = Button(
@@ -58,6 +139,14 @@ class TileGridTool:
                 self.tile_id = feature["id"]
                 self.ht.value = f"{self.tile_id} Map zoom: {int(a_map.zoom)}"
 
+        def mouse_moved(**kwargs):
+            if kwargs.get("type") == "mousemove" and self.drawn_level is not None:
+                lat, lon = kwargs["coordinates"]
+                feature = self.engine.cell_at(lon, lat, self.drawn_level).feature(0)
+                if feature["id"] != self.tile_id:
+                    self.highlight.data = feature
+                    hover("mouseover", feature)
+
         def slider_moved(event):
             if event["type"] == "change" and event["name"] == "value":
                 self.level = event["new"]
@@ -77,24 +166,59 @@ class TileGridTool:
                 self.slider.max = int(a_map.zoom) + self._max_zoom_delta
 
                 m = event["owner"]
+                # Attention in the order of west, south, east, north!
                 ((south, west), (north, east)) = m.bounds
-                
-                b_poly = list(m.bounds_polygon)
-                b_poly += [tuple(b_poly[0])]
-                # m += Polyline(locations=b_poly)
+                bbox = (west, south, east, north)
+                # m += Polyline(locations=list(m.bounds_polygon))
 
-                # Attention in the order of west, south, east, north!
-                tiles = mercantile.tiles(west, south, east, north, zooms=self.level)
-                
-                features = [mercantile.feature(t) for t in tiles]
-                self.gj.data = geojson.FeatureCollection(features=features)
+                level, message = level_within_budget(
+                    self.engine.estimate, bbox,
+                    self.level, self.max_cells, self.budget_policy
+                )
+                if message:
+                    self.ht.value += f" ({message})"
+                self.drawn_level = level
+                if level is None:
+                    self.runner.cancel()
+                    self.cache.clear()
+                    self._lines_key = None
+                    self.gj.data = geojson.FeatureCollection(features=[])
+                    return
+
+                # Cells reach a little beyond the view, so allow a degree more.
+                lat = max(abs(north), abs(south))
+                digits = self.encoder.digits_for(m.zoom, lat=lat + 1)
+                if digits != self._digits:
+                    self._digits = digits
+                    self._lines_key = None
+                    self.cache.clear()
+                    self.cache.encode = functools.partial(self.encoder.encode, digits=digits)
+
+                def show_lines(lines):
+                    self.gj.data = self.encoder.encode(lines, digits=digits)
+
+                def show_cells(cells):
+                    if self.incremental:
+                        entered, left = self.cache.update(cells)
+                        if entered or left:
+                            self.gj.data = self.cache.feature_collection()
+                    else:
+                        self.gj.data = self.encoder.encode(cells.to_geojson(), digits=digits)
+
+                if self.render == "lines":
+                    key = (level, tuple(mercator_tile_ranges(*bbox, level)))
+                    if key != self._lines_key or not self.incremental:
+                        self._lines_key = key
+                        compute = functools.partial(self.engine.lines_for_bbox, *bbox, level)
+                        self.runner.submit(compute, show_lines)
+                else:
+                    compute = functools.partial(self.engine.cells_for_bbox, *bbox, level)
+                    self.runner.submit(compute, show_cells)
 
                 # Ipyleaflet buglet(?): This name is updated in the GeoJSON layer,
                 # but not in the LayersControl!
                 self.gj.name = f"Mercator"  # level {self.level}"
 
-                self.gj.on_hover(hover)
-
         def close_click(change):
             self.widget.children = []
             self.widget.close()
@@ -102,7 +226,12 @@ class TileGridTool:
         self.close_btn.on_click(close_click)
 
         a_map += self.gj
-        a_map.observe(map_interacted)
+        if render == "lines":
+            a_map += self.highlight
+            a_map.on_interaction(mouse_moved)
+        else:
+            self.gj.on_hover(hover)
+        self.scheduler.subscribe(map_interacted)
         map_interacted({"type": "change", "name": "bounds", "owner": a_map})
 
         self.widget_control = WidgetControl(widget=self.widget, position=position)
@@ -116,14 +245,62 @@ class H3TileGridTool:
     only as the user zooms and pans over it. The grid level is limited from 0
     to the current map zoom level plus 4, or there would be too many cells and
     the grid would be too dense to see anything else.
+
+    The number of cells is estimated from the viewport area first, and a
+    resolution needing more than ``max_cells`` cells is replaced by a coarser
+    one or not drawn at all, see :func:`~leafmaptools.engine.level_within_budget`.
+
+    The cells are computed by a :class:`~leafmaptools.engine.H3GridEngine`,
+    which derives them from previous viewports and resolutions where possible
+    and only polyfills newly exposed areas. With ``background=True`` this
+    happens on a worker thread, and only the result for the newest viewport
+    is shown.
     """
     def __init__(
         self, a_map: Map, description: str = "H3", position: str = "topright",
+        cache_size: int = 100_000, coverage_size: int = 8, max_cells: int = 10_000,
+        budget_policy: str = "coarser", scheduler: ViewportScheduler = None,
+        encoder: PayloadEncoder = None, engine: H3GridEngine = None,
+        background: bool = False, executor: Executor = None, pyramid: str = None,
     ):
         """Instantiate a tile grid tool and place it on a map.
+
+        :param cache_size: The maximum number of cell boundaries to keep in
+            the engine's :class:`~leafmaptools.engine.H3BoundaryCache`.
+        :param coverage_size: The maximum number of viewport coverages to
+            keep in the engine's :class:`~leafmaptools.engine.H3CoverageCache`.
+        :param max_cells: The maximum number of cells to draw, estimated from
+            the viewport area before running the polyfill.
+        :param budget_policy: What to do if the grid would exceed
+            ``max_cells``, one of ``BUDGET_POLICIES``.
+        :param scheduler: The scheduler delivering map changes, by default
+            the debouncing one shared by all tools on ``a_map``.
+        :param encoder: The encoder reducing the grid data before it is sent
+            to the browser, by default one rounding coordinates to the
+            precision needed at the current map zoom.
+        :param engine: The engine computing the grid cells, by default a new
+            one using ``cache_size`` and ``coverage_size``.
+        :param background: Compute the grid cells on a worker thread, see
+            :class:`~leafmaptools.events.LatestResultRunner`.
+        :param executor: The executor to compute the grid cells on, implies
+            ``background``.
+        :param pyramid: The path of a grid pyramid (see
+            :mod:`leafmaptools.pyramid`) to serve precomputed cells from.
         """
+        assert budget_policy in BUDGET_POLICIES
         self._max_zoom_delta = -1
 
+        self.engine = engine or H3GridEngine(cache_size=cache_size, coverage_size=coverage_size)
+        if pyramid:
+            self.engine = PyramidGridEngine(GridPyramid(pyramid), self.engine)
+        if background and executor is None:
+            executor = ThreadPoolExecutor(max_workers=1)
+        self.runner = LatestResultRunner(executor)
+        self.max_cells = max_cells
+        self.budget_policy = budget_policy
+        self.scheduler = scheduler or get_scheduler(a_map)
+        self.encoder = encoder or PayloadEncoder()
+
         self.tile_id = ""
         self.level = int(a_map.zoom)
         style = {"color": "#888888", "weight": 1, "fillOpacity": 0}
@@ -170,28 +347,33 @@ class H3TileGridTool:
                 self.ht.value = f"{self.tile_id}, Map zoom: {int(a_map.zoom)}"
                 self.slider.max = int(a_map.zoom) + self._max_zoom_delta
                 m = event["owner"]
+                ((south, west), (north, east)) = m.bounds
+                bbox = (west, south, east, north)
 
-                b_poly = list(m.bounds_polygon)
-                b_poly += [tuple(b_poly[0])]
-                # m += Polyline(locations=b_poly)
-                poly = geojson.Polygon(
-                    coordinates=[[(p[0], p[1]) for p in b_poly]]
+                level, message = level_within_budget(
+                    self.engine.estimate, bbox,
+                    self.slider.value, self.max_cells, self.budget_policy
                 )
-                hexagons = list(h3.polyfill(dict(poly), self.slider.value))
-                fc = geojson.FeatureCollection(features=[
-                    geojson.Polygon(
-                        coordinates=h3.h3_set_to_multi_polygon([h], geo_json=True)[0],
-                        id=h
-                    ) for h in hexagons]
-                )
-                self.gj.data = fc
+                if message:
+                    self.ht.value += f" ({message})"
+                if level is None:
+                    self.runner.cancel()
+                    self.gj.data = geojson.FeatureCollection(features=[])
+                    return
+
+                # m += Polyline(locations=list(m.bounds_polygon))
+                zoom = m.zoom
+
+                def show_cells(cells):
+                    self.gj.data = self.encoder.encode(cells.to_geojson(), zoom=zoom)
+
+                compute = functools.partial(self.engine.cells_for_bbox, *bbox, level)
+                self.runner.submit(compute, show_cells)
 
                 # Ipyleaflet buglet(?): This name is updated in the GeoJSON layer,
                 # but not in the LayersControl!
                 self.gj.name = f"H3"  # level {self.level}"
 
-                self.gj.on_hover(hover)
-
         def close_click(change):
             self.widget.children = []
             self.widget.close()
@@ -199,7 +381,8 @@ class H3TileGridTool:
         self.close_btn.on_click(close_click)
 
         a_map += self.gj
-        a_map.observe(map_interacted)
+        self.gj.on_hover(hover)
+        self.scheduler.subscribe(map_interacted)
         map_interacted({"type": "change", "name": "bounds", "owner": a_map})
 
         self.widget_control = WidgetControl(widget=self.widget, position=position)
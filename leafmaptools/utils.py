@@ -3,29 +3,150 @@ Some leafmaptools utilities.
 """
 
 import json
-from typing import Tuple
+import math
+from typing import Any, Iterator, List, Optional, Tuple
 
-import geojson
+import numpy as np
+
+
+# Positions are reduced in chunks of this size, with NumPy if a chunk has
+# at least NUMPY_MIN_POSITIONS of them.
+CHUNK_SIZE = 65_536
+NUMPY_MIN_POSITIONS = 1_000
+
+
+def _geometries(geojson_obj: dict) -> Iterator[dict]:
+    """Yield the geometries with coordinates inside a GeoJSON object.
+    """
+    if geojson_obj is None:
+        return
+    if "features" in geojson_obj:
+        for feature in geojson_obj["features"]:
+            yield from _geometries(feature)
+    elif "geometry" in geojson_obj:
+        yield from _geometries(geojson_obj["geometry"])
+    elif "geometries" in geojson_obj:
+        for geometry in geojson_obj["geometries"]:
+            yield from _geometries(geometry)
+    elif "coordinates" in geojson_obj:
+        yield geojson_obj
+
+
+def _positions(coords: list) -> list:
+    """Return the positions of nested GeoJSON coordinates as one flat list.
+    """
+    depth, first = 0, coords
+    while first and not isinstance(first[0], (int, float)):
+        depth, first = depth + 1, first[0]
+    if not first:
+        depth = max(depth, 1)
+    if depth == 0:
+        return [coords]
+    while depth > 1:
+        coords = [p for part in coords for p in part]
+        depth -= 1
+    return coords
+
+
+def _bbox(positions: list) -> Optional[Tuple[float, float, float, float]]:
+    """Return the (west, south, east, north) bbox of some positions.
+    """
+    if not positions:
+        return None
+    if len(positions) >= NUMPY_MIN_POSITIONS:
+        try:
+            array = np.array(positions, dtype=float)
+        except ValueError:
+            # Positions with and without altitude.
+            array = np.array([p[:2] for p in positions], dtype=float)
+        west, south = array[:, :2].min(axis=0).tolist()
+        east, north = array[:, :2].max(axis=0).tolist()
+        return west, south, east, north
+    west = south = math.inf
+    east = north = -math.inf
+    for position in positions:
+        lon, lat = position[0], position[1]
+        if lon < west:
+            west = lon
+        if lon > east:
+            east = lon
+        if lat < south:
+            south = lat
+        if lat > north:
+            north = lat
+    return west, south, east, north
+
+
+def _union(a, b):
+    if a is None or b is None:
+        return a or b
+    return min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])
 
 
 def bounds(geojson_obj: dict) -> Tuple[Tuple[float, float], Tuple[float, float]]:
     """Calculate the bounds of the GeoJSON object as [[south, west], [north, east]].
+
+    Positions are collected and reduced in chunks, in one pass over the
+    object, so no list of all coordinates is built.
     """
-    # Is there really no simpler/faster way to do this (without NumPy)?
-    coords = list(geojson.utils.coords(geojson_obj))
-    south = min(lat for lon, lat in coords)
-    north = max(lat for lon, lat in coords)
-    west = min(lon for lon, lat in coords)
-    east = max(lon for lon, lat in coords)
+    box, chunk = None, []
+    for geometry in _geometries(geojson_obj):
+        chunk.extend(_positions(geometry["coordinates"]))
+        if len(chunk) >= CHUNK_SIZE:
+            box, chunk = _union(box, _bbox(chunk)), []
+    box = _union(box, _bbox(chunk))
+    if box is None:
+        raise ValueError("The GeoJSON object has no coordinates.")
+    west, south, east, north = box
     bounds = [[south, west], [north, east]]
     return bounds
 
 
+def feature_bounds(feature_collection: dict) -> np.ndarray:
+    """Calculate the bboxes of all features of a FeatureCollection at once.
+
+    :param feature_collection: A GeoJSON FeatureCollection.
+    :return: An (n, 4) array of (west, south, east, north) rows, one per
+        feature and in the same order, with NaNs for features without
+        coordinates.
+    """
+    features = feature_collection["features"]
+    result = np.full((len(features), 4), np.nan)
+    positions: List[list] = []
+    counts = np.zeros(len(features), dtype=np.int64)
+    for i, feature in enumerate(features):
+        for geometry in _geometries(feature):
+            points = _positions(geometry["coordinates"])
+            positions.extend(points)
+            counts[i] += len(points)
+    if not positions:
+        return result
+    try:
+        array = np.array(positions, dtype=float)
+    except ValueError:
+        array = np.array([p[:2] for p in positions], dtype=float)
+    array = array[:, :2]
+    # Reduce the positions of every non-empty feature in one go.
+    rows = np.nonzero(counts)[0]
+    starts = np.concatenate([[0], np.cumsum(counts[rows])[:-1]])
+    result[rows, :2] = np.minimum.reduceat(array, starts, axis=0)
+    result[rows, 2:] = np.maximum.reduceat(array, starts, axis=0)
+    return result
+
+
+def parse_json(text: str) -> Tuple[Any, Optional[json.JSONDecodeError]]:
+    """Parse JSON text once, returning the result and the error, if any.
+
+    :return: The parsed object and ``None``, or ``None`` and the error, whose
+        ``pos``, ``lineno`` and ``colno`` attributes tell where parsing failed.
+    """
+    try:
+        return json.loads(text), None
+    except json.JSONDecodeError as e:
+        return None, e
+
+
 def is_valid_json(text: str) -> bool:
     """Is this text valid JSON?
     """
-    try:
-        json.loads(text)
-        return True
-    except json.JSONDecodeError:
-        return False
+    return parse_json(text)[1] is None
@@ -0,0 +1,110 @@
+"""
+A lightweight stand-in for ``ipyleaflet.Map`` to drive tools without a browser,
+used by the tests and the benchmarks.
+"""
+
+import math
+from typing import List, Tuple
+
+from traitlets import CFloat, HasTraits, List as ListTrait, Tuple as TupleTrait
+
+
+TILE_SIZE = 256
+
+
+class FakeMap(HasTraits):
+    """A map with the traits and methods the tools use, but no frontend.
+
+    The view is set with :meth:`set_view`, which calculates the bounds for a
+    viewport of some pixel size like Leaflet does. Layers and controls are
+    only collected in lists.
+    """
+    center = ListTrait([0.0, 0.0])
+    zoom = CFloat(1)
+    bounds = TupleTrait()
+    bounds_polygon = TupleTrait()
+
+    def __init__(self, center=(0.0, 0.0), zoom: float = 1, size: Tuple[int, int] = (800, 600)):
+        super().__init__()
+        self.layers = []
+        self.controls = []
+        self.interaction_callbacks = []
+        self.size = size
+        self.set_view(center, zoom)
+
+    def set_view(self, center: Tuple[float, float], zoom: float):
+        """Set the center (lat, lon) and zoom and update the bounds.
+        """
+        (south, west), (north, east) = viewport_bounds(center, zoom, self.size)
+        with self.hold_trait_notifications():
+            self.center = list(center)
+            self.zoom = zoom
+            self.bounds = ((south, west), (north, east))
+            self.bounds_polygon = ((north, west), (north, east), (south, east), (south, west))
+
+    def add(self, layer):
+        self.layers.append(layer)
+        return self
+
+    def __iadd__(self, layer):
+        return self.add(layer)
+
+    def add_layer(self, layer):
+        self.add(layer)
+
+    def remove(self, layer):
+        self.layers.remove(layer)
+
+    def add_control(self, control):
+        self.controls.append(control)
+
+    def remove_control(self, control):
+        self.controls.remove(control)
+
+    def on_interaction(self, callback):
+        self.interaction_callbacks.append(callback)
+
+
+def _lat_to_y(lat: float) -> float:
+    lat = max(-85.0511287798, min(85.0511287798, lat))
+    s = math.sin(math.radians(lat))
+    return 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+
+
+def _y_to_lat(y: float) -> float:
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+
+
+def viewport_bounds(
+    center: Tuple[float, float], zoom: float, size: Tuple[int, int]
+) -> Tuple[Tuple[float, float], Tuple[float, float]]:
+    """Calculate the bounds ((south, west), (north, east)) of a Web Mercator viewport.
+
+    :param center: The center as (lat, lon).
+    :param zoom: The (possibly fractional) zoom level.
+    :param size: The viewport size in pixels as (width, height).
+    """
+    lat, lon = center
+    width, height = size
+    world = TILE_SIZE * 2 ** zoom
+    x = (lon + 180) / 360
+    y = _lat_to_y(lat)
+    dx, dy = width / 2 / world, height / 2 / world
+    west, east = (x - dx) * 360 - 180, (x + dx) * 360 - 180
+    north, south = _y_to_lat(max(0.0, y - dy)), _y_to_lat(min(1.0, y + dy))
+    return (south, west), (north, east)
+
+
+def scripted_views(
+    center: Tuple[float, float], zoom: float, size: Tuple[int, int], pans: int = 10
+) -> List[Tuple[Tuple[float, float], float]]:
+    """Make a sequence of views: pans by a quarter viewport, a zoom in and out.
+
+    :return: A list of ``(center, zoom)`` tuples.
+    """
+    lat, lon = center
+    step = size[0] / 4 / (TILE_SIZE * 2 ** zoom) * 360
+    views = [((lat, lon + i * step), zoom) for i in range(1, pans + 1)]
+    last = views[-1][0]
+    views += [(last, zoom + 1), (last, zoom)]
+    return views
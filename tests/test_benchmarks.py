@@ -0,0 +1,27 @@
+"""
+Tests for the `benchmarks` package.
+"""
+
+
+from benchmarks.bench_tilegrids import TOOLS, compare, run_scenario
+from tests.fake_map import viewport_bounds
+
+
+def test_viewport_bounds():
+    """Test `tests.fake_map.viewport_bounds`.
+    """
+    (south, west), (north, east) = viewport_bounds((0, 0), 1, (512, 512))
+    assert (west, east) == (-180, 180)
+    assert round(north, 4) == -round(south, 4) == 85.0511
+
+
+def test_run_scenario():
+    """Test `benchmarks.bench_tilegrids.run_scenario` on a `FakeMap`.
+    """
+    for name, (factory, offsets) in TOOLS.items():
+        result = run_scenario(factory, 6, offsets[0], (400, 300), 1, memory=False)
+        assert result["updates"] == 3
+        assert result["cells_per_update_mean"] > 0
+        assert result["payload_bytes_max"] > 0
+        result = {"benchmark": name, **result}
+        assert compare({"results": [result]}, {"results": [result]})
@@ -0,0 +1,128 @@
+"""
+Tests for `leafmaptools.classify` module.
+"""
+
+
+import math
+
+import numpy as np
+from ipyleaflet import GeoJSON
+
+from leafmaptools.classify import (
+    Choropleth, classify, equal_interval_breaks, interpolate_palette, natural_breaks,
+    quantile_breaks
+)
+from leafmaptools.events import ViewportScheduler
+from leafmaptools.simplify import GeometryLevels, count_vertices
+
+from tests.fake_map import FakeMap
+
+
+def test_breaks():
+    """Test `leafmaptools.classify` schemes and `classify`.
+    """
+    values = np.arange(1, 101, dtype=float)
+    assert quantile_breaks(values, 4).tolist() == [1, 25.75, 50.5, 75.25, 100]
+    assert equal_interval_breaks(values, 3).tolist() == [1, 34, 67, 100]
+
+    rng = np.random.default_rng(1)
+    values = np.concatenate([rng.normal(mean, 1, 300) for mean in [0, 10, 20]])
+    edges = natural_breaks(values, 3)
+    assert edges[0] == values.min() and edges[-1] == values.max()
+    assert np.bincount(classify(values, edges)).tolist() == [300, 300, 300]
+    sampled = natural_breaks(values, 3, sample_size=200)
+    assert np.abs(np.bincount(classify(values, sampled)) - 300).max() < 10
+
+    assert classify(np.array([0, 1, 1.5, 2, 3, np.nan]), np.array([0, 1, 2, 3])).tolist() == \
+        [0, 0, 1, 1, 2, -1]
+
+
+def test_interpolate_palette():
+    """Test `leafmaptools.classify.interpolate_palette`.
+    """
+    assert interpolate_palette(["#000000", "#ffffff"], 3) == ["#000000", "#808080", "#ffffff"]
+    assert interpolate_palette(["#000000", "#ffffff"], 2) == ["#000000", "#ffffff"]
+
+
+def test_choropleth():
+    """Test `leafmaptools.classify.Choropleth`.
+    """
+    features = [
+        {"type": "Feature", "geometry": None, "properties": {"v": v, "style": {"weight": 2}}}
+        for v in [1, 2, 3, 4, "n/a"]
+    ]
+    layer = GeoJSON(data={"type": "FeatureCollection", "features": features})
+    choropleth = Choropleth(layer, palette=["#000000", "#ffffff"])
+    edges = choropleth.apply("v", scheme="equal_interval", k=3)
+    assert edges.tolist() == [1, 2, 3, 4]
+    styles = [f["properties"]["style"] for f in layer.data["features"]]
+    assert styles == [
+        {"weight": 2, "fillColor": "#000000"},
+        {"weight": 2, "fillColor": "#000000"},
+        {"weight": 2, "fillColor": "#808080"},
+        {"weight": 2, "fillColor": "#ffffff"},
+        {"weight": 2},
+    ]
+    assert features[0]["properties"]["style"] == {"weight": 2}
+    assert choropleth.edges("v", "equal_interval", 3) is edges
+
+    choropleth.apply(None)
+    assert [f["properties"]["style"] for f in layer.data["features"]] == [{"weight": 2}] * 5
+
+
+def test_choropleth_layer_style():
+    """Test `leafmaptools.classify.Choropleth` on a layer styling the same key.
+    """
+    features = [
+        {"type": "Feature", "geometry": None, "properties": {"v": v}} for v in [1, 2, None]
+    ]
+    layer = GeoJSON(
+        data={"type": "FeatureCollection", "features": features},
+        style={"color": "#000000", "fillColor": "#ff0000"},
+    )
+    choropleth = Choropleth(layer, palette=["#000000", "#ffffff"])
+    choropleth.apply("v", k=2)
+    assert layer.style == {"color": "#000000"}
+    colors = [f["properties"]["style"]["fillColor"] for f in layer.data["features"]]
+    assert colors == ["#000000", "#ffffff", "#ff0000"]
+    choropleth.set_missing_color("#00ff00")
+    assert layer.data["features"][2]["properties"]["style"]["fillColor"] == "#00ff00"
+    assert layer.data["features"][0]["properties"]["style"]["fillColor"] == "#000000"
+    choropleth.apply(None)
+    assert layer.style == {"color": "#000000", "fillColor": "#00ff00"}
+
+
+def test_choropleth_swapped_data():
+    """Test `leafmaptools.classify.Choropleth` on a layer following `GeometryLevels`.
+    """
+    ring = [
+        [10 + 5 * math.cos(t), 50 + 5 * math.sin(t)] for t in np.linspace(0, 2 * math.pi, 501)
+    ]
+    ring[-1] = ring[0]
+    fc = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": {"v": v},
+             "geometry": {"type": "Polygon", "coordinates": [ring]}}
+            for v in [1, 2]
+        ],
+    }
+    levels = GeometryLevels(fc, zooms=[0, 4, 8])
+    m = FakeMap(center=(50, 10), zoom=2)
+    layer = GeoJSON(data=levels.data_for_zoom(2), style={"fillColor": "#ff0000"})
+    levels.follow(m, layer, scheduler=ViewportScheduler(m, wait=0))
+    choropleth = Choropleth(layer, palette=["#000000", "#ffffff"])
+
+    m.set_view((50, 10), 16)
+    assert count_vertices(layer.data) == count_vertices(fc) == 1002
+    choropleth.apply("v", scheme="equal_interval", k=2)
+    assert count_vertices(layer.data) == 1002
+    colors = [f["properties"]["style"]["fillColor"] for f in layer.data["features"]]
+    assert colors == ["#000000", "#ffffff"]
+
+    # Swapped data gets the class colors, too.
+    m.set_view((50, 10), 2)
+    assert count_vertices(layer.data) == count_vertices(levels.versions[0]) < 100
+    colors = [f["properties"]["style"]["fillColor"] for f in layer.data["features"]]
+    assert colors == ["#000000", "#ffffff"]
+    choropleth.close()
@@ -0,0 +1,49 @@
+"""
+Tests for `leafmaptools.culling` module.
+"""
+
+
+import mercantile
+
+from leafmaptools.culling import CulledGeoJSON, expand_bbox
+from leafmaptools.events import ViewportScheduler
+
+from tests.fake_map import FakeMap
+
+
+def test_expand_bbox():
+    """Test `leafmaptools.culling.expand_bbox`.
+    """
+    assert expand_bbox(0, 0, 10, 20, 0.5) == (-5, -10, 15, 30)
+    assert expand_bbox(0, 60, 10, 80, 1) == (-10, 40, 20, 90)
+
+
+def test_culled_geojson():
+    """Test `leafmaptools.culling.CulledGeoJSON`.
+    """
+    tiles = list(mercantile.tiles(-20, 30, 40, 70, zooms=7))
+    fc = {"type": "FeatureCollection", "features": [mercantile.feature(t) for t in tiles]}
+    m = FakeMap(center=(50, 10), zoom=7, size=(800, 600))
+    culled = CulledGeoJSON(m, fc, margin=0.5, scheduler=ViewportScheduler(m, wait=0))
+    assert culled.layer in m.layers
+    assert 0 < len(culled.layer.data["features"]) < len(tiles) / 10
+    ((south, west), (north, east)) = m.bounds
+    center = mercantile.tile((west + east) / 2, (south + north) / 2, 7)
+    assert str(center) in [f["id"] for f in culled.layer.data["features"]]
+    assert culled.stats["sent"] == 1
+
+    # A small pan stays inside the margin.
+    m.set_view((50.3, 10.3), 7)
+    assert culled.stats["sent"] == 1 and culled.stats["skipped"] >= 1
+
+    # A large pan or zooming in by two levels loads again.
+    m.set_view((45, 20), 7)
+    assert culled.stats["sent"] == 2
+    m.set_view((45, 20), 9)
+    assert culled.stats["sent"] == 3
+    assert len(culled.layer.data["features"]) < 20
+
+    culled.close()
+    assert culled.layer not in m.layers
+    m.set_view((50, 10), 7)
+    assert culled.stats["sent"] == 3
@@ -0,0 +1,64 @@
+"""
+Tests for `leafmaptools.encoding` module.
+"""
+
+
+import math
+
+import mercantile
+import pytest
+
+from leafmaptools.encoding import (
+    PayloadEncoder, decode_compact, encode_compact, precision_for_zoom
+)
+
+
+def test_precision_for_zoom():
+    """Test `leafmaptools.encoding.precision_for_zoom`.
+    """
+    assert [precision_for_zoom(z) for z in [0, 5, 10, 18]] == [0, 2, 3, 6]
+    for zoom in [3, 10]:
+        for lat in [0, 60, 75, 85, 89]:
+            digits = precision_for_zoom(zoom, lat=lat)
+            # Latitudes at ``lat`` rounded to ``digits`` must stay within a pixel.
+            lat_per_pixel = 360 / (256 * 2 ** zoom) * math.cos(math.radians(min(lat, 85.051129)))
+            assert 10 ** -digits <= lat_per_pixel
+
+
+def test_payload_encoder():
+    """Test `leafmaptools.encoding.PayloadEncoder`.
+    """
+    features = [mercantile.feature(t) for t in mercantile.tiles(5, 45, 15, 55, zooms=8)]
+    fc = {"type": "FeatureCollection", "features": features}
+    encoder = PayloadEncoder(measure=True)
+    res = encoder.encode(fc, zoom=8)
+    feature = res["features"][0]
+    assert feature["id"] == features[0]["id"]
+    assert "bbox" not in feature and feature["properties"] == {}
+    lon, lat = feature["geometry"]["coordinates"][0][0]
+    assert lon == round(lon, 3) and lat == round(lat, 3)
+    assert 0 < encoder.ratio < 0.6
+
+    # More digits are used at high latitudes.
+    arctic = {"type": "Point", "coordinates": [10.123456789, 75.123456789]}
+    tropic = {"type": "Point", "coordinates": [10.123456789, 5.123456789]}
+    assert encoder.encode(arctic, zoom=10)["coordinates"] == [10.1235, 75.1235]
+    assert encoder.encode(tropic, zoom=10)["coordinates"] == [10.123, 5.123]
+    assert "bbox" in features[0]
+
+    with pytest.raises(ValueError):
+        encoder.encode(tropic)
+    assert encoder.encode(tropic, digits=1)["coordinates"] == [10.1, 5.1]
+    assert PayloadEncoder(digits=2).encode(tropic)["coordinates"] == [10.12, 5.12]
+
+
+def test_encode_compact():
+    """Test `leafmaptools.encoding.encode_compact` and `decode_compact`.
+    """
+    features = [mercantile.feature(t) for t in mercantile.tiles(5, 45, 15, 55, zooms=6)]
+    fc = {"type": "FeatureCollection", "features": features}
+    compact = encode_compact(fc, 4)
+    assert all(isinstance(c, int) for c in compact["features"][0]["geometry"]["coordinates"][0][1])
+    res = decode_compact(compact)
+    exp = PayloadEncoder(digits=4, keep_properties=["title"], keep_bbox=True).encode(fc)
+    assert [f["geometry"] for f in res["features"]] == [f["geometry"] for f in exp["features"]]
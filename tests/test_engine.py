@@ -0,0 +1,174 @@
+"""
+Tests for `leafmaptools.engine` module.
+"""
+
+
+from h3 import h3
+import mercantile
+import numpy as np
+
+from leafmaptools.engine import (
+    FeatureCache, H3BoundaryCache, H3CoverageCache, H3GridEngine,
+    MercatorGridEngine, estimate_h3_cells, estimate_mercator_cells,
+    h3_polyfill_bbox, level_within_budget, mercator_grid_lines
+)
+
+
+def test_feature_cache():
+    """Test `leafmaptools.engine.FeatureCache`.
+    """
+    engine = MercatorGridEngine()
+    cache = FeatureCache()
+    entered, left = cache.update(engine.cells_for_bbox(0, 0, 10, 10, 5))
+    assert len(entered) == len(cache) and left == set()
+    tile_id = str(mercantile.Tile(16, 15, 5))
+    feature = cache.features[tile_id]
+
+    entered, left = cache.update(engine.cells_for_bbox(0, 0, 10, 10, 5))
+    assert entered == set() and left == set()
+    assert cache.features[tile_id] is feature
+
+    entered, left = cache.update(engine.cells_for_bbox(12, 0, 20, 10, 5))
+    assert str(mercantile.Tile(17, 15, 5)) in entered and tile_id in left
+    assert len(cache.feature_collection()["features"]) == len(cache)
+
+
+def test_h3_boundary_cache():
+    """Test `leafmaptools.engine.H3BoundaryCache`.
+    """
+    cells = sorted(h3.k_ring(h3.geo_to_h3(50, 10, 5), 1))
+    cache = H3BoundaryCache(maxsize=5)
+    rings = cache.boundaries(cells)
+    assert rings[0] == h3.h3_to_geo_boundary(cells[0], geo_json=True)
+    assert cache.stats == {"hits": 0, "misses": 7, "evictions": 2}
+    assert len(cache) == 5 and cells[0] not in cache
+
+    cache.boundaries(cells[-2:])
+    assert cache.stats["hits"] == 2
+
+
+def test_estimate_cells():
+    """Test `leafmaptools.engine.estimate_mercator_cells` and `estimate_h3_cells`.
+    """
+    bbox = (5, 45, 15, 55)
+    for level in range(10):
+        exp = len(list(mercantile.tiles(*bbox, zooms=level)))
+        assert estimate_mercator_cells(*bbox, level) == exp
+    exp = len(list(mercantile.tiles(170, 0, -170, 10, 4)))
+    assert estimate_mercator_cells(170, 0, -170, 10, 4) == exp
+
+    poly = {"type": "Polygon", "coordinates": [[(45, 5), (55, 5), (55, 15), (45, 15), (45, 5)]]}
+    exp = len(h3.polyfill(poly, 5))
+    assert 0.9 < estimate_h3_cells(*bbox, 5) / exp < 1.1
+
+
+def test_level_within_budget():
+    """Test `leafmaptools.engine.level_within_budget`.
+    """
+    bbox = (5, 45, 15, 55)
+    assert level_within_budget(estimate_mercator_cells, bbox, 5, 100) == (5, "")
+    level, message = level_within_budget(estimate_mercator_cells, bbox, 10, 100)
+    assert level == 7 and message
+    level, message = level_within_budget(estimate_mercator_cells, bbox, 10, 100, "refuse")
+    assert level is None and message
+
+
+def test_mercator_grid_lines():
+    """Test `leafmaptools.engine.mercator_grid_lines`.
+    """
+    bbox = (5, 45, 15, 55)
+    tiles = list(mercantile.tiles(*bbox, zooms=6))
+    lines = mercator_grid_lines(*bbox, 6)["geometry"]["coordinates"]
+    xs = {t.x for t in tiles}
+    ys = {t.y for t in tiles}
+    assert len(lines) == len(xs) + 1 + len(ys) + 1
+
+    vertices = {(round(lon, 6), round(lat, 6)) for line in lines for lon, lat in line}
+    west, south, east, north = mercantile.bounds(min(xs), min(ys), 6)
+    assert (round(west, 6), round(north, 6)) in vertices
+    west, south, east, north = mercantile.bounds(max(xs), max(ys), 6)
+    assert (round(east, 6), round(south, 6)) in vertices
+
+
+def test_h3_coverage_cache():
+    """Test `leafmaptools.engine.H3CoverageCache`.
+    """
+    cache = H3CoverageCache()
+    steps = [
+        ((5, 45, 15, 55), 4),
+        ((6, 46, 16, 56), 4),
+        ((8, 48, 12, 52), 6),
+        ((7, 47, 13, 53), 5),
+        ((7, 47, 13, 53), 5),
+    ]
+    for bbox, level in steps:
+        assert cache.cells(bbox, level) == h3_polyfill_bbox(*bbox, level)
+    assert cache.stats["hits"] == 1
+    assert cache.stats["derived"] == 3
+
+
+def test_h3_coverage_cache_random():
+    """Test `leafmaptools.engine.H3CoverageCache` against polyfills for random views.
+    """
+    rng = np.random.default_rng(7)
+    # A bbox smaller than one resolution 3 cell, so the coarse coverage is empty.
+    cache = H3CoverageCache()
+    tiny = (13.38, 52.50, 13.42, 52.52)
+    assert cache.cells(tiny, 3) == h3_polyfill_bbox(*tiny, 3) == set()
+    assert cache.cells(tiny, 8) == h3_polyfill_bbox(*tiny, 8) != set()
+
+    for _ in range(40):
+        cache = H3CoverageCache()
+        lon, lat = rng.uniform(-170, 170), rng.uniform(-70, 70)
+        size = 10 ** rng.uniform(-1.5, 0)
+        level = int(rng.integers(2, 6))
+        for _ in range(4):
+            move = rng.choice(["in", "out", "pan"])
+            if move == "in":
+                size, level = size / 2, min(level + 1, 7)
+            elif move == "out":
+                size, level = size * 2, max(level - 1, 0)
+            else:
+                lon, lat = lon + rng.uniform(-0.5, 0.5) * size, lat + rng.uniform(-0.5, 0.5) * size
+            bbox = (lon - size, lat - size / 2, lon + size, lat + size / 2)
+            assert cache.cells(bbox, level) == h3_polyfill_bbox(*bbox, level), (move, bbox, level)
+
+
+def test_mercator_grid_engine():
+    """Test `leafmaptools.engine.MercatorGridEngine`.
+    """
+    bbox = (5, 45, 15, 55)
+    cells = MercatorGridEngine().cells_for_bbox(*bbox, 7)
+    tiles = list(mercantile.tiles(*bbox, zooms=7))
+    assert cells.ids.tolist() == [str(t) for t in tiles]
+    assert cells.to_geojson()["features"][3]["geometry"] == mercantile.feature(tiles[3])["geometry"]
+    assert np.allclose(cells.bounds, [mercantile.bounds(t) for t in tiles])
+
+    engine = MercatorGridEngine()
+    for bbox, level in [((5, 45, 15, 55), 9), ((170, -10, -170, 10), 6), ((-180, -90, 180, 90), 2)]:
+        cells = engine.cells_for_bbox(*bbox, level)
+        reference = engine.cells_for_bbox_reference(*bbox, level)
+        assert cells.ids.tolist() == reference.ids.tolist()
+        assert np.allclose(cells.boundaries, reference.boundaries, rtol=0, atol=1e-9)
+        features = cells.features([1, 0])
+        assert [f["id"] for f in features] == reference.ids[[1, 0]].tolist()
+        assert np.allclose(features[0]["geometry"]["coordinates"][0], reference.ring(1))
+
+
+def test_h3_grid_engine():
+    """Test `leafmaptools.engine.H3GridEngine`.
+    """
+    bbox = (5, 45, 15, 55)
+    engine = H3GridEngine()
+    cells = engine.cells_for_bbox(*bbox, 4)
+    assert set(cells.ids.tolist()) == h3_polyfill_bbox(*bbox, 4)
+    assert cells.boundaries.shape == (len(cells), 7, 2)
+    feature = cells.to_geojson()["features"][0]
+    assert feature["geometry"]["coordinates"][0] == [
+        list(p) for p in h3.h3_to_geo_boundary(feature["id"], geo_json=True)
+    ]
+
+    pentagon = sorted(h3.get_pentagon_indexes(2))[0]
+    cells = engine.cell_at(*reversed(h3.h3_to_geo(pentagon)), 2)
+    assert cells.ids.tolist() == [pentagon]
+    assert len(cells.ring(0)) == cells.sizes[0] == 6
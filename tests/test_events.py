@@ -0,0 +1,161 @@
+"""
+Tests for `leafmaptools.events` module.
+"""
+
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from leafmaptools.events import (
+    Debouncer, LatestResultRunner, Throttler, ViewportScheduler, get_scheduler
+)
+
+from tests.fake_map import FakeMap
+
+
+def pan(m):
+    """Change the view of a map the way one drag would, in several steps.
+    """
+    for i in range(5):
+        m.center = [i + 1, i + 1]
+        m.bounds = ((i, i), (i + 1, i + 1))
+
+
+def test_scheduler_without_loop():
+    """Test `leafmaptools.events.ViewportScheduler` without a running loop.
+    """
+    m = FakeMap()
+    events = []
+    scheduler = ViewportScheduler(m)
+    scheduler.subscribe(events.append)
+    pan(m)
+    assert len(events) == 10
+    assert events[0] == {"type": "change", "name": "bounds", "owner": m}
+
+
+def test_scheduler_debounce():
+    """Test `leafmaptools.events.ViewportScheduler` coalescing one pan.
+    """
+    m = FakeMap()
+    events = []
+    scheduler = ViewportScheduler(m, wait=0.01)
+    scheduler.subscribe(events.append)
+
+    async def main():
+        pan(m)
+        assert scheduler.pending and events == []
+        await asyncio.sleep(0.05)
+
+    asyncio.run(main())
+    assert len(events) == 1
+    assert scheduler.stats == {"changes": 10, "events": 1}
+
+
+def test_get_scheduler():
+    """Test `leafmaptools.events.get_scheduler`.
+    """
+    m = FakeMap()
+    assert get_scheduler(m) is get_scheduler(m)
+    assert get_scheduler(m) is not get_scheduler(m, mode="throttle")
+
+
+def test_debouncer():
+    """Test `leafmaptools.events.Debouncer`.
+    """
+    calls = []
+    debouncer = Debouncer(calls.append, wait=0.01)
+
+    async def main():
+        for text in ["{", "{}", '{"a": 1}']:
+            debouncer(text)
+        assert debouncer.pending and calls == []
+        await asyncio.sleep(0.05)
+        debouncer("x")
+        debouncer.flush()
+
+    asyncio.run(main())
+    assert calls == ['{"a": 1}', "x"]
+    debouncer("y")
+    assert calls[-1] == "y" and not debouncer.pending
+
+
+def test_throttler():
+    """Test `leafmaptools.events.Throttler`.
+    """
+    calls = []
+    requests = []
+    throttler = Throttler(lambda: calls.append(time.monotonic()), wait=0.02)
+
+    async def main():
+        for _ in range(10):
+            requests.append(time.monotonic())
+            throttler()
+            await asyncio.sleep(0.005)
+        while throttler.pending:
+            await asyncio.sleep(0.005)
+
+    # Only invariants are checked, as the number of calls depends on timing.
+    asyncio.run(main())
+    assert calls and all(b - a >= 0.019 for a, b in zip(calls, calls[1:]))
+    assert calls[-1] >= requests[-1]
+    n = len(calls)
+    throttler()
+    assert len(calls) == n + 1 and not throttler.pending
+
+
+def test_latest_result_runner():
+    """Test `leafmaptools.events.LatestResultRunner` dropping stale results.
+    """
+    applied = []
+    runner = LatestResultRunner(ThreadPoolExecutor(max_workers=2))
+
+    def job(i, delay):
+        def compute():
+            time.sleep(delay)
+            return i
+        return compute
+
+    async def main():
+        runner.submit(job(1, 0.05), applied.append)
+        runner.submit(job(2, 0.01), applied.append)
+        assert runner.pending
+        while runner.pending:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert applied == [2]
+    assert runner.stats == {"submitted": 2, "applied": 1, "dropped": 1, "failed": 0}
+
+    runner = LatestResultRunner()
+    runner.submit(job(3, 0), applied.append)
+    assert applied == [2, 3]
+
+
+def test_latest_result_runner_error():
+    """Test `leafmaptools.events.LatestResultRunner` with a failing job.
+    """
+    applied = []
+    errors = []
+    runner = LatestResultRunner(ThreadPoolExecutor(max_workers=1))
+
+    def compute():
+        raise ValueError("broken")
+
+    async def main():
+        asyncio.get_running_loop().set_exception_handler(
+            lambda loop, context: errors.append(context["exception"])
+        )
+        runner.submit(compute, applied.append)
+        for _ in range(100):
+            if not runner.pending:
+                break
+            await asyncio.sleep(0.01)
+        runner.submit(lambda: 1, applied.append)
+        while runner.pending:
+            await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert not runner.pending and applied == [1]
+    assert [str(e) for e in errors] == ["broken"]
+    assert runner.stats == {"submitted": 2, "applied": 1, "dropped": 0, "failed": 1}
@@ -0,0 +1,32 @@
+"""
+Tests for `leafmaptools.pyramid` module.
+"""
+
+
+from leafmaptools.engine import H3GridEngine, MercatorGridEngine
+from leafmaptools.pyramid import GridPyramid, PyramidGridEngine, build_pyramid
+
+
+def test_pyramid(tmp_path):
+    """Test `leafmaptools.pyramid.build_pyramid` and `GridPyramid`.
+    """
+    aoi = (5, 45, 15, 55)
+    view = (7.3, 47.1, 11.8, 50.2)
+    for engine, levels in [(MercatorGridEngine(), [6, 8]), (H3GridEngine(), [3, 5])]:
+        path = str(tmp_path / engine.kind)
+        build_pyramid(engine, aoi, levels, path)
+        pyramid = GridPyramid(path)
+        assert pyramid.levels == levels
+        assert pyramid.covers(*view, levels[0])
+        assert not pyramid.covers(*view, 7)
+        assert not pyramid.covers(0, 45, 10, 50, levels[0])
+
+        served = PyramidGridEngine(pyramid, engine)
+        for level in levels:
+            exp = engine.cells_for_bbox(*view, level)
+            res = served.cells_for_bbox(*view, level)
+            assert sorted(res.ids.tolist()) == sorted(exp.ids.tolist())
+            i = res.ids.tolist().index(exp.ids[0])
+            assert res.ring(i) == exp.ring(0)
+        served.cells_for_bbox(*view, 4)
+        assert served.stats == {"served": 2, "computed": 1}
@@ -0,0 +1,206 @@
+"""
+Tests for `leafmaptools.recorder` module.
+"""
+
+
+import asyncio
+import json
+import time
+
+import pytest
+
+from leafmaptools.events import ViewportScheduler
+from leafmaptools.recorder import MapRecorder, RecordingPlayer, RecordingWriter
+
+from tests.fake_map import FakeMap
+
+
+def _recording(n: int = 11, step: float = 0.01) -> list:
+    return [{"ts": 100 + i * step, "center": [i, i], "zoom": 1 + i % 3} for i in range(n)]
+
+
+def test_player():
+    """Test `leafmaptools.recorder.RecordingPlayer` playing in simulated time.
+    """
+    m = FakeMap()
+    now = [0.0]
+    shown = []
+    done = []
+
+    class Player(RecordingPlayer):
+        def show(self, event):
+            super().show(event)
+            shown.append((now[0], event["ts"]))
+
+        async def wait(self, wakeup, delay):
+            if delay is None:
+                await wakeup.wait()
+            else:
+                now[0] += delay
+                await asyncio.sleep(0)
+
+    async def main():
+        player = Player(
+            m, _recording(), speed=2, on_done=lambda: done.append(True), clock=lambda: now[0]
+        )
+        player.play()
+        assert player.state == "playing"
+        await player.task
+        return player
+
+    player = asyncio.run(main())
+    times, stamps = zip(*shown)
+    assert times == pytest.approx([i * 0.005 for i in range(11)])
+    assert list(stamps) == [e["ts"] for e in _recording()]
+    assert player.stats["shown"] == 11 and player.stats["skipped"] == 0
+    assert m.center == [10, 10] and m.zoom == 2
+    assert player.state == "stopped" and done == [True]
+
+
+def test_player_skipping():
+    """Test `leafmaptools.recorder.RecordingPlayer` skipping frames of a slow map.
+    """
+    class SlowPlayer(RecordingPlayer):
+        def show(self, event):
+            super().show(event)
+            time.sleep(0.03)
+
+    async def main():
+        player = SlowPlayer(FakeMap(), _recording(21))
+        player.play()
+        await player.task
+        return player
+
+    player = asyncio.run(main())
+    assert player.stats["skipped"] > 5
+    assert player.stats["shown"] + player.stats["skipped"] == 21
+
+
+def test_player_controls():
+    """Test `leafmaptools.recorder.RecordingPlayer` pause, resume, seek and stop.
+    """
+    m = FakeMap()
+    player = RecordingPlayer(m, _recording(11, step=1))
+
+    async def main():
+        player.play()
+        await asyncio.sleep(0.01)
+        assert m.center == [0, 0]
+        player.pause()
+        position = player.position
+        await asyncio.sleep(0.02)
+        assert player.position == position
+        player.seek(105.5)
+        player.resume()
+        await asyncio.sleep(0.01)
+        assert m.center == [5, 5]
+        assert 105.5 <= player.position < 105.6
+        player.speed = 100
+        await asyncio.sleep(0.03)
+        assert 7 <= m.center[0] <= 9
+        player.stop()
+        await player.task
+
+    asyncio.run(main())
+    assert player.state == "stopped" and player.position == 100
+
+
+def test_player_restart():
+    """Test `leafmaptools.recorder.RecordingPlayer` played again right after stopping.
+    """
+    m = FakeMap()
+    done = []
+    player = RecordingPlayer(
+        m, _recording(30, step=0.002), on_done=lambda: done.append(True)
+    )
+
+    async def main():
+        player.play()
+        first = player.task
+        await asyncio.sleep(0.01)
+        player.stop()
+        before = dict(player.stats)
+        player.play()
+        await asyncio.sleep(0.001)
+        assert first.done()
+        await player.task
+        return before
+
+    before = asyncio.run(main())
+    assert player.state == "stopped" and m.center == [29, 29]
+    counts = [player.stats[key] - before[key] for key in ["shown", "skipped"]]
+    assert sum(counts) == 30
+    assert len(done) == 2
+
+
+def test_recorder_playback():
+    """Test `leafmaptools.recorder.MapRecorder` playing without a running loop.
+    """
+    m = FakeMap()
+    recorder = MapRecorder(m, speed=10)
+    recorder.recording = _recording()
+    recorder.play_rec(recorder.play)
+    assert m.center == [10, 10]
+    assert recorder.player.state == "stopped"
+    assert not recorder.start.disabled and recorder.stop.disabled
+
+
+def test_recording_writer(tmp_path):
+    """Test `leafmaptools.recorder.RecordingWriter` buffering and rotation.
+    """
+    path = str(tmp_path / "rec.jsonl")
+    events = _recording(50)
+
+    async def main():
+        writer = RecordingWriter(path, flush_interval=0.02, buffer_size=20)
+        for event in events[:10]:
+            writer.write(event)
+        assert len(writer.buffer) == 10 and open(path).read() == ""
+        await asyncio.sleep(0.05)
+        assert writer.buffer == [] and len(open(path).readlines()) == 10
+        for event in events[10:30]:
+            writer.write(event)
+        assert len(writer.buffer) == 0 and writer.stats["flushes"] == 2
+        writer.close()
+
+    asyncio.run(main())
+    assert [json.loads(line) for line in open(path)] == events[:30]
+
+    path = str(tmp_path / "rotated.jsonl")
+    writer = RecordingWriter(path, max_bytes=400)
+    for event in events:
+        writer.write(event)
+    writer.close()
+    assert len(writer.files) == writer.stats["rotations"] + 1 > 3
+    lines = [line for p in writer.files for line in open(p)]
+    assert [json.loads(line) for line in lines] == events
+    assert all(len(open(p).read()) <= 400 for p in writer.files)
+
+    # A new writer on the same path keeps the files rotated before.
+    first = writer.rotated
+    writer = RecordingWriter(path, max_bytes=400)
+    for event in events:
+        writer.write(event)
+    writer.close()
+    assert writer.rotated[0] == f"{path}.{len(first) + 1}"
+    paths = first + writer.rotated + [path]
+    lines = [line for p in paths for line in open(p)]
+    assert [json.loads(line) for line in lines] == events + events
+
+
+def test_recorder_streaming(tmp_path):
+    """Test `leafmaptools.recorder.MapRecorder` streaming to a file.
+    """
+    path = str(tmp_path / "stream.jsonl")
+    m = FakeMap()
+    recorder = MapRecorder(
+        m, scheduler=ViewportScheduler(m, wait=0), stream_path=path, max_events=5
+    )
+    recorder.toggle_rec(recorder.start)
+    for i in range(20):
+        m.set_view((i, i), 3)
+    recorder.toggle_rec(recorder.start)
+    assert len(recorder.recording) == 5
+    lines = [json.loads(line) for line in open(path)]
+    assert len(lines) > 20
+    assert lines[-1]["center"] == [19, 19] == recorder.recording[-1]["center"]
@@ -0,0 +1,175 @@
+"""
+Tests for `leafmaptools.recording` module.
+"""
+
+
+import asyncio
+import json
+
+import numpy as np
+
+from leafmaptools.events import ViewportScheduler
+from leafmaptools.recorder import MapRecorder, RecordingPlayer
+from leafmaptools.recording import (
+    EVENT_DTYPE, Recording, compact, events_to_array, load_recording, read_jsonl,
+    same_view, save_recording,
+)
+from leafmaptools.simplify import tolerance_for_zoom
+
+from tests.fake_map import FakeMap
+
+
+def _events(n: int = 1000) -> list:
+    rng = np.random.default_rng(0)
+    ts = np.cumsum(rng.exponential(0.05, n)) + 1.7e9
+    lat, lon = rng.uniform(-85, 85, n), rng.uniform(-180, 180, n)
+    zoom = rng.integers(0, 19, n)
+    return [
+        {"ts": t, "center": [a, o], "zoom": int(z)}
+        for t, a, o, z in zip(ts.tolist(), lat.tolist(), lon.tolist(), zoom.tolist())
+    ]
+
+
+def test_round_trips(tmp_path):
+    """Test `leafmaptools.recording.save_recording` and `load_recording`.
+    """
+    events = _events()
+    events[3]["center"][0] = float("nan")
+    array = events_to_array(events)
+    assert array.dtype == EVENT_DTYPE and len(array) == len(events)
+
+    path = str(tmp_path / "rec.jsonl")
+    with open(path, "w") as f:
+        for event in events:
+            f.write(json.dumps(event) + "\n")
+    assert read_jsonl(path).tobytes() == array.tobytes()
+
+    for name in ["rec.npy", "rec.npz", "copy.jsonl"]:
+        save_recording(events, str(tmp_path / name))
+        recording = load_recording(str(tmp_path / name))
+        assert recording.array.tobytes() == array.tobytes()
+    assert isinstance(load_recording(str(tmp_path / "rec.npy")).array, np.memmap)
+
+    recording = load_recording(str(tmp_path / "rec.npz"))
+    assert recording[10] == events[10]
+    assert isinstance(recording[10]["zoom"], float)
+    assert len(recording[5:8]) == 3
+    assert recording.index_at(events[10]["ts"]) == 10
+    assert recording.index_at(events[10]["ts"] - 1e-6) == 9
+    assert recording.index_at(0) == -1
+
+
+def test_recorder_formats(tmp_path):
+    """Test `leafmaptools.recorder.MapRecorder` and `RecordingPlayer` with binary files.
+    """
+    events = _events(50)
+    path = str(tmp_path / "rec.npy")
+    save_recording(events, path)
+    m = FakeMap()
+    recorder = MapRecorder(m, path=path)
+    assert isinstance(recorder.recording, Recording)
+    assert len(recorder.recording) == 50
+
+    async def main():
+        player = RecordingPlayer(m, recorder.recording, speed=1000)
+        player.seek(events[-3]["ts"])
+        assert player.position == events[-3]["ts"]
+        player.play()
+        await player.task
+        return player
+
+    player = asyncio.run(main())
+    assert player.state == "stopped"
+    assert player.stats["shown"] + player.stats["skipped"] == 3
+    assert m.center == events[-1]["center"] and m.zoom == events[-1]["zoom"]
+
+
+def _session() -> list:
+    """A pan at 10 events per second with sub-pixel jitter, pauses and zooms.
+    """
+    rng = np.random.default_rng(1)
+    events = []
+    ts = 1.7e9
+    lat, lon = 50.0, 8.0
+    for zoom in [5, 6, 8]:
+        tolerance = tolerance_for_zoom(zoom)
+        for i in range(300):
+            ts += 0.1
+            if i % 100 < 70:
+                lat, lon = lat + tolerance, lon - 2 * tolerance
+            jitter = (rng.uniform(-0.2, 0.2, 2) * tolerance).tolist()
+            events.append({"ts": ts, "center": [lat + jitter[0], lon + jitter[1]], "zoom": zoom})
+            if i % 10 == 0:
+                events.append(dict(events[-1]))
+    return events
+
+
+def test_compact():
+    """Test `leafmaptools.recording.compact`.
+    """
+    events = _session()
+    recording, stats = compact(events)
+    assert stats["events"] == len(events) == 990
+    assert stats["duplicates"] == 90 and stats["merged"] > 100
+    assert stats["kept"] == len(recording) < 30
+    assert stats["ratio"] == len(events) / len(recording) > 30
+    kept = recording.array
+    assert recording[0] == events[0] and recording[-1] == events[-1]
+    assert sorted(set(kept["zoom"].tolist())) == [5, 6, 8]
+
+    # Interpolated playback shows every original view within about a pixel,
+    # or a little late while panning at 2.2 pixels per event.
+    array = events_to_array(events)
+    for zoom in [5, 6, 8]:
+        run = array[array["zoom"] == zoom]
+        ref = kept[kept["zoom"] == zoom]
+        for name in ["lat", "lon"]:
+            error = np.abs(np.interp(run["ts"], ref["ts"], ref[name]) - run[name])
+            assert error.max() <= 5 * tolerance_for_zoom(zoom)
+            assert error.mean() <= tolerance_for_zoom(zoom)
+
+    recording, stats = compact(events, simplify=False)
+    assert stats["simplified"] == 0 and stats["kept"] > 50
+    recording, stats = compact(events[:1])
+    assert stats["kept"] == 1 and compact([])[1]["ratio"] == 0
+
+    a = {"center": [0, 0], "zoom": 3}
+    assert same_view(a, {"center": [0, 0], "zoom": 3})
+    assert not same_view(a, {"center": [0, 0.1], "zoom": 3})
+    assert same_view(a, {"center": [0, 0.1], "zoom": 3}, pixels=1)
+    assert not same_view(a, {"center": [0, 0], "zoom": 4}, pixels=1)
+    north = {"center": [75, 0], "zoom": 3}
+    assert not same_view(north, {"center": [75.1, 0], "zoom": 3}, pixels=1)
+
+
+def test_recorder_compact():
+    """Test `leafmaptools.recorder.MapRecorder` dropping and compacting events.
+    """
+    m = FakeMap()
+    recorder = MapRecorder(m, scheduler=ViewportScheduler(m, wait=0))
+    recorder.toggle_rec(recorder.start)
+    for i in range(10):
+        m.set_view((i, i), 3)
+    recorder.toggle_rec(recorder.start)
+    views = [(e["center"], e["zoom"]) for e in recorder.recording]
+    assert all(a != b for a, b in zip(views, views[1:]))
+    assert views[-1] == ([9, 9], 3)
+
+    recorder = MapRecorder(m, scheduler=ViewportScheduler(m, wait=0), compact=True)
+    recorder.toggle_rec(recorder.start)
+    for i in range(100):
+        m.set_view((i * 1e-4, 0), 3)
+    recorder.toggle_rec(recorder.start)
+    assert isinstance(recorder.recording, Recording)
+    assert recorder.stats["ratio"] > 10
+
+    async def main():
+        events = [{"ts": 0, "center": [0, 0], "zoom": 3}, {"ts": 0.1, "center": [1, 2], "zoom": 3}]
+        player = RecordingPlayer(m, events, interpolate=True, frame_interval=0.01)
+        player.play()
+        await player.task
+        return player
+
+    player = asyncio.run(main())
+    assert player.stats["shown"] == 2 and player.stats["frames"] > 3
+    assert m.center == [1, 2]
@@ -0,0 +1,100 @@
+"""
+Tests for `leafmaptools.simplify` module.
+"""
+
+
+import math
+
+import numpy as np
+
+from leafmaptools.simplify import (
+    GeometryLevels, count_vertices, douglas_peucker, simplify_geometry, tolerance_for_zoom
+)
+
+from tests.fake_map import FakeMap
+from leafmaptools.events import ViewportScheduler
+
+
+def _circle(n: int = 2001, radius: float = 5) -> list:
+    ring = [[10 + radius * math.cos(t), 50 + radius * math.sin(t)] for t in np.linspace(0, 2 * math.pi, n)]
+    ring[-1] = ring[0]
+    return ring
+
+
+def test_douglas_peucker():
+    """Test `leafmaptools.simplify.douglas_peucker`.
+    """
+    points = np.array([[0, 0], [1, 0.1], [2, -0.1], [3, 5], [4, 6], [5, 7]])
+    assert douglas_peucker(points, 0.5).tolist() == [True, False, True, True, False, True]
+    assert douglas_peucker(points, 100).tolist() == [True, False, False, False, False, True]
+
+    ring = np.array(_circle(101))
+    keep = douglas_peucker(ring, 100, closed=True)
+    assert keep.sum() == 4 and keep[0] and keep[-1]
+
+
+def test_simplify_geometry():
+    """Test `leafmaptools.simplify.simplify_geometry`.
+    """
+    ring = _circle()
+    hole = [[10, 50], [10.001, 50], [10.001, 50.001], [10, 50]]
+    polygon = {"type": "Polygon", "coordinates": [ring, hole]}
+    res = simplify_geometry(polygon, tolerance_for_zoom(4))
+    assert len(res["coordinates"]) == 1
+    assert 4 <= len(res["coordinates"][0]) < 100
+    assert res["coordinates"][0][0] == res["coordinates"][0][-1] == ring[0]
+    assert simplify_geometry(polygon, 0)["coordinates"][0] == ring
+    point = {"type": "Point", "coordinates": [1, 2]}
+    assert simplify_geometry(point, 1) == point
+
+
+def test_geometry_levels():
+    """Test `leafmaptools.simplify.GeometryLevels`.
+    """
+    fc = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "id": "c", "properties": {"a": 1},
+             "geometry": {"type": "Polygon", "coordinates": [_circle()]}},
+            {"type": "Feature", "properties": {},
+             "geometry": {"type": "LineString", "coordinates": _circle()[:500]}},
+        ],
+    }
+    levels = GeometryLevels(fc, zooms=[0, 4, 8])
+    counts = levels.vertex_counts()
+    assert counts[0] < counts[4] < counts[8] == count_vertices(fc) == 2501
+    assert levels.data_for_zoom(8) is fc
+    assert levels.data_for_zoom(5.5)["features"][0]["properties"] == {"a": 1}
+    assert levels.band_for_zoom(-1) == 0 and levels.band_for_zoom(20) == 8
+
+    m = FakeMap(center=(50, 10), zoom=2)
+    layer = type("Layer", (), {"data": None})()
+    levels.follow(m, layer, scheduler=ViewportScheduler(m, wait=0))
+    assert layer.data is levels.versions[0]
+    m.set_view((50, 10), 9)
+    assert layer.data is fc
+    levels.unfollow()
+    m.set_view((50, 10), 2)
+    assert layer.data is fc
+
+
+def test_geometry_levels_latitude():
+    """Test `leafmaptools.simplify.GeometryLevels` keeping details at high latitudes.
+    """
+    assert tolerance_for_zoom(4, lat=75) < 0.3 * tolerance_for_zoom(4)
+    # A zigzag of 0.05 degrees is less than a pixel wide at zoom 4 on the
+    # equator, but more than one at 75 degrees north.
+    fc = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": {}, "geometry": {
+                "type": "LineString",
+                "coordinates": [[i * 0.5, lat + 0.05 * (i % 2)] for i in range(20)],
+            }}
+            for lat in [0, 75]
+        ],
+    }
+    levels = GeometryLevels(fc, zooms=[0, 4])
+    equator, arctic = levels.versions[0]["features"]
+    assert len(equator["geometry"]["coordinates"]) == 2
+    assert len(arctic["geometry"]["coordinates"]) == 20
@@ -0,0 +1,56 @@
+"""
+Tests for `leafmaptools.spatial` module.
+"""
+
+
+import mercantile
+import numpy as np
+
+from leafmaptools.engine import MercatorGridEngine
+from leafmaptools.spatial import PackedRTree
+
+
+def _scan(bounds, west, south, east, north):
+    return np.nonzero(
+        (bounds[:, 0] <= east) & (bounds[:, 2] >= west)
+        & (bounds[:, 1] <= north) & (bounds[:, 3] >= south)
+    )[0].tolist()
+
+
+def test_packed_rtree():
+    """Test `leafmaptools.spatial.PackedRTree`.
+    """
+    rng = np.random.default_rng(0)
+    corners = rng.uniform(-100, 100, (1000, 2))
+    bounds = np.concatenate([corners, corners + rng.uniform(0, 5, (1000, 2))], axis=1)
+    bounds[3] = np.nan
+    for node_size in [2, 16]:
+        tree = PackedRTree(bounds, node_size=node_size)
+        restored = PackedRTree.from_arrays(tree.to_arrays())
+        assert len(tree) == len(restored) == 1000
+        for _ in range(20):
+            west, east = np.sort(rng.uniform(-110, 110, 2))
+            south, north = np.sort(rng.uniform(-110, 110, 2))
+            exp = _scan(bounds, west, south, east, north)
+            assert tree.query(west, south, east, north).tolist() == exp
+            assert restored.query(west, south, east, north).tolist() == exp
+        lon, lat = bounds[0, :2]
+        assert 0 in tree.query_point(lon, lat).tolist()
+        assert 3 not in tree.query(-200, -200, 200, 200).tolist()
+
+    assert PackedRTree(np.zeros((0, 4))).query(-180, -90, 180, 90).tolist() == []
+    assert PackedRTree([[0, 0, 1, 1]]).query_point(0.5, 1).tolist() == [0]
+
+
+def test_packed_rtree_sources():
+    """Test `leafmaptools.spatial.PackedRTree.from_features` and `from_cells`.
+    """
+    tiles = list(mercantile.tiles(5, 45, 15, 55, zooms=8))
+    fc = {"type": "FeatureCollection", "features": [mercantile.feature(t) for t in tiles]}
+    tree = PackedRTree.from_features(fc)
+    hits = tree.query_point(10.1, 50.1).tolist()
+    assert hits == [tiles.index(mercantile.tile(10.1, 50.1, 8))]
+
+    cells = MercatorGridEngine().cells_for_bbox(5, 45, 15, 55, 8)
+    tree = PackedRTree.from_cells(cells)
+    assert tree.query(8, 48, 9, 49).tolist() == _scan(cells.bounds, 8, 48, 9, 49)
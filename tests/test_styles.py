@@ -0,0 +1,244 @@
+"""
+Tests for `leafmaptools.styles` module.
+"""
+
+
+import asyncio
+import json
+
+from ipyleaflet import GeoJSON, Map
+
+from leafmaptools.styles import (
+    StyleBinding, StyleRegistry, StyleTextTool, StyleTool, StyleWriter, diff_style
+)
+
+
+def _layer(**kwargs):
+    kwargs.setdefault("data", {"type": "FeatureCollection", "features": []})
+    return GeoJSON(**kwargs)
+
+
+def test_diff_style():
+    """Test `leafmaptools.styles.diff_style`.
+    """
+    old = {"color": "red", "weight": 2, "opacity": 1}
+    new = {"color": "red", "weight": 3, "fillColor": "blue"}
+    assert diff_style(old, new) == ({"weight": 3, "fillColor": "blue"}, ["opacity"])
+    assert diff_style(old, dict(old)) == ({}, [])
+
+
+def test_style_text_tool():
+    """Test `leafmaptools.styles.StyleTextTool`.
+    """
+    m = Map()
+    layer = _layer(hover_style={"weight": 1})
+    m += layer
+    tool = StyleTextTool(a_map=m, layer=layer, attr_name="hover_style", wait=0)
+    changes = []
+    layer.observe(changes.append, names=["style", "hover_style"])
+
+    tool.textarea.value = '{"weight": 1, "color": '
+    assert changes == [] and "line 1" in tool.widget.children[2].value
+    tool.textarea.value = '{"weight": 1}'
+    assert changes == [] and tool.widget.children[2].value == ""
+    tool.textarea.value = json.dumps({"weight": 4, "color": "red"})
+    assert layer.hover_style == {"weight": 4, "color": "red"}
+    assert layer.style == {}
+    assert len(changes) == 1
+
+
+def test_style_writer():
+    """Test `leafmaptools.styles.StyleWriter`.
+    """
+    layer = _layer(style={"color": "red"})
+    writer = StyleWriter(layer, interval=0.05)
+    writes = []
+    layer.observe(writes.append, names=["style", "hover_style"])
+
+    # Only invariants are checked, as the number of writes depends on timing.
+    async def main():
+        for burst in range(4):
+            for i in range(5):
+                writer.update({"opacity": (burst * 5 + i) / 20})
+            await asyncio.sleep(0.005)
+        writer.flush()
+        flushed = len(writes)
+        await asyncio.sleep(0.1)
+        assert len(writes) == flushed and not writer.pending
+
+    asyncio.run(main())
+    assert layer.style == {"color": "red", "opacity": 0.95}
+    assert 1 <= len(writes) <= 4
+    assert writer.stats["changes"] == 20 and writer.stats["writes"] == len(writes)
+
+    writes.clear()
+    with writer.transaction():
+        writer.update({"color": "blue"})
+        writer.update({"weight": 1}, attr_name="hover_style")
+        assert writes == []
+    assert layer.style["color"] == "blue" and layer.hover_style == {"weight": 1}
+    writer.update({"color": "blue"})
+    assert len(writes) == 2 and not writer.pending
+
+
+def test_style_tool():
+    """Test `leafmaptools.styles.StyleTool`.
+    """
+    m = Map()
+    layer = _layer(style={"color": "#ff0000", "weight": 2})
+    tool = StyleTool(a_map=m, layer=layer, interval=0.05)
+    desc, picker, weight, opacity, close = tool.widget.children
+    writes = []
+    layer.observe(writes.append, names=["style"])
+
+    async def main():
+        for i in range(1, 11):
+            weight.value = i
+            opacity.value = i / 10
+        await asyncio.sleep(0.01)
+
+    asyncio.run(main())
+    assert layer.style == {"color": "#ff0000", "weight": 10, "opacity": 1.0}
+    assert len(writes) == 1
+
+
+def test_style_tool_classify():
+    """Test `leafmaptools.styles.StyleTool` coloring features by a property.
+    """
+    m = Map()
+    features = [
+        {"type": "Feature", "geometry": None, "properties": {"pop": v}} for v in range(10)
+    ]
+    layer = _layer(data={"type": "FeatureCollection", "features": features})
+    tool = StyleTool(a_map=m, layer=layer, kind="fill", classify=["pop"])
+    prop, scheme, classes = tool.widget.children[4:7]
+    prop.value = "pop"
+    colors = [f["properties"]["style"]["fillColor"] for f in layer.data["features"]]
+    assert len(set(colors)) == 5
+    classes.value = 2
+    colors = [f["properties"]["style"]["fillColor"] for f in layer.data["features"]]
+    assert len(set(colors)) == 2
+    prop.value = None
+    assert all("style" not in f["properties"] for f in layer.data["features"])
+
+
+def test_style_tool_classify_layer_style():
+    """Test `leafmaptools.styles.StyleTool` coloring features of a styled layer.
+    """
+    m = Map()
+    features = [
+        {"type": "Feature", "geometry": None, "properties": {"pop": v}}
+        for v in list(range(10)) + ["n/a"]
+    ]
+    layer = _layer(
+        data={"type": "FeatureCollection", "features": features},
+        style={"color": "#000000", "fillColor": "#ff0000", "fillOpacity": 0.5},
+    )
+    tool = StyleTool(a_map=m, layer=layer, kind="fill", classify=["pop"], interval=0)
+    picker = tool.widget.children[1]
+    prop = tool.widget.children[4]
+    prop.value = "pop"
+    assert layer.style == {"color": "#000000", "fillOpacity": 0.5}
+    colors = [f["properties"]["style"]["fillColor"] for f in layer.data["features"]]
+    assert len(set(colors[:10])) == 5 and colors[10] == "#ff0000"
+
+    picker.value = "#123456"
+    assert layer.style == {"color": "#000000", "fillOpacity": 0.5}
+    new_colors = [f["properties"]["style"]["fillColor"] for f in layer.data["features"]]
+    assert new_colors == colors[:10] + ["#123456"]
+
+    prop.value = None
+    assert layer.style == {"color": "#000000", "fillColor": "#123456", "fillOpacity": 0.5}
+    # ipyleaflet copies the layer style into every feature.
+    assert all(f["properties"]["style"] == layer.style for f in layer.data["features"])
+    picker.value = "#654321"
+    assert layer.style["fillColor"] == "#654321"
+
+
+def test_style_registry():
+    """Test `leafmaptools.styles.StyleRegistry`.
+    """
+    registry = StyleRegistry({"roads": {"color": "#888888", "weight": 2}})
+    highways, streets, rivers = _layer(), _layer(), _layer()
+    registry.bind(highways, "roads", overrides={"weight": 4})
+    registry.bind(streets, "roads")
+    registry.bind(streets, "roads", attr_name="hover_style")
+    registry.bind(rivers, "rivers")
+    assert highways.style == {"color": "#888888", "weight": 4}
+    assert streets.style == streets.hover_style == {"color": "#888888", "weight": 2}
+
+    writes = []
+    for layer in [highways, streets, rivers]:
+        layer.observe(writes.append, names=["style", "hover_style"])
+    with registry.batch():
+        registry.update("roads", {"color": "#444444"})
+        registry.update("roads", {"weight": 3})
+        registry.update("rivers", {"color": "#3388ff"})
+        assert writes == []
+    assert highways.style == {"color": "#444444", "weight": 4}
+    assert streets.style == {"color": "#444444", "weight": 3}
+    assert rivers.style == {"color": "#3388ff"}
+    assert len(writes) == 4
+
+    # Only the weight changes, which highways override.
+    writes.clear()
+    registry.update("roads", {"weight": 1})
+    assert [w["owner"] for w in writes] == [streets, streets]
+    registry.unbind(streets)
+    registry.update("roads", {"weight": 5})
+    assert streets.style["weight"] == 1 and streets.hover_style["weight"] == 5
+
+
+def test_style_tool_registry():
+    """Test `leafmaptools.styles.StyleTool` editing a registry entry.
+    """
+    m = Map()
+    registry = StyleRegistry({"theme": {"color": "#ff0000", "weight": 2}})
+    layers = [_layer() for _ in range(3)]
+    for layer in layers:
+        registry.bind(layer, "theme")
+    tool = StyleTool(a_map=m, registry=registry, style_name="theme", interval=0)
+    desc, picker, weight, opacity, close = tool.widget.children
+    weight.value = 7
+    assert registry["theme"]["weight"] == 7
+    assert all(layer.style == {"color": "#ff0000", "weight": 7} for layer in layers)
+
+
+def test_style_binding():
+    """Test `leafmaptools.styles.StyleBinding` syncing both ways without echoes.
+    """
+    m = Map()
+    layer = _layer(style={"color": "#ff0000", "weight": 2})
+    tool = StyleTool(a_map=m, layer=layer, interval=0)
+    desc, picker, weight, opacity, close = tool.widget.children
+    writes = []
+    layer.observe(writes.append, names=["style"])
+
+    weight.value = 5
+    assert layer.style["weight"] == 5 and len(writes) == 1
+    assert tool.binding.stats["to_widgets"] == 0
+
+    layer.style = {"color": "#00ff00", "weight": 9}
+    assert picker.value == "#00ff00" and weight.value == 9
+    assert len(writes) == 2
+    assert tool.binding.stats == {"to_layer": 1, "to_widgets": 2, "echoes": 3}
+
+    layer.style = {"color": "#00ff00", "weight": 9, "dashArray": "4"}
+    assert tool.binding.stats["to_widgets"] == 2
+
+    text_tool = StyleTextTool(a_map=m, layer=layer, wait=0)
+    layer.style = {"color": "#0000ff", "weight": 9}
+    assert json.loads(text_tool.textarea.value) == layer.style
+    assert picker.value == "#0000ff"
+    text_tool.textarea.value = json.dumps({"color": "#0000ff", "weight": 3})
+    assert weight.value == 3 and layer.style == {"color": "#0000ff", "weight": 3}
+    assert json.loads(text_tool.textarea.value) == layer.style
+
+    binding = tool.binding
+    assert isinstance(binding, StyleBinding)
+    assert binding.detach("weight") is weight
+    weight.value = 4
+    assert layer.style["weight"] == 3
+    binding.attach("weight", weight)
+    weight.value = 6
+    assert layer.style["weight"] == 6
@@ -0,0 +1,74 @@
+"""
+Tests for `leafmaptools.utils` module.
+"""
+
+
+import geojson
+import mercantile
+import numpy as np
+
+from leafmaptools import utils
+from leafmaptools.utils import bounds, feature_bounds, is_valid_json, parse_json
+
+
+def test_bounds():
+    """Test `leafmaptools.utils.bounds`.
+    """
+    features = [mercantile.feature(t) for t in mercantile.tiles(5, 45, 15, 55, zooms=9)]
+    fc = {"type": "FeatureCollection", "features": features}
+    coords = list(geojson.utils.coords(fc))
+    exp = [
+        [min(lat for lon, lat in coords), min(lon for lon, lat in coords)],
+        [max(lat for lon, lat in coords), max(lon for lon, lat in coords)],
+    ]
+    assert len(coords) > utils.NUMPY_MIN_POSITIONS
+    assert bounds(fc) == exp
+    assert bounds(features[0]) == [
+        [features[0]["bbox"][1], features[0]["bbox"][0]],
+        [features[0]["bbox"][3], features[0]["bbox"][2]],
+    ]
+
+    point = {"type": "Point", "coordinates": [1, 2]}
+    polygon = {"type": "Polygon", "coordinates": [[[0, 0, 5], [1, 0], [1, 1], [0, 0]]]}
+    collection = {"type": "GeometryCollection", "geometries": [point, polygon]}
+    assert bounds(point) == [[2, 1], [2, 1]]
+    assert bounds(collection) == [[0, 0], [2, 1]]
+
+
+def test_feature_bounds():
+    """Test `leafmaptools.utils.feature_bounds`.
+    """
+    polygons = {
+        "type": "MultiPolygon",
+        "coordinates": [
+            [[[0, 0], [2, 0], [2, 3], [0, 0]]],
+            [[[-1, -1], [0, -1], [0, 0], [-1, -1]]],
+        ],
+    }
+    fc = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": None, "properties": {}},
+            {"type": "Feature", "geometry": polygons, "properties": {}},
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [5, 6]}, "properties": {}},
+        ],
+    }
+    res = feature_bounds(fc)
+    assert res.shape == (3, 4)
+    assert np.isnan(res[0]).all()
+    assert res[1:].tolist() == [[-1, -1, 2, 3], [5, 6, 5, 6]]
+
+    tiles = list(mercantile.tiles(5, 45, 15, 55, zooms=7))
+    fc = {"type": "FeatureCollection", "features": [mercantile.feature(t) for t in tiles]}
+    assert np.allclose(feature_bounds(fc), [mercantile.bounds(t) for t in tiles])
+
+
+def test_parse_json():
+    """Test `leafmaptools.utils.parse_json` and `is_valid_json`.
+    """
+    assert parse_json('{"a": [1, null]}') == ({"a": [1, None]}, None)
+    assert parse_json("null") == (None, None)
+    value, error = parse_json('{\n  "a": 1,\n}')
+    assert value is None
+    assert (error.lineno, error.colno, error.pos) == (3, 1, 12)
+    assert is_valid_json("[]") and not is_valid_json("[")